@@ -0,0 +1,268 @@
+"""
+Benchmarks for the hot paths of the Octopart client.
+
+Micro benchmarks time the internal steps of an API call. Macro benchmarks time
+complete API calls against a local OctopartStubServer serving synthetic responses,
+and, with --recordings, every request in a recordings file saved by RecordingTransport.
+The cold_import benchmark times importing the Octopart class in fresh interpreters.
+
+Each benchmark reports operations per second, latency percentiles and the number of
+container objects allocated per operation, less those freed before it returned
+(for cold_import, the number of modules imported instead).
+Results can be saved as a baseline and later runs compared against it; the comparison
+fails if any benchmark slows down by more than the tolerance. A run also fails if
+cold_import takes longer than --max-import-ms at the median, or imports more than
+--max-import-modules modules, with or without a baseline.
+
+Usage:
+	python benchmarks.py [-k NAME] [--duration SECONDS] [--save FILE] [--compare FILE] [--tolerance FRACTION]
+		[--max-import-ms MS] [--max-import-modules COUNT]
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import timeit
+
+from octopart import *
+
+def brand_json(id):
+	return {'__class__' : 'Brand', 'id' : id, 'displayname' : 'Supplier %d' % id, \
+		'homepage_url' : 'http://www.example.com/%d' % id}
+
+def attribute_json(i):
+	return {'__class__' : 'PartAttribute', 'fieldname' : 'attribute%d' % i, 'displayname' : 'Attribute %d' % i, \
+		'type' : 'number', 'metadata' : {'datatype' : 'decimal', 'unit' : {'name' : 'volts', 'symbol' : 'V'}}}
+
+def part_json(uid, num_offers=8, num_specs=10):
+	"""Return a synthetic JSON Part resource of realistic size."""
+
+	offers = [{'supplier' : brand_json(i), 'sku' : '%d-SKU-%d' % (uid, i), 'avail' : i * 100, \
+			'prices' : [[1, 1.25, 'USD'], [10, 1.1, 'USD'], [100, 0.95, 'USD'], [1000, 0.8, 'USD']], \
+			'is_authorized' : i % 2 == 0, 'update_ts' : '2012-01-01T00:00:00Z', \
+			'clickthrough_url' : 'http://octopart.com/click/track?uid=%d&supplier=%d' % (uid, i), \
+			'buynow_url' : 'http://octopart.com/buynow/%d/%d' % (uid, i), 'sendrfq_url' : None} \
+			for i in range(num_offers)]
+	specs = [{'attribute' : attribute_json(i), 'values' : [i * 1.5]} for i in range(num_specs)]
+	return {'__class__' : 'Part', 'uid' : uid, 'mpn' : 'MPN%d' % uid, 'manufacturer' : brand_json(1000), \
+		'detail_url' : 'http://octopart.com/partsearch#search/requestData&q=MPN%d' % uid, \
+		'avg_price' : [1.0, 'USD', 1], 'avg_avail' : 1000, 'market_status' : 'Active', \
+		'num_suppliers' : num_offers, 'num_authsuppliers' : num_offers // 2, \
+		'short_description' : 'Synthetic part %d' % uid, 'category_ids' : [4174, 4175], \
+		'images' : [{'url_30px' : 'http://example.com/%d_30.png' % uid, 'url_90px' : 'http://example.com/%d_90.png' % uid}], \
+		'datasheets' : [{'url' : 'http://example.com/%d.pdf' % uid, 'score' : 100}], \
+		'descriptions' : [{'text' : 'Description of synthetic part %d' % uid, 'credit_domain' : 'example.com'}], \
+		'hyperlinks' : {'freesample' : 'http://example.com/sample/%d' % uid}, 'offers' : offers, 'specs' : specs}
+
+UIDS = range(1000, 1100)
+# A large response, such as the items of a big bom_match, for the hydration benchmarks
+HYDRATE_BODY = json.dumps([part_json(uid) for uid in range(2000, 3000)])
+LINES = [{'mpn' : 'MPN%d' % uid, 'manufacturer' : 'Maker', 'limit' : 5} for uid in range(20)]
+
+def synthetic_recordings():
+	"""Return recordings for the requests made by the macro benchmarks."""
+
+	recorder = RecordingTransport(_FixtureTransport())
+	client = Octopart(transport=recorder)
+	client.parts_get_multi(UIDS)
+	client.bom_match(LINES)
+	return recorder.recordings
+
+class _FixtureTransport(object):
+
+	"""Builds synthetic responses for the macro benchmark requests."""
+
+	def fetch(self, req_url):
+		if canonical_url(req_url).startswith('parts/get_multi'):
+			return json.dumps([part_json(uid) for uid in UIDS])
+		results = [{'items' : [part_json(i * 10 + j) for j in range(line['limit'])], 'reference' : '', \
+				'status' : 'exact_match', 'hits' : line['limit']} for i, line in enumerate(LINES)]
+		return json.dumps({'results' : results})
+
+def micro_benchmarks(pool):
+	"""Return (name, operation) pairs for the micro benchmarks.
+
+	@param pool: OctopartHydrationPool with a threshold of 0, for hydrate_pool.
+	"""
+
+	client = Octopart(apikey='benchkey')
+	part_body = json.dumps(part_json(1))
+	part = json.loads(part_body)
+	search_args = {'q' : 'resistor', 'start' : 0, 'limit' : 100, 'filters' : [['category_ids', [4174]]], \
+				'drilldown_include' : True, 'optimize_hide_datasheets' : True}
+	types = {'q' : StringType, 'start' : IntType, 'limit' : IntType, 'filters' : ListType}
+	ranges = {'start' : (0, 1000), 'limit' : (0, 100)}
+	validated = {'q' : 'resistor', 'start' : 0, 'limit' : 100, 'filters' : [['category_ids', [4174]]]}
+	return [('validate_args', lambda: client._validate_args(validated, types, ranges)),
+		('make_url', lambda: client._make_url('parts/get_multi', {'uids' : UIDS, 'optimize.hide_datasheets' : True})),
+		('translate_periods', lambda: client._translate_periods(dict(search_args))),
+		('parts_search_args', lambda: client._parts_search_args(dict(search_args))),
+		('json_loads', lambda: json.loads(part_body)),
+		('new_from_dict', lambda: OctopartPart.new_from_dict(part)),
+		('hydrate_inline', lambda: [OctopartPart.new_from_dict(p) for p in json.loads(HYDRATE_BODY)]),
+		('hydrate_pool', lambda: pool.hydrate(json.loads(HYDRATE_BODY), None, HYDRATE_BODY, ('*',)))]
+
+def macro_benchmarks(server_url, pool, recordings=None):
+	"""Return (name, operation) pairs for the macro benchmarks.
+
+	@param server_url: URL of a stub server serving synthetic_recordings().
+	@param pool: OctopartHydrationPool with a threshold of 0, for bom_match_pool.
+	@param recordings: Optional recordings dictionary also being served.
+	"""
+
+	client = Octopart(apikey='benchkey', base_url=server_url)
+	pooled = Octopart(apikey='benchkey', base_url=server_url, hydration=pool)
+	benchmarks = [('parts_get_multi', lambda: client.parts_get_multi(UIDS)),
+		('bom_match', lambda: client.bom_match(LINES)),
+		('bom_match_pool', lambda: pooled.bom_match(LINES))]
+	if recordings:
+		urls = [server_url + key for key in sorted(recordings) if recordings[key]['status'] == 200]
+		def replay():
+			for url in urls:
+				client._get(url)
+		benchmarks.append(('replay_recordings', replay))
+	return benchmarks
+
+# Run in a fresh interpreter: prints the seconds taken to import the client, and the modules it imported
+IMPORT_SCRIPT = """
+import sys, timeit
+before = len(sys.modules)
+start = timeit.default_timer()
+from octopart import Octopart
+print timeit.default_timer() - start, len(sys.modules) - before
+"""
+
+def run_import(duration=1.0, min_runs=5):
+	"""Time cold imports of the Octopart class, each in a new interpreter, for about duration seconds.
+	
+	@return: Dictionary of results, as for run().
+	"""
+	
+	timer = timeit.default_timer
+	directory = os.path.dirname(os.path.abspath(__file__))
+	latencies = []
+	modules = 0
+	end = timer() + duration
+	while len(latencies) < min_runs or timer() < end:
+		output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT], cwd=directory)
+		seconds, count = output.split()
+		latencies.append(float(seconds))
+		modules += int(count)
+	latencies.sort()
+	return {'name' : 'cold_import', 'runs' : len(latencies), 'ops_per_sec' : len(latencies) / sum(latencies), \
+		'p50' : percentile(latencies, 0.5), 'p90' : percentile(latencies, 0.9), \
+		'p99' : percentile(latencies, 0.99), 'modules' : float(modules) / len(latencies)}
+
+def percentile(sorted_values, fraction):
+	index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+	return sorted_values[index]
+
+def run(name, operation, duration=1.0, min_runs=5):
+	"""Time an operation repeatedly for about duration seconds.
+
+	@return: Dictionary of results.
+	"""
+
+	timer = timeit.default_timer
+	operation()	# Warm up
+	latencies = []
+	allocs = 0
+	enabled = gc.isenabled()
+	gc.collect()
+	gc.disable()
+	try:
+		end = timer() + duration
+		while len(latencies) < min_runs or timer() < end:
+			before = gc.get_count()[0]
+			start = timer()
+			result = operation()
+			latencies.append(timer() - start)
+			# The result is still referenced, so objects it holds count as allocated
+			allocs += gc.get_count()[0] - before
+			result = None
+			if gc.get_count()[0] > 1000000:
+				gc.collect()
+	finally:
+		if enabled:
+			gc.enable()
+	latencies.sort()
+	total = sum(latencies)
+	return {'name' : name, 'runs' : len(latencies), 'ops_per_sec' : len(latencies) / total, \
+		'p50' : percentile(latencies, 0.5), 'p90' : percentile(latencies, 0.9), \
+		'p99' : percentile(latencies, 0.99), 'allocs' : float(allocs) / len(latencies)}
+
+def format_result(result, baseline=None):
+	if 'modules' in result:
+		count = '%10.1f modules' % result['modules']
+	else:
+		count = '%10.1f allocs' % result['allocs']
+	line = '%-20s %12.1f ops/s  p50 %9.3f ms  p90 %9.3f ms  p99 %9.3f ms  %s' % \
+		(result['name'], result['ops_per_sec'], result['p50'] * 1000, result['p90'] * 1000, \
+		result['p99'] * 1000, count)
+	if baseline is not None:
+		line += '  %+6.1f%%' % ((result['ops_per_sec'] / baseline['ops_per_sec'] - 1) * 100)
+	return line
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmark the Octopart client.')
+	parser.add_argument('-k', dest='filter', default='', help='Only run benchmarks whose name contains this string.')
+	parser.add_argument('--duration', type=float, default=1.0, help='Seconds to run each benchmark for.')
+	parser.add_argument('--recordings', help='Also replay the requests in this recordings file.')
+	parser.add_argument('--save', help='Save the results as a baseline JSON file.')
+	parser.add_argument('--compare', help='Compare the results against a baseline JSON file.')
+	parser.add_argument('--tolerance', type=float, default=0.2, \
+					help='Fraction of ops/sec lost before a benchmark counts as a regression.')
+	parser.add_argument('--max-import-ms', type=float, default=150.0, \
+					help='Median milliseconds of cold_import above which it counts as a regression.')
+	parser.add_argument('--max-import-modules', type=int, default=100, \
+					help='Number of modules imported by cold_import above which it counts as a regression.')
+	options = parser.parse_args(argv)
+
+	recordings = synthetic_recordings()
+	extra = None
+	if options.recordings:
+		extra = load_recordings(options.recordings)
+		recordings.update(extra)
+	baseline = {}
+	if options.compare:
+		with open(options.compare) as f:
+			baseline = dict((r['name'], r) for r in json.load(f))
+
+	results = []
+	regressions = []
+	def report(result):
+		name = result['name']
+		results.append(result)
+		print format_result(result, baseline.get(name))
+		if name in baseline and result['ops_per_sec'] < baseline[name]['ops_per_sec'] * (1 - options.tolerance):
+			regressions.append(name)
+	
+	if options.filter in 'cold_import':
+		result = run_import(options.duration)
+		report(result)
+		if result['p50'] * 1000 > options.max_import_ms or result['modules'] > options.max_import_modules:
+			if 'cold_import' not in regressions:
+				regressions.append('cold_import')
+	# The pools are closed when the benchmarks finish, so no worker processes are left behind
+	with OctopartStubServer(recordings) as server, \
+			OctopartHydrationPool(processes=max(2, multiprocessing.cpu_count()), threshold=0) as micro_pool, \
+			OctopartHydrationPool(threshold=0) as macro_pool:
+		for name, operation in micro_benchmarks(micro_pool) + macro_benchmarks(server.url, macro_pool, extra):
+			if options.filter not in name:
+				continue
+			report(run(name, operation, options.duration))
+
+	if options.save:
+		with open(options.save, 'w') as f:
+			json.dump(results, f, indent=1)
+	if regressions:
+		print 'Regressions:', ', '.join(regressions)
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,3059 @@
+
+""" 
+A simple Python client frontend to the Octopart public REST API.
+
+@author: Joe Baker <jbaker@alum.wpi.edu>
+
+@license: 
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+__version__ = "0.5.5"
+__author__ = "Joe Baker <jbaker@alum.wpi.edu>"
+__contributors__ = []
+
+import copy
+import urllib2
+import json
+from types import *
+import datetime
+import heapq
+import hashlib
+import os
+import random
+import threading
+import time
+import urlparse
+import bisect
+import socket
+import timeit
+import collections
+import itertools
+import cProfile
+import sys
+import httplib
+
+class OctopartException(Exception):
+	
+	"""Various errors that can be raised by the Octopart API."""
+	
+	__slots__ = ["arguments", "arg_types", "arg_ranges", "code"]
+	errors = {0: 'Required argument missing from method call.', \
+			  1: 'Passed an invalid argument for this method.', \
+			  2: 'Argument type mismatch.', \
+			  3: 'An argument was passed more than once.', \
+			  4: 'Numeric argument value out of valid range.', \
+			  5: 'String argument outside of allowed length.', \
+			  6: 'Value of (start+limit) in a bom/match line argument exceeds 100.', \
+			  7: 'Unexpected HTTP Error 404.', \
+			  8: 'Unexpected HTTP Error 503.', \
+			  9: 'Argument is not a JSON-encoded list of pairs.', \
+			  10: 'Invalid sort order. Valid sort order strings are "asc" and "desc".', \
+			  11: 'List argument outside of allowed length.', \
+			  12: 'No recorded response for this request.', \
+			  13: 'Every API key has used up its quota.', \
+			  14: 'Request waited past its scheduling deadline.', \
+			  15: 'Call deadline exceeded.', \
+			  16: 'Call was cancelled.', \
+			  17: 'Batch item too long to fit in a request URL.'}
+	
+	def __init__(self, args, arg_types, arg_ranges, error_code):
+		self.arguments = args
+		self.arg_types = arg_types
+		self.arg_ranges = arg_ranges
+		self.code = error_code
+		
+	def __str__(self):
+		args = ' '.join(('\nPassed arguments:', str(self.arguments)))
+		argt = ' '.join(('\nArgument types:', str(self.arg_types)))
+		argr = ' '.join(('\nArgument ranges:', str(self.arg_ranges)))
+		string = OctopartException.errors[self.code] + args + argt + argr
+		return string
+
+def _same_value(a, b):
+	"""Compares two field values, ignoring the order of list elements."""
+	
+	if a == b:
+		return True
+	if type(a) is ListType and type(b) is ListType and len(a) == len(b):
+		return sorted(a) == sorted(b)
+	return False
+
+class _OctopartResource(object):
+	
+	"""Base class for objects representing Octopart API resources.
+	
+	Subclasses define to_dict(), returning the object as a JSON resource dictionary.
+	"""
+	
+	def _normalized_dict(self):
+		"""Returns the resource dictionary in a canonical form for fingerprinting."""
+		
+		return self.to_dict()
+	
+	def fingerprint(self, refresh=False):
+		"""Returns a stable SHA-1 hex digest of the object's normalized JSON resource.
+		
+		The digest is computed on first use and cached on the instance.
+		@param refresh: Recompute the digest, e.g. after the object was modified.
+		"""
+		
+		if refresh or getattr(self, '_fingerprint', None) is None:
+			data = json.dumps(self._normalized_dict(), sort_keys=True, separators=(',',':'))
+			self._fingerprint = hashlib.sha1(data).hexdigest()
+		return self._fingerprint
+
+def _resource_dict(obj):
+	"""Returns the JSON resource dictionary of obj if it is a resource object, else obj."""
+	
+	if isinstance(obj, _OctopartResource):
+		return obj.to_dict()
+	return obj
+
+class OctopartBrand(_OctopartResource):
+	
+	@classmethod
+	def new_from_dict(cls, brand_dict):
+		new = cls(brand_dict['id'], brand_dict['displayname'], brand_dict['homepage_url'])
+		return new
+	
+	def __init__(self, id, dispname, homepage):
+		self._id = id
+		self.displayname = dispname
+		self.homepage_url = homepage
+	
+	@property
+	def id(self):
+		return self._id
+	
+	def to_dict(self):
+		return {'__class__' : 'Brand', 'id' : self.id, 'displayname' : self.displayname, \
+				'homepage_url' : self.homepage_url}
+	
+	def equals_json(self, resource):
+		"""Checks the object for data equivalence to a JSON Brand resource."""
+		
+		if isinstance(resource, DictType) and resource.get('__class__') == 'Brand': 
+			if self.id != resource.get('id'):
+				return False
+			if self.displayname != resource.get('displayname'):
+				return False
+			if self.homepage_url != resource.get('homepage_url'):
+				return False
+		else:
+			return False
+		return True
+	
+	def __eq__(self, b):
+		if isinstance(b, OctopartBrand):
+			try:
+				if self.id != b.id:
+					return False
+				if self.displayname != b.displayname:
+					return False
+				if self.homepage_url != b.homepage_url:
+					return False
+			except AttributeError:
+				return False
+		else:
+			return False
+		return True
+	
+	def __ne__(self, b):
+		return not self.__eq__(b)
+	
+	def __hash__(self):
+		return hash((self.__class__, self.id))
+	
+	def __str__(self):
+		return ''.join(('Brand ', str(self.id), ': ', self.displayname, ' (', self.homepage_url, ')'))
+
+class OctopartCategory(_OctopartResource):
+	
+	@classmethod
+	def new_from_dict(cls, category_dict):
+		new_dict = copy.deepcopy(category_dict)
+		new = cls(new_dict['id'], new_dict['parent_id'], new_dict['nodename'], \
+							new_dict['images'], new_dict['children_ids'], new_dict['ancestor_ids'], \
+							new_dict.get('ancestors', []), new_dict['num_parts'])
+		return new
+	
+	def __init__(self, id, parent_id, nodename, images, children_ids, ancestor_ids, ancestors, num_parts):
+		self._id = id
+		self.parent_id = parent_id
+		self.nodename = nodename
+		self.images = images	# List of dicts of URLs
+		self.children_ids = children_ids	# List of child node ids
+		self.ancestor_ids = ancestor_ids	# Sorted list of ancestor node ids (immediate parent first)
+		self.ancestors = ancestors	# Sorted list of category objects
+		self.num_parts = num_parts
+	
+	@property
+	def id(self):
+		return self._id
+	
+	def to_dict(self):
+		return {'__class__' : 'Category', 'id' : self.id, 'parent_id' : self.parent_id, \
+				'nodename' : self.nodename, 'images' : self.images, 'children_ids' : self.children_ids, \
+				'ancestor_ids' : self.ancestor_ids, 'ancestors' : [_resource_dict(a) for a in self.ancestors], \
+				'num_parts' : self.num_parts}
+	
+	def equals_json(self, resource):
+		"""Checks the object for data equivalence to a JSON Category resource."""
+		
+		if isinstance(resource, DictType) and resource.get('__class__') == 'Category': 
+			if self.id != resource.get('id'):
+				return False
+			if self.parent_id != resource.get('parent_id'):
+				return False
+			if self.nodename != resource.get('nodename'):
+				return False
+			if not _same_value(self.images, resource.get('images')):
+				return False
+			if not _same_value(self.children_ids, resource.get('children_ids')):
+				return False
+			if not _same_value(self.ancestor_ids, resource.get('ancestor_ids')):
+				return False
+			if not _same_value([_resource_dict(a) for a in self.ancestors], resource.get('ancestors', [])):
+				return False
+			if self.num_parts != resource.get('num_parts'):
+				return False
+		else:
+			return False
+		return True
+	
+	def __eq__(self, c):
+		if isinstance(c, OctopartCategory):
+			try:
+				if self.id != c.id:
+					return False
+				if self.parent_id != c.parent_id:
+					return False
+				if self.nodename != c.nodename:
+					return False
+				if not _same_value(self.images, c.images):
+					return False
+				if not _same_value(self.children_ids, c.children_ids):
+					return False
+				if not _same_value(self.ancestor_ids, c.ancestor_ids):
+					return False
+				if not _same_value(self.ancestors, c.ancestors):
+					return False
+				if self.num_parts != c.num_parts:
+					return False
+			except AttributeError:
+				return False
+		else:
+			return False
+		return True
+	
+	def __ne__(self, c):
+		return not self.__eq__(c)
+	
+	def __hash__(self):
+		return hash((self.__class__, self.id))
+	
+	def __str__(self):
+		return ''.join(('Category ', str(self.id), ': ', self.nodename))
+
+class OctopartPart(_OctopartResource):
+	
+	# Fields which may be left out of a part with a projection
+	PROJECTABLE_FIELDS = frozenset(('avg_price', 'avg_avail', 'market_status', 'num_suppliers', \
+								'num_authsuppliers', 'short_description', 'category_ids', 'images', \
+								'datasheets', 'descriptions', 'hyperlinks', 'offers', 'specs'))
+	
+	@classmethod
+	def new_from_dict(cls, part_dict, fields=None):
+		"""Constructor for use with JSON resource dictionaries.
+		
+		@param fields: Optional set of PROJECTABLE_FIELDS to build. Other projectable 
+		fields are skipped without being decoded, and left at their default values.
+		uid, mpn, manufacturer and detail_url are always built.
+		"""
+		
+		if fields is None:
+			copied_dict = part_dict.copy()
+		else:
+			copied_dict = dict((k, v) for k, v in part_dict.iteritems() \
+							if k in fields or k not in cls.PROJECTABLE_FIELDS)
+		uid = copied_dict.pop('uid')
+		mpn = copied_dict.pop('mpn')
+		manufacturer = copied_dict.pop('manufacturer')
+		detail_url = copied_dict.pop('detail_url')
+		return cls(uid, mpn, manufacturer, detail_url, **copied_dict)
+	
+	def __init__(self, uid, mpn, manufacturer, detail_url, **kwargs):
+		# If class data is in dictionary format, convert everything to class instances 
+		# Otherwise, assume it is already in class format and do nothing
+		args = copy.deepcopy(kwargs)
+		if type(manufacturer) is DictType:
+			manufacturer = OctopartBrand.new_from_dict(copy.deepcopy(manufacturer))
+		for offer in args.get('offers', []):
+			if type(offer['supplier']) is DictType:
+				offer['supplier'] = OctopartBrand.new_from_dict(offer['supplier'])
+			# Convert ISO 8601 datetime strings to datetime objects
+			if 'update_ts' in offer:
+				# Strip 'Z' UTC notation that can't be parsed
+				if offer['update_ts'][-1] == 'Z':
+					offer['update_ts'] = offer['update_ts'][0:-1]
+				offer['update_ts'] = datetime.datetime.strptime(offer['update_ts'], '%Y-%m-%dT%H:%M:%S')
+			
+		for spec in args.get('specs', []):
+			if type(spec['attribute']) is DictType:
+				spec['attribute'] = OctopartPartAttribute.new_from_dict(spec['attribute'])
+		
+		self._uid = uid
+		self._mpn = mpn
+		self.manufacturer = manufacturer
+		self.detail_url = detail_url
+		self.avg_price = args.get('avg_price')
+		self.avg_avail = args.get('avg_avail')
+		self.market_status = args.get('market_status')
+		self.num_suppliers = args.get('num_suppliers')
+		self.num_authsuppliers = args.get('num_authsuppliers')
+		self.short_description = args.get('short_description', '')
+		self.category_ids = args.get('category_ids', [])
+		self.images = args.get('images', [])
+		self.datasheets = args.get('datasheets', [])
+		self.descriptions = args.get('descriptions', [])
+		self.hyperlinks = args.get('hyperlinks', {})
+		self.offers = args.get('offers', [])
+		self.specs = args.get('specs', [])
+	
+	@property
+	def uid(self):
+		return self._uid
+	
+	@property
+	def mpn(self):
+		return self._mpn
+	
+	def to_dict(self):
+		offers = []
+		for offer in self.offers:
+			offer = offer.copy()
+			offer['supplier'] = _resource_dict(offer.get('supplier'))
+			if isinstance(offer.get('update_ts'), datetime.datetime):
+				offer['update_ts'] = offer['update_ts'].strftime('%Y-%m-%dT%H:%M:%SZ')
+			offers.append(offer)
+		specs = []
+		for spec in self.specs:
+			spec = spec.copy()
+			spec['attribute'] = _resource_dict(spec.get('attribute'))
+			specs.append(spec)
+		return {'__class__' : 'Part', 'uid' : self.uid, 'mpn' : self.mpn, \
+				'manufacturer' : _resource_dict(self.manufacturer), 'detail_url' : self.detail_url, \
+				'avg_price' : self.avg_price, 'avg_avail' : self.avg_avail, 'market_status' : self.market_status, \
+				'num_suppliers' : self.num_suppliers, 'num_authsuppliers' : self.num_authsuppliers, \
+				'short_description' : self.short_description, 'category_ids' : self.category_ids, \
+				'images' : self.images, 'datasheets' : self.datasheets, 'descriptions' : self.descriptions, \
+				'hyperlinks' : self.hyperlinks, 'offers' : offers, 'specs' : specs}
+	
+	def _normalized_dict(self):
+		# Offer, spec and category order carries no meaning
+		resource = self.to_dict()
+		resource['offers'].sort(key=_offer_key)
+		resource['specs'].sort(key=lambda spec: spec['attribute'] and spec['attribute'].get('fieldname'))
+		resource['category_ids'] = sorted(resource['category_ids'])
+		return resource
+	
+	def get_authorized_offers(self):
+		return [o for o in self.offers if o['is_authorized'] is True]
+	
+	def get_unauthorized_offers(self):
+		return [o for o in self.offers if o['is_authorized'] is False]
+	
+	def equals_json(self, resource, hide_datasheets=False, hide_descriptions=False, hide_images=False, \
+				hide_offers=False, hide_unauthorized_offers=False, hide_specs=False):
+		"""Checks the object for data equivalence to a JSON Part resource."""
+		
+		def compare_offers(class_offer, json_offer):
+			"""Compares two offers.
+			
+			@param class_offer: An offer from an OctopartPart instance.
+			@param json_offer: An offer from a JSON Part resource.
+			"""
+			
+			class_attribs = (class_offer['sku'], class_offer['avail'], class_offer['prices'], \
+							class_offer['is_authorized'], class_offer.get('clickthrough_url'), \
+							class_offer.get('buynow_url'), class_offer.get('sendrfq_url'))
+			json_attribs = (json_offer['sku'], json_offer['avail'], json_offer['prices'], \
+							json_offer['is_authorized'], json_offer.get('clickthrough_url'), \
+							json_offer.get('buynow_url'), json_offer.get('sendrfq_url'))
+			if class_attribs != json_attribs:
+				return False
+			if not class_offer['supplier'].equals_json(json_offer['supplier']):
+				return False
+			return True
+		
+		def compare_specs(class_spec, json_spec):
+			"""Compares two specs.
+			
+			@param class_spec: A spec from an OctopartPart instance.
+			@param json_spec: A spec from a JSON Part resource.
+			"""
+			
+			if not class_spec['attribute'].equals_json(json_spec['attribute']):
+				return False
+			if not _same_value(class_spec['values'], json_spec['values']):
+				return False
+			return True
+		
+		if isinstance(resource, DictType) and resource.get('__class__') == 'Part': 
+			if self.uid != resource.get('uid'):
+				return False
+			if self.mpn != resource.get('mpn'):
+				return False
+			if not self.manufacturer.equals_json(resource.get('manufacturer')):
+				return False
+			if self.detail_url != resource.get('detail_url'):
+				return False
+			if self.avg_price != resource.get('avg_price'):
+				return False
+			if self.avg_avail != resource.get('avg_avail'):
+				return False
+			if self.market_status != resource.get('market_status'):
+				return False
+			if self.num_suppliers != resource.get('num_suppliers'):
+				return False
+			if self.num_authsuppliers != resource.get('num_authsuppliers'):
+				return False
+			if self.short_description != resource.get('short_description', ''):
+				return False
+			if not _same_value(self.category_ids, resource.get('category_ids', [])):
+				return False
+			if hide_images is False and not _same_value(self.images, resource.get('images', [])):
+				return False
+			if hide_datasheets is False and not _same_value(self.datasheets, resource.get('datasheets', [])):
+				return False
+			if hide_descriptions is False and not _same_value(self.descriptions, resource.get('descriptions', [])):
+				return False
+			if self.hyperlinks != resource.get('hyperlinks', {}):
+				return False
+			if hide_offers is False:
+				checked_offers = []
+				if hide_unauthorized_offers:
+					checked_offers = self.get_authorized_offers()
+				else:
+					checked_offers = self.offers
+				json_offers = _index_offers(resource.get('offers', []))
+				for offer in checked_offers:
+					other = json_offers.get(_offer_key(offer))
+					if other is None or not compare_offers(offer, other):
+						return False
+			if not hide_specs:
+				json_specs = _index_specs(resource.get('specs', []))
+				for fieldname, spec in _index_specs(self.specs).iteritems():
+					other = json_specs.get(fieldname)
+					if other is None or not compare_specs(spec, other):
+						return False
+		else:
+			return False
+		return True
+	
+	def __eq__(self, p):
+		if isinstance(p, OctopartPart):
+			try:
+				if self.uid != p.uid:
+					return False
+				if self.mpn != p.mpn:
+					return False
+				if self.manufacturer != p.manufacturer:
+					return False
+				if self.detail_url != p.detail_url:
+					return False
+				if self.avg_price != p.avg_price:
+					return False
+				if self.avg_avail != p.avg_avail:
+					return False
+				if self.market_status != p.market_status:
+					return False
+				if self.num_suppliers != p.num_suppliers:
+					return False
+				if self.num_authsuppliers != p.num_authsuppliers:
+					return False
+				if self.short_description != p.short_description:
+					return False
+				if self.category_ids != p.category_ids:
+					return False
+				if self.images != p.images:
+					return False
+				if self.datasheets != p.datasheets:
+					return False
+				if self.descriptions != p.descriptions:
+					return False
+				if self.hyperlinks != p.hyperlinks:
+					return False
+				if self.offers != p.offers:
+					return False
+				if self.specs != p.specs:
+					return False
+			except AttributeError:
+				return False
+		else:
+			return False
+		return True
+	
+	def __ne__(self, p):
+		return not self.__eq__(p)
+	
+	def __hash__(self):
+		return hash((self.__class__, self.uid, self.mpn))
+	
+	def __str__(self):
+		return ''.join(('Part ', str(self.uid), ': ', str(self.manufacturer), ' ', self.mpn))
+
+class OctopartPartAttribute(_OctopartResource):
+	TYPE_TEXT = 'text'
+	TYPE_NUMBER = 'number'
+	
+	@classmethod
+	def new_from_dict(cls, attribute_dict):
+		new = cls(attribute_dict['fieldname'], attribute_dict['displayname'], attribute_dict['type'], attribute_dict.get('metadata', {}))
+		return new
+	
+	def __init__(self, fieldname, displayname, attribute_type, metadata):
+		self._fieldname = fieldname
+		self.displayname = displayname
+		self.type = attribute_type
+		self.metadata = metadata
+	
+	@property
+	def fieldname(self):
+		return self._fieldname
+	
+	def to_dict(self):
+		return {'__class__' : 'PartAttribute', 'fieldname' : self.fieldname, \
+				'displayname' : self.displayname, 'type' : self.type, 'metadata' : self.metadata}
+	
+	def equals_json(self, resource):
+		"""Checks the object for data equivalence to a JSON PartAttribute resource."""
+		
+		if isinstance(resource, DictType) and resource.get('__class__') == 'PartAttribute': 
+			if self.fieldname != resource.get('fieldname'):
+				return False
+			if self.displayname != resource.get('displayname'):
+				return False
+			if self.type != resource.get('type'):
+				return False
+			if self.metadata != resource.get('metadata', {}):
+				return False
+		else:
+			return False
+		return True
+	
+	def __eq__(self, pa):
+		if isinstance(pa, OctopartPartAttribute):
+			try:
+				if self.fieldname != pa.fieldname:
+					return False
+				if self.displayname != pa.displayname:
+					return False
+				if self.type != pa.type:
+					return False
+				if self.metadata != pa.metadata:
+					return False
+			except AttributeError:
+				return False
+		else:
+			return False
+		return True
+	
+	def __ne__(self, pa):
+		return not self.__eq__(pa)
+	
+	def __hash__(self):
+		return hash((self.__class__, self.fieldname))
+	
+	def __str__(self):
+		if self.type == 'number':
+			return ''.join((self.displayname, 'attribute: ', self.metadata['datatype'], ' (', self.metadata['unit']['name'], ')'))
+		elif self.type == 'text':
+			return ''.join((self.displayname, 'attribute: ', self.type))
+		else:	# Note: 'else' is not a valid state in the API resource definition
+			return self.displayname
+
+_timer = timeit.default_timer
+
+class OctopartCall(object):
+	
+	"""Record of a single API call, passed to OctopartHooks.
+	
+	phases maps phase names to durations in seconds: 'validate' (argument checks),
+	'url' (request URL construction), 'network' (until the response arrives), 
+	'download' (reading the response body, when the transport reports it separately),
+	'parse' (JSON decoding) and 'build' (model object construction).
+	"""
+	
+	__slots__ = ['method', 'url', 'batch_size', 'start', 'duration', 'phases', 'bytes', 'events', 'error', 'context']
+	
+	def __init__(self, method, batch_size=None):
+		self.method = method
+		self.url = None
+		self.batch_size = batch_size
+		self.start = _timer()
+		self.duration = None
+		self.phases = {}
+		self.bytes = 0	# Response body bytes received
+		self.events = []	# Event names, such as 'cache_hit' and 'retry'
+		self.error = None	# The exception raised by the call, if any
+		self.context = {}	# Scratch space for hooks
+
+def _encode_value(val):
+	"""Returns an argument value as it appears in a request URL."""
+	
+	if type(val) is BooleanType:
+		v = int(val)
+	elif type(val) is ListType:
+		v = json.dumps(val, separators=(',',':'))
+	else:
+		v = val
+	v = str(v).replace(' ', '+')
+	return urllib2.quote(v,'[]{}":+,') #replace all others, leave structure untouched
+
+class OctopartRequest(collections.namedtuple('OctopartRequest', ['method', 'query'])):
+	
+	"""An immutable API request: the method path and its encoded query arguments.
+	
+	The client builds a request once from the validated arguments of a call, and 
+	keeps no reference to the caller's argument dicts and lists. The API key is 
+	added as the URL is made, so a retry with another key reuses the request.
+	"""
+	
+	__slots__ = ()
+	
+	@classmethod
+	def from_args(cls, method, args):
+		"""Returns the request for a method path and arguments dict."""
+		
+		return cls(method, tuple('='.join((arg, _encode_value(val))) for arg, val in args.iteritems()))
+	
+	def url(self, base_url, apikey=None):
+		"""Returns the request URL for an API root URL and API key."""
+		
+		query = self.query
+		if apikey:
+			query += ('apikey=' + _encode_value(apikey),)
+		if query:
+			return '?'.join((base_url + self.method, '&'.join(query)))
+		return base_url + self.method
+
+class OctopartHooks(object):
+	
+	"""Base class for instrumentation of Octopart API calls.
+	
+	Hooks are called synchronously in the thread making the call, so they should be quick.
+	"""
+	
+	def call_started(self, call):
+		"""Called before an API call's arguments are validated."""
+		
+		pass
+	
+	def event(self, call, name):
+		"""Called when a named event, such as 'cache_hit' or 'retry', occurs during a call."""
+		
+		pass
+	
+	def call_finished(self, call):
+		"""Called when an API call returns or raises an exception."""
+		
+		pass
+
+def _error_name(error):
+	"""Returns a short label for an exception raised by an API call."""
+	
+	if isinstance(error, OctopartException):
+		return 'OctopartException%d' % error.code
+	elif isinstance(error, urllib2.HTTPError):
+		return 'HTTPError%d' % error.code
+	return error.__class__.__name__
+
+class _Histogram(object):
+	
+	"""Cumulative histogram of durations, with fixed bucket upper bounds."""
+	
+	def __init__(self, bounds):
+		self.bounds = bounds
+		self.counts = [0] * (len(bounds) + 1)	# The last bucket is unbounded
+		self.count = 0
+		self.sum = 0.0
+		self.max = 0.0
+	
+	def observe(self, value):
+		self.counts[bisect.bisect_left(self.bounds, value)] += 1
+		self.count += 1
+		self.sum += value
+		if value > self.max:
+			self.max = value
+	
+	def percentile(self, fraction):
+		"""Estimate a percentile as the upper bound of the bucket containing it."""
+		
+		if self.count == 0:
+			return None
+		rank = fraction * self.count
+		total = 0
+		for bound, count in zip(self.bounds, self.counts):
+			total += count
+			if total >= rank:
+				return min(bound, self.max)
+		return self.max
+
+class OctopartMetrics(OctopartHooks):
+	
+	"""In-memory aggregation of per-method, per-phase timings and counters.
+	
+	Histograms are kept for each phase of each method, and for the 'total' call time.
+	Counters are kept for calls, response bytes, errors (by error label) and events 
+	(by event name).
+	"""
+	
+	DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+	
+	def __init__(self, buckets=DEFAULT_BUCKETS):
+		self.buckets = tuple(sorted(buckets))
+		self.histograms = {}	# (method, phase) -> _Histogram
+		self.counters = {}	# (counter name, method, label) -> count
+		self._lock = threading.Lock()
+	
+	def _count(self, name, method, label='', n=1):
+		key = (name, method, label)
+		self.counters[key] = self.counters.get(key, 0) + n
+	
+	def _observe(self, method, phase, seconds):
+		histogram = self.histograms.get((method, phase))
+		if histogram is None:
+			histogram = self.histograms[(method, phase)] = _Histogram(self.buckets)
+		histogram.observe(seconds)
+	
+	def event(self, call, name):
+		with self._lock:
+			self._count('events', call.method, name)
+	
+	def call_finished(self, call):
+		with self._lock:
+			for phase, seconds in call.phases.iteritems():
+				self._observe(call.method, phase, seconds)
+			self._observe(call.method, 'total', call.duration)
+			self._count('calls', call.method)
+			self._count('bytes', call.method, n=call.bytes)
+			if call.error is not None:
+				self._count('errors', call.method, _error_name(call.error))
+	
+	def histogram(self, method, phase='total'):
+		"""Return the _Histogram of a method's phase, or None if it was never observed."""
+		
+		return self.histograms.get((method, phase))
+	
+	def count(self, name, method=None, label=None):
+		"""Return a counter total, optionally restricted to a method and/or label.
+		
+		@param name: 'calls', 'bytes', 'errors' or 'events'.
+		"""
+		
+		with self._lock:
+			return sum(n for (c, m, l), n in self.counters.iteritems() \
+					if c == name and method in (None, m) and label in (None, l))
+	
+	def reset(self):
+		with self._lock:
+			self.histograms.clear()
+			self.counters.clear()
+	
+	def to_prometheus(self, prefix='octopart'):
+		"""Return the metrics in the Prometheus text exposition format."""
+		
+		lines = ['# TYPE %s_phase_seconds histogram' % prefix]
+		with self._lock:
+			for (method, phase), histogram in sorted(self.histograms.iteritems()):
+				labels = 'method="%s",phase="%s"' % (method, phase)
+				total = 0
+				for bound, count in zip(self.buckets, histogram.counts):
+					total += count
+					lines.append('%s_phase_seconds_bucket{%s,le="%r"} %d' % (prefix, labels, bound, total))
+				lines.append('%s_phase_seconds_bucket{%s,le="+Inf"} %d' % (prefix, labels, histogram.count))
+				lines.append('%s_phase_seconds_sum{%s} %r' % (prefix, labels, histogram.sum))
+				lines.append('%s_phase_seconds_count{%s} %d' % (prefix, labels, histogram.count))
+			names = {'calls' : ('calls_total', None), 'bytes' : ('response_bytes_total', None), \
+					'errors' : ('errors_total', 'error'), 'events' : ('events_total', 'event')}
+			for counter in ('calls', 'bytes', 'errors', 'events'):
+				metric, label_name = names[counter]
+				lines.append('# TYPE %s_%s counter' % (prefix, metric))
+				for (c, method, label), n in sorted(self.counters.iteritems()):
+					if c != counter:
+						continue
+					labels = 'method="%s"' % method
+					if label_name:
+						labels += ',%s="%s"' % (label_name, label)
+					lines.append('%s_%s{%s} %d' % (prefix, metric, labels, n))
+		return '\n'.join(lines) + '\n'
+
+class OctopartStatsdHook(OctopartHooks):
+	
+	"""Sends per-call timings and counters to a StatsD server over UDP.
+	
+	Metric names are prefix.method.phase for timers (in milliseconds), and 
+	prefix.method.calls, .bytes, .errors.<label> and .events.<name> for counters, 
+	with slashes in method names replaced by underscores.
+	"""
+	
+	def __init__(self, host='127.0.0.1', port=8125, prefix='octopart'):
+		self.address = (host, port)
+		self.prefix = prefix
+		self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	
+	def _name(self, call, *parts):
+		return '.'.join((self.prefix, call.method.replace('/', '_')) + parts)
+	
+	def statsd_lines(self, call):
+		"""Return the StatsD protocol lines describing a finished call."""
+		
+		lines = ['%s:%.3f|ms' % (self._name(call, phase), seconds * 1000) \
+				for phase, seconds in sorted(call.phases.iteritems())]
+		lines.append('%s:%.3f|ms' % (self._name(call, 'total'), call.duration * 1000))
+		lines.append('%s:1|c' % self._name(call, 'calls'))
+		lines.append('%s:%d|c' % (self._name(call, 'bytes'), call.bytes))
+		if call.error is not None:
+			lines.append('%s:1|c' % self._name(call, 'errors', _error_name(call.error)))
+		return lines
+	
+	def _send(self, lines):
+		try:
+			self._socket.sendto('\n'.join(lines), self.address)
+		except socket.error:
+			pass	# Metrics are best-effort
+	
+	def event(self, call, name):
+		self._send(['%s:1|c' % self._name(call, 'events', name)])
+	
+	def call_finished(self, call):
+		self._send(self.statsd_lines(call))
+
+_PHASE_ORDER = ('validate', 'queue', 'url', 'network', 'download', 'parse', 'build')
+
+class OctopartTracer(OctopartHooks):
+	
+	"""Records a span for every API call.
+	
+	A span is a dictionary containing the method, the canonical request URL 
+	(without the API key), the batch size, the start time, duration and phase 
+	timings in seconds, bytes received, events, any error, and the calling thread.
+	The most recent spans are kept in memory, and each finished span is also 
+	passed to an optional sink function.
+	"""
+	
+	def __init__(self, max_spans=10000, sink=None):
+		"""
+		@param max_spans: Number of recent spans to keep.
+		@param sink: Function called with each finished span.
+		"""
+		
+		self.spans = collections.deque(maxlen=max_spans)
+		self.sink = sink
+		self._ids = itertools.count(1)
+	
+	def call_started(self, call):
+		call.context['span_id'] = next(self._ids)
+		call.context['wall_start'] = time.time()
+	
+	def call_finished(self, call):
+		span = {'span_id' : call.context.get('span_id'), 'method' : call.method, \
+				'url' : canonical_url(call.url) if call.url else None, 'batch_size' : call.batch_size, \
+				'start' : call.context.get('wall_start'), 'duration' : call.duration, 'phases' : dict(call.phases), \
+				'bytes' : call.bytes, 'events' : list(call.events), \
+				'error' : _error_name(call.error) if call.error is not None else None, \
+				'thread' : threading.current_thread().name}
+		self.spans.append(span)
+		if self.sink is not None:
+			self.sink(span)
+	
+	def write_json_lines(self, fileobj):
+		"""Write the recorded spans as one JSON object per line."""
+		
+		for span in list(self.spans):
+			fileobj.write(json.dumps(span) + '\n')
+	
+	def write_chrome_trace(self, fileobj):
+		"""Write the recorded spans in the Chrome trace event format.
+		
+		The file can be opened with chrome://tracing or Perfetto. Each call is a 
+		complete event with its phases as consecutive nested events.
+		"""
+		
+		events = []
+		for span in list(self.spans):
+			ts = span['start'] * 1e6
+			args = dict((k, span[k]) for k in ('url', 'batch_size', 'bytes', 'events', 'error'))
+			events.append({'name' : span['method'], 'cat' : 'call', 'ph' : 'X', 'ts' : ts, \
+						'dur' : span['duration'] * 1e6, 'pid' : os.getpid(), 'tid' : span['thread'], 'args' : args})
+			for phase in _PHASE_ORDER:
+				if phase in span['phases']:
+					dur = span['phases'][phase] * 1e6
+					events.append({'name' : phase, 'cat' : 'phase', 'ph' : 'X', 'ts' : ts, 'dur' : dur, \
+								'pid' : os.getpid(), 'tid' : span['thread']})
+					ts += dur
+		json.dump({'traceEvents' : events}, fileobj)
+
+class OctopartProfilingHook(OctopartHooks):
+	
+	"""Captures cProfile profiles of the slowest API calls.
+	
+	A random sample of calls is profiled. A profile is kept when its call is among 
+	the slowest fraction of recent calls to the same method, and is written to 
+	directory in the pstats format, readable with the pstats module, snakeviz or 
+	gprof2dot.
+	"""
+	
+	def __init__(self, directory, slowest=0.05, sample_rate=1.0, window=1000, min_samples=20, max_profiles=100):
+		"""
+		@param directory: Directory to write profiles to.
+		@param slowest: Fraction of calls, by duration, whose profiles are kept.
+		@param sample_rate: Fraction of calls to profile.
+		@param window: Number of recent call durations per method used to find the slowest.
+		@param min_samples: Number of durations needed before any profile is kept.
+		@param max_profiles: Stop writing profiles after this many.
+		"""
+		
+		self.directory = directory
+		self.slowest = slowest
+		self.sample_rate = sample_rate
+		self.window = window
+		self.min_samples = min_samples
+		self.max_profiles = max_profiles
+		self.profiles = []	# (path, method, duration) triples
+		self._reserved = 0	# Profiles written or being written, counted against max_profiles
+		self._durations = {}
+		self._lock = threading.Lock()
+		self._random = random.Random()
+		self._sequence = itertools.count()
+	
+	def call_started(self, call):
+		if self._random.random() < self.sample_rate:
+			profiler = cProfile.Profile()
+			call.context['profiler'] = profiler
+			profiler.enable()
+	
+	def _is_slow(self, method, duration, profiled):
+		"""Records a call's duration, and returns whether its profile should be kept.
+		
+		A slot for the profile is reserved under the lock, so concurrent slow calls 
+		cannot write more than max_profiles.
+		"""
+		
+		with self._lock:
+			durations = self._durations.get(method)
+			if durations is None:
+				durations = self._durations[method] = collections.deque(maxlen=self.window)
+			durations.append(duration)
+			if not profiled or len(durations) < self.min_samples or self._reserved >= self.max_profiles:
+				return False
+			ordered = sorted(durations)
+			if duration < ordered[min(len(ordered) - 1, int(len(ordered) * (1 - self.slowest)))]:
+				return False
+			self._reserved += 1
+			return True
+	
+	def call_finished(self, call):
+		profiler = call.context.pop('profiler', None)
+		if profiler is not None:
+			profiler.disable()
+		if not self._is_slow(call.method, call.duration, profiler is not None):
+			return
+		name = '%s-%d-%d-%d-%dms.prof' % (call.method.replace('/', '_'), os.getpid(), \
+										int(time.time() * 1000), next(self._sequence), int(call.duration * 1000))
+		path = os.path.join(self.directory, name)
+		try:
+			profiler.dump_stats(path)
+		except:
+			with self._lock:
+				self._reserved -= 1
+			raise
+		with self._lock:
+			self.profiles.append((path, call.method, call.duration))
+
+class OctopartTimeout(object):
+	
+	"""Time limits for an API call, in seconds. Any limit may be None.
+	
+	total covers the whole call, including time queued in a scheduler, waiting for 
+	an API key and retries. connect limits opening each connection, and read limits 
+	each wait for data from the server, including the wait for the response headers.
+	"""
+	
+	__slots__ = ["total", "connect", "read"]
+	
+	def __init__(self, total=None, connect=None, read=None):
+		self.total = total
+		self.connect = connect
+		self.read = read
+	
+	def __repr__(self):
+		return 'OctopartTimeout(total=%r, connect=%r, read=%r)' % (self.total, self.connect, self.read)
+
+class OctopartCancelToken(object):
+	
+	"""Cancels the API calls it is passed to, from any thread.
+	
+	Cancellation is cooperative: a call stops with OctopartException code 16 at the 
+	next point it checks the token, which is before queueing, before each request 
+	attempt, between reads of the response body and before the result is built.
+	"""
+	
+	def __init__(self):
+		self._event = threading.Event()
+	
+	def cancel(self):
+		self._event.set()
+	
+	@property
+	def cancelled(self):
+		return self._event.is_set()
+
+class _CallLimits(object):
+	
+	"""The timeout and cancel token of one API call, with its absolute deadline."""
+	
+	__slots__ = ["timeout", "cancel", "expires"]
+	
+	def __init__(self, timeout, cancel):
+		if timeout is not None and not isinstance(timeout, OctopartTimeout):
+			timeout = OctopartTimeout(total=timeout)
+		self.timeout = timeout
+		self.cancel = cancel
+		self.expires = None
+		if timeout is not None and timeout.total is not None:
+			self.expires = _timer() + timeout.total
+	
+	def remaining(self):
+		"""Returns the seconds left before the deadline, or None if there is none."""
+		
+		if self.expires is None:
+			return None
+		return self.expires - _timer()
+	
+	def check(self):
+		"""@raise OctopartException: If the call was cancelled or its deadline has passed."""
+		
+		if self.cancel is not None and self.cancel.cancelled:
+			raise OctopartException({}, {}, {}, 16)
+		if self.expires is not None and _timer() >= self.expires:
+			raise OctopartException({}, {}, {'timeout' : self.timeout}, 15)
+	
+	def _limit(self, timeout):
+		remaining = self.remaining()
+		if remaining is None:
+			return timeout
+		remaining = max(remaining, 0.001)
+		return remaining if timeout is None else min(timeout, remaining)
+	
+	def connect_timeout(self):
+		return self._limit(self.timeout.connect if self.timeout is not None else None)
+	
+	def read_timeout(self):
+		return self._limit(self.timeout.read if self.timeout is not None else None)
+
+class _ReadTimeoutMixin(object):
+	
+	"""Switches an httplib connection's socket to a separate timeout once connected."""
+	
+	def __init__(self, host, read_timeout=None, **kwargs):
+		self._base.__init__(self, host, **kwargs)
+		self.read_timeout = read_timeout
+	
+	def connect(self):
+		self._base.connect(self)
+		if self.read_timeout is not None:
+			self.sock.settimeout(self.read_timeout)
+
+class _HTTPConnection(_ReadTimeoutMixin, httplib.HTTPConnection):
+	_base = httplib.HTTPConnection
+
+class _HTTPSConnection(_ReadTimeoutMixin, httplib.HTTPSConnection):
+	_base = httplib.HTTPSConnection
+
+class _HTTPHandler(urllib2.HTTPHandler):
+	
+	def __init__(self, read_timeout):
+		urllib2.HTTPHandler.__init__(self)
+		self.read_timeout = read_timeout
+	
+	def http_open(self, req):
+		return self.do_open(lambda host, **kwargs: _HTTPConnection(host, self.read_timeout, **kwargs), req)
+
+class _HTTPSHandler(urllib2.HTTPSHandler):
+	
+	def __init__(self, read_timeout):
+		urllib2.HTTPSHandler.__init__(self)
+		self.read_timeout = read_timeout
+	
+	def https_open(self, req):
+		return self.do_open(lambda host, **kwargs: _HTTPSConnection(host, self.read_timeout, **kwargs), req, \
+						context=self._context)
+
+class UrllibTransport(object):
+	
+	"""Fetches request URLs from the network with urllib2."""
+	
+	def open(self, req_url, connect_timeout=None, read_timeout=None):
+		"""Return a file-like object for the response, once its headers have arrived.
+		
+		@param connect_timeout: Seconds allowed to open the connection, or None to wait indefinitely.
+		@param read_timeout: Seconds allowed for each wait for data once connected, 
+		or None to use the connect timeout.
+		@raise urllib2.HTTPError: If the server returns an error status.
+		@raise urllib2.URLError: If the connection cannot be opened in time.
+		@raise socket.timeout: If the server does not send data in time.
+		"""
+		
+		if connect_timeout is None and read_timeout is None:
+			return urllib2.urlopen(req_url)
+		if read_timeout is None:
+			return urllib2.urlopen(req_url, timeout=connect_timeout)
+		opener = urllib2.build_opener(_HTTPHandler(read_timeout), _HTTPSHandler(read_timeout))
+		if connect_timeout is None:
+			return opener.open(req_url)
+		return opener.open(req_url, timeout=connect_timeout)
+	
+	def fetch(self, req_url):
+		"""Return the response body for a request URL.
+		
+		@raise urllib2.HTTPError: If the server returns an error status.
+		"""
+		
+		return self.open(req_url).read()
+
+def canonical_url(req_url):
+	"""Returns the key identifying a request URL in recordings.
+	
+	The key is the API method path and the sorted query arguments, without the
+	apikey and callback arguments, so that recordings made with one key and API 
+	root can be replayed with any other.
+	"""
+	
+	parts = urlparse.urlsplit(req_url)
+	method = '/'.join(parts.path.rstrip('/').split('/')[-2:])
+	args = sorted(urllib2.unquote(arg) for arg in parts.query.split('&') \
+				if arg and arg.split('=', 1)[0] not in ('apikey', 'callback'))
+	if args:
+		return '?'.join((method, '&'.join(args)))
+	return method
+
+class RecordingTransport(object):
+	
+	"""Passes requests through to another transport, recording each response.
+	
+	Recordings are saved as a JSON dictionary of canonical_url() -> 
+	{'status': HTTP status code, 'body': response body}.
+	"""
+	
+	def __init__(self, transport=None, recordings=None):
+		"""
+		@param transport: The transport which makes the actual requests.
+		@param recordings: Dictionary to add recordings to.
+		"""
+		
+		self.transport = transport if transport is not None else UrllibTransport()
+		self.recordings = recordings if recordings is not None else {}
+		self._lock = threading.Lock()
+	
+	def fetch(self, req_url):
+		try:
+			body = self.transport.fetch(req_url)
+		except urllib2.HTTPError as e:
+			with self._lock:
+				self.recordings[canonical_url(req_url)] = {'status' : e.code, 'body' : ''}
+			raise
+		with self._lock:
+			self.recordings[canonical_url(req_url)] = {'status' : 200, 'body' : body}
+		return body
+	
+	def save(self, path):
+		"""Write the recordings to a JSON file, merging with any recordings already in it."""
+		
+		recordings = {}
+		if os.path.exists(path):
+			recordings = load_recordings(path)
+		with self._lock:
+			recordings.update(self.recordings)
+		with open(path, 'w') as f:
+			json.dump(recordings, f, indent=1, sort_keys=True)
+
+def load_recordings(path):
+	"""Load a recordings dictionary saved by RecordingTransport.save()."""
+	
+	with open(path) as f:
+		return json.load(f)
+
+class ReplayTransport(object):
+	
+	"""Serves recorded responses without touching the network."""
+	
+	def __init__(self, recordings):
+		"""
+		@param recordings: A recordings dictionary, or the path of a recordings file.
+		"""
+		
+		if isinstance(recordings, basestring):
+			recordings = load_recordings(recordings)
+		self.recordings = recordings
+	
+	def fetch(self, req_url):
+		"""Return the recorded response body for a request URL.
+		
+		@raise urllib2.HTTPError: If an error status was recorded for the request.
+		@raise OctopartException: If the request was never recorded.
+		"""
+		
+		recording = self.recordings.get(canonical_url(req_url))
+		if recording is None:
+			raise OctopartException({'url' : req_url}, {}, {}, 12)
+		if recording['status'] != 200:
+			raise urllib2.HTTPError(req_url, recording['status'], 'Recorded HTTP error', None, None)
+		return recording['body']
+
+class _KeyState(object):
+	
+	"""Usage of one API key in an OctopartKeyPool."""
+	
+	__slots__ = ["key", "next_request", "cooldown_until", "window_start", "used", "requests", "errors"]
+	
+	def __init__(self, key, now):
+		self.key = key
+		self.next_request = now
+		self.cooldown_until = now
+		self.window_start = now
+		self.used = 0
+		self.requests = 0
+		self.errors = 0
+
+class OctopartKeyPool(object):
+	
+	"""Distributes requests across several API keys in turn.
+	
+	Each key is limited to rate requests per second and quota requests per 
+	quota_period seconds. A key whose request is refused with one of 
+	cooldown_statuses is rested for cooldown seconds. Pass a pool as the apikey 
+	of an Octopart client; refused requests are retried with the next key.
+	"""
+	
+	cooldown_statuses = frozenset((403, 503))
+	# Longest wait between checks of a cancel token
+	cancel_poll_interval = 0.1
+	
+	def __init__(self, keys, rate=None, quota=None, quota_period=86400, cooldown=60):
+		"""
+		@param keys: List of API key strings.
+		@param rate: Maximum requests per second per key, or None for no limit.
+		@param quota: Maximum requests per key in each quota_period, or None for no limit.
+		@param quota_period: Length in seconds of each key's quota window.
+		@param cooldown: Seconds a key is rested after a refused request.
+		"""
+		
+		if not keys:
+			raise ValueError('OctopartKeyPool needs at least one key')
+		now = _timer()
+		self._states = [_KeyState(key, now) for key in keys]
+		self._by_key = dict((state.key, state) for state in self._states)
+		self.rate = rate
+		self.quota = quota
+		self.quota_period = quota_period
+		self.cooldown = cooldown
+		self._next = 0
+		self._lock = threading.Lock()
+	
+	def __len__(self):
+		return len(self._states)
+	
+	@property
+	def keys(self):
+		"""List of the pool's API keys, in the order they are used."""
+		
+		return [state.key for state in self._states]
+	
+	def _ready_at(self, state, now):
+		"""Returns the time at which a key can next be used, or None if it has used up 
+		its quota for the current window.
+		"""
+		
+		if self.quota is not None and state.used >= self.quota and now - state.window_start < self.quota_period:
+			return None
+		return max(state.next_request, state.cooldown_until)
+	
+	def acquire(self, timeout=None, cancel=None):
+		"""Take the next key which may be used, waiting for one if every key with 
+		quota left is rate limited or cooling down.
+		
+		@param timeout: Longest time in seconds to wait for a key.
+		@param cancel: OctopartCancelToken which stops the wait.
+		@return: An API key string.
+		@raise OctopartException: If every key has used up its quota for the current 
+		window, the timeout would pass before a key is ready, or the wait is cancelled.
+		"""
+		
+		start = _timer()
+		while True:
+			if cancel is not None and cancel.cancelled:
+				raise OctopartException({}, {}, {}, 16)
+			with self._lock:
+				now = _timer()
+				earliest = None
+				for i in xrange(len(self._states)):
+					index = (self._next + i) % len(self._states)
+					state = self._states[index]
+					ready_at = self._ready_at(state, now)
+					if ready_at is None:
+						continue
+					if ready_at <= now:
+						if self.quota is not None and now - state.window_start >= self.quota_period:
+							state.window_start = now
+							state.used = 0
+						state.used += 1
+						state.requests += 1
+						if self.rate:
+							state.next_request = now + 1.0 / self.rate
+						self._next = index + 1
+						return state.key
+					if earliest is None or ready_at < earliest:
+						earliest = ready_at
+				if earliest is None:
+					raise OctopartException({'keys' : len(self._states)}, {}, {'quota' : self.quota}, 13)
+			if timeout is not None and earliest - start > timeout:
+				raise OctopartException({}, {}, {'timeout' : timeout}, 15)
+			delay = earliest - now
+			if cancel is not None:
+				delay = min(delay, self.cancel_poll_interval)
+			time.sleep(delay)
+	
+	def report(self, key, status):
+		"""Record the HTTP status of a request made with a key.
+		
+		Keys refused with one of cooldown_statuses are not handed out again for 
+		cooldown seconds.
+		"""
+		
+		with self._lock:
+			state = self._by_key[key]
+			if status in self.cooldown_statuses:
+				state.errors += 1
+				state.cooldown_until = _timer() + self.cooldown
+	
+	def stats(self):
+		"""Return a dictionary of key -> dictionary of request and error counts, 
+		requests remaining in the current quota window and whether the key is cooling down.
+		"""
+		
+		with self._lock:
+			now = _timer()
+			stats = {}
+			for state in self._states:
+				remaining = None
+				if self.quota is not None:
+					remaining = self.quota
+					if now - state.window_start < self.quota_period:
+						remaining -= state.used
+				stats[state.key] = {'requests' : state.requests, 'errors' : state.errors, \
+								'remaining' : remaining, 'cooling_down' : state.cooldown_until > now}
+			return stats
+
+class _Waiter(object):
+	
+	"""A request queued in an OctopartRequestScheduler."""
+	
+	__slots__ = ["priority_class", "priority", "queued", "sequence"]
+	
+	def __init__(self, priority_class, priority, queued, sequence):
+		self.priority_class = priority_class
+		self.priority = priority
+		self.queued = queued
+		self.sequence = sequence
+	
+	def rank(self, now, aging):
+		# Waiting lowers the rank, so queued bulk requests eventually go first
+		if aging:
+			return (self.priority - (now - self.queued) / aging, self.sequence)
+		return (self.priority, self.sequence)
+
+class OctopartRequestScheduler(object):
+	
+	"""Limits the number of requests a client has in flight, admitting queued 
+	requests in priority order.
+	
+	Each API method belongs to a priority class, which has a priority (lower goes 
+	first), an optional limit on its requests in flight, and an optional deadline 
+	in seconds for a request to leave the queue. Keeping the bulk class below the 
+	overall limit leaves room for interactive requests to start at once. A queued 
+	request's priority improves by one every aging seconds, so bulk work is not starved.
+	"""
+	
+	# Priority class of each API method; other methods are 'normal'
+	method_classes = {'parts/suggest' : 'interactive', \
+					'parts/get' : 'interactive', \
+					'parts/match' : 'interactive', \
+					'parts/get_multi' : 'bulk', \
+					'bom/match' : 'bulk'}
+	# Longest wait between checks of a cancel token
+	cancel_poll_interval = 0.1
+	
+	def __init__(self, max_concurrent=4, classes=None, aging=10.0):
+		"""
+		@param max_concurrent: Maximum number of requests in flight.
+		@param classes: Dictionary of class name -> dictionary with 'priority' and optional 
+		'max_concurrent' and 'deadline' keys. Defaults to 'interactive', 'normal' and 'bulk' 
+		classes, with bulk requests limited to all but one of the max_concurrent slots.
+		@param aging: Seconds of queueing which improve a request's priority by one, or 
+		None to admit requests strictly by priority.
+		"""
+		
+		if classes is None:
+			classes = {'interactive' : {'priority' : 0}, \
+					'normal' : {'priority' : 1}, \
+					'bulk' : {'priority' : 2, 'max_concurrent' : max(1, max_concurrent - 1)}}
+		self.max_concurrent = max_concurrent
+		self.classes = classes
+		self.aging = aging
+		self.active = dict((name, 0) for name in classes)
+		self._total = 0
+		self._waiters = []
+		self._sequence = itertools.count()
+		self._condition = threading.Condition()
+	
+	def classify(self, method):
+		"""Return the priority class of an API method."""
+		
+		return self.method_classes.get(method, 'normal')
+	
+	def _has_room(self, priority_class):
+		limit = self.classes[priority_class].get('max_concurrent')
+		return self._total < self.max_concurrent and (limit is None or self.active[priority_class] < limit)
+	
+	def _admissible(self, waiter, now):
+		"""Checks whether a waiter is the best ranked of the queued requests with room to start."""
+		
+		if not self._has_room(waiter.priority_class):
+			return False
+		rank = waiter.rank(now, self.aging)
+		for other in self._waiters:
+			if other is not waiter and other.rank(now, self.aging) < rank and self._has_room(other.priority_class):
+				return False
+		return True
+	
+	def acquire(self, priority_class, timeout=None, cancel=None):
+		"""Wait for a request of a priority class to be admitted.
+		
+		@param timeout: Longest time in seconds the caller will wait.
+		@param cancel: OctopartCancelToken which stops the wait.
+		@return: Seconds spent queueing.
+		@raise OctopartException: If the class deadline (code 14) or the timeout 
+		(code 15) passes first, or the wait is cancelled (code 16).
+		"""
+		
+		settings = self.classes[priority_class]
+		deadline = settings.get('deadline')
+		with self._condition:
+			queued = _timer()
+			waiter = _Waiter(priority_class, settings['priority'], queued, next(self._sequence))
+			self._waiters.append(waiter)
+			try:
+				while True:
+					now = _timer()
+					if self._admissible(waiter, now):
+						break
+					if cancel is not None and cancel.cancelled:
+						raise OctopartException({'class' : priority_class}, {}, {}, 16)
+					if deadline is not None and now - queued >= deadline:
+						raise OctopartException({'class' : priority_class}, {}, {'deadline' : deadline}, 14)
+					if timeout is not None and now - queued >= timeout:
+						raise OctopartException({'class' : priority_class}, {}, {'timeout' : timeout}, 15)
+					waits = [limit - (now - queued) for limit in (deadline, timeout) if limit is not None]
+					if cancel is not None:
+						waits.append(self.cancel_poll_interval)
+					self._condition.wait(min(waits) if waits else None)
+			finally:
+				self._waiters.remove(waiter)
+				# Whether admitted or not, the best remaining request may now be admissible
+				self._condition.notify_all()
+			self.active[priority_class] += 1
+			self._total += 1
+			return _timer() - queued
+	
+	def release(self, priority_class):
+		"""Mark a request of a priority class as finished."""
+		
+		with self._condition:
+			self.active[priority_class] -= 1
+			self._total -= 1
+			self._condition.notify_all()
+	
+	def queued(self):
+		"""Return a dictionary of class name -> number of queued requests."""
+		
+		with self._condition:
+			counts = dict((name, 0) for name in self.classes)
+			for waiter in self._waiters:
+				counts[waiter.priority_class] += 1
+			return counts
+
+class OctopartNegativeCache(object):
+	
+	"""Remembers lookups which found nothing, so they are not repeated.
+	
+	Entries are (kind, key) pairs: ('part', uid), ('category', id), 
+	('attribute', fieldname) and ('bom_line', line key) for bom_match lines with 
+	status "no_match". Entries expire after ttl seconds, which should be shorter than 
+	the time taken for new parts to appear. The oldest entries are evicted beyond 
+	max_entries. Pass a cache as the negative_cache of an Octopart client.
+	"""
+	
+	kinds = ('part', 'category', 'attribute', 'bom_line')
+	
+	def __init__(self, ttl=21600, max_entries=1000000):
+		"""
+		@param ttl: Seconds for which a miss is remembered.
+		@param max_entries: Number of misses to keep.
+		"""
+		
+		self.ttl = ttl
+		self.max_entries = max_entries
+		self.hits = 0
+		self._entries = collections.OrderedDict()
+		self._lock = threading.Lock()
+	
+	def __len__(self):
+		return len(self._entries)
+	
+	@staticmethod
+	def line_key(line):
+		"""Returns the key of a bom_match line, ignoring its reference string."""
+		
+		return json.dumps(dict((k, v) for k, v in line.items() if k != 'reference'), sort_keys=True)
+	
+	def add(self, kind, keys):
+		"""Remember that lookups of keys of a kind found nothing.
+		
+		@param kind: One of OctopartNegativeCache.kinds.
+		@param keys: Iterable of uids, category ids, fieldnames or line keys.
+		"""
+		
+		expires = _timer() + self.ttl
+		with self._lock:
+			for key in keys:
+				entry = (kind, key)
+				self._entries.pop(entry, None)
+				self._entries[entry] = expires
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+	
+	def contains(self, kind, key):
+		"""Returns True if a lookup of key is known to find nothing."""
+		
+		entry = (kind, key)
+		with self._lock:
+			expires = self._entries.get(entry)
+			if expires is None:
+				return False
+			if expires <= _timer():
+				del self._entries[entry]
+				return False
+			self.hits += 1
+			return True
+	
+	def invalidate(self, kind=None, keys=None):
+		"""Forget misses, such as after a catalog update.
+		
+		@param kind: Only forget entries of this kind, or None for every kind.
+		@param keys: Only forget these keys, or None for every key.
+		@return: Number of entries forgotten.
+		"""
+		
+		with self._lock:
+			if keys is not None:
+				kinds = self.kinds if kind is None else (kind,)
+				entries = [(k, key) for k in kinds for key in keys if (k, key) in self._entries]
+			elif kind is not None:
+				entries = [entry for entry in self._entries if entry[0] == kind]
+			else:
+				entries = list(self._entries)
+			for entry in entries:
+				del self._entries[entry]
+			return len(entries)
+	
+	def clear(self):
+		"""Forget every miss."""
+		
+		with self._lock:
+			self._entries.clear()
+
+class Octopart(object):
+	
+	"""A simple client frontend to tho Octopart public REST API. 
+	
+	For detailed API documentation, refer to http://octopart.com/api/documentation.
+	
+	A client can be shared by many threads. Its methods never modify their 
+	arguments or the client, each call builds its own immutable OctopartRequest, 
+	and the key pool, scheduler, caches, hooks and transports it is given do their 
+	own locking.
+	"""
+	
+	api_url = 'http://octopart.com/api/v2/'
+	# Bytes read at a time from responses of calls with a timeout or cancel token
+	read_chunk_size = 65536
+	# Longest request URL made by plan_batches() and iter_batches(), by default
+	default_max_url_length = 2048
+	# Most items the API accepts in one request to each multi-item method, where it has a limit
+	batch_limits = {'parts/get_multi' : 100}
+	# Name of the list argument of each multi-item method
+	batch_args = {'parts/get_multi' : 'uids', \
+				'categories/get_multi' : 'ids', \
+				'partattributes/get_multi' : 'fieldnames', \
+				'bom/match' : 'lines'}
+	__slots__ = ["apikey", "callback", "pretty_print", "transport", "base_url", "hooks", "optimize", "hydration", "scheduler", "timeout", "negative_cache", "max_url_length"]
+	
+	# Named sets of default optimize.* arguments.
+	# Each method only uses the arguments it accepts: optimize.return_stubs applies to bom_match alone.
+	optimize_profiles = {'full' : {}, \
+						'pricing' : {'optimize.hide_datasheets' : True, \
+									'optimize.hide_descriptions' : True, \
+									'optimize.hide_images' : True, \
+									'optimize.hide_specs' : True}, \
+						'authorized_pricing' : {'optimize.hide_datasheets' : True, \
+									'optimize.hide_descriptions' : True, \
+									'optimize.hide_images' : True, \
+									'optimize.hide_specs' : True, \
+									'optimize.hide_unauthorized_offers' : True}, \
+						'minimal' : {'optimize.return_stubs' : True, \
+									'optimize.hide_datasheets' : True, \
+									'optimize.hide_descriptions' : True, \
+									'optimize.hide_images' : True, \
+									'optimize.hide_offers' : True, \
+									'optimize.hide_specs' : True}}
+	
+	def __init__(self, apikey=None, callback=None, pretty_print=False, transport=None, base_url=None, hooks=None, \
+				optimize=None, hydration=None, scheduler=None, timeout=None, negative_cache=None, \
+				max_url_length=None):
+		"""
+		@param apikey: API key string, or an OctopartKeyPool to spread requests over several keys.
+		@param transport: Object whose fetch(req_url) method returns the response body 
+		for a request URL. Defaults to an UrllibTransport.
+		@param base_url: API root URL, for use with a proxy or OctopartStubServer. 
+		Defaults to Octopart.api_url.
+		@param hooks: List of OctopartHooks instances notified of every API call.
+		@param optimize: Default optimize.* arguments for parts_get, parts_get_multi, 
+		parts_search and bom_match, as a dict or the name of one of optimize_profiles.
+		Arguments passed to a method call take precedence.
+		@param hydration: OctopartHydrationPool used to build the parts returned by 
+		parts_get_multi, parts_search and bom_match. By default parts are built in 
+		the calling thread.
+		@param scheduler: OctopartRequestScheduler which admits this client's requests.
+		A scheduler may be shared by several clients.
+		@param timeout: Default OctopartTimeout, or total seconds, for each API call.
+		Every API method also takes timeout and cancel (an OctopartCancelToken) 
+		keyword arguments for that call alone.
+		@param negative_cache: OctopartNegativeCache of the uids, category ids, 
+		fieldnames and bom_match lines for which lookups have found nothing. 
+		Lookups of these return no result without a request.
+		@param max_url_length: Longest request URL made by plan_batches() and 
+		iter_batches(). Defaults to Octopart.default_max_url_length.
+		@raise ValueError: If optimize names an unknown profile.
+		"""
+		
+		self.apikey = apikey
+		self.callback = callback
+		self.pretty_print = pretty_print
+		self.transport = transport if transport is not None else UrllibTransport()
+		self.base_url = base_url if base_url is not None else Octopart.api_url
+		self.hooks = list(hooks or [])
+		if isinstance(optimize, basestring):
+			if optimize not in Octopart.optimize_profiles:
+				raise ValueError('Unknown optimize profile: %s' % optimize)
+			optimize = Octopart.optimize_profiles[optimize]
+		self.optimize = self._translate_periods(dict(optimize or {}))
+		self.hydration = hydration
+		self.scheduler = scheduler
+		self.timeout = timeout
+		self.negative_cache = negative_cache
+		self.max_url_length = max_url_length if max_url_length is not None else Octopart.default_max_url_length
+	
+	def _validate_args(self, args, arg_types, arg_ranges):
+		""" Checks method arguments for syntax errors.
+		
+		@param args: Dictionary of argumets to check
+		@param arg_types: Dictionary which contains the correct data type for each argument.
+		@param arg_ranges: Dictionary which contains range() calls for any numeric arguments with a limited range.
+		Can also be used to constrain string argument length. For string arguments, contains a (min, max) pair.
+		@raise OctopartException: If any syntax errors are found.
+		"""
+		
+		valid_args = frozenset(arg_types.keys())
+		args_set = set(args.keys())
+		
+		if args_set.issubset(valid_args) is False:
+			raise OctopartException(args, arg_types, arg_ranges, 1)
+		for key in args_set:
+			if arg_types[key] is StringType:
+				if isinstance(args[key], basestring) is False:
+					raise OctopartException(args, arg_types, arg_ranges, 2)
+			elif type(arg_types[key]) is TupleType:	# Tuple of types
+				if type(args[key]) not in arg_types[key]:
+					raise OctopartException(args, arg_types, arg_ranges, 2)
+			else:
+				if type(args[key]) is not arg_types[key]:
+					raise OctopartException(args, arg_types, arg_ranges, 2)
+			if key in arg_ranges.keys():
+				if arg_types[key] in (IntType, LongType, FloatType):
+					if args[key] < arg_ranges[key][0] or args[key] > arg_ranges[key][1]:
+						raise OctopartException(args, arg_types, arg_ranges, 4)
+				elif len(args[key]) < arg_ranges[key][0] or len(args[key]) > arg_ranges[key][1]:
+					if arg_types[key] is StringType:
+						raise OctopartException(args, arg_types, arg_ranges, 5)
+					elif arg_types[key] is ListType:
+						raise OctopartException(args, arg_types, arg_ranges, 11)
+		if len(args_set) != len(args.keys()):
+			raise OctopartException(args, arg_types, arg_ranges, 3)
+	
+	def _request(self, method, args):
+		"""Builds the OctopartRequest for a method call, adding the client's options.
+		
+		@param method: String containing the method path, such as "parts/search".
+		@param args: Dictionary of arguments to pass to the API method. It is not modified.
+		"""
+		
+		if self.callback or self.pretty_print:
+			args = dict(args)
+			if self.callback:
+				args['callback'] = self.callback
+			if self.pretty_print:
+				args['pretty_print'] = self.pretty_print
+		return OctopartRequest.from_args(method, args)
+	
+	def _apikey(self, apikey=None):
+		"""Returns the API key string to add to a request URL, if any."""
+		
+		apikey = apikey if apikey is not None else self.apikey
+		if isinstance(apikey, OctopartKeyPool):
+			return None
+		return apikey
+	
+	def _make_url(self, method, args, apikey=None):
+		"""Constructs the URL to pass to _get().
+		
+		@param method: String containing the method path, such as "parts/search".
+		@param args: Dictionary of arguments to pass to the API method. It is not modified.
+		@param apikey: API key to use in place of the client's apikey.
+		@return: Complete request URL string.
+		"""
+		
+		return self._request(method, args).url(self.base_url, self._apikey(apikey))
+	
+	def _get(self, req_url, call=None, limits=None):
+		"""Makes a GET request with the given API method and arguments.
+		
+		@param req_url: Complete API request URL. 
+		@param call: OctopartCall to record phase timings and byte counts in.
+		@param limits: _CallLimits of the call. Only transports with open() are 
+		given timeouts, and interrupted between reads of the body.
+		@return: JSON response from server.
+		@raise OctopartException: If the call is cancelled or runs out of time.
+		"""
+		
+		return self._get_response(req_url, call, limits)[0]
+	
+	def _get_response(self, req_url, call=None, limits=None):
+		"""Makes a GET request as _get() does.
+		
+		@return: A pair of the JSON response from server and the raw response body.
+		"""
+		
+		start = _timer()
+		open_url = getattr(self.transport, 'open', None)
+		try:
+			if limits is not None:
+				limits.check()
+			if open_url is None:
+				response = self.transport.fetch(req_url)
+			else:
+				# Transports with open() let the wait for the response headers be
+				# timed separately from the body download
+				if limits is None:
+					f = open_url(req_url)
+				else:
+					f = open_url(req_url, limits.connect_timeout(), limits.read_timeout())
+				opened = _timer()
+				try:
+					if limits is None:
+						response = f.read()
+					else:
+						chunks = []
+						while True:
+							limits.check()
+							chunk = f.read(self.read_chunk_size)
+							if not chunk:
+								break
+							chunks.append(chunk)
+						response = ''.join(chunks)
+				finally:
+					f.close()
+		except Exception as e:
+			if call is not None:
+				call.phases['network'] = _timer() - start
+			if limits is not None and (isinstance(e, socket.timeout) or \
+								isinstance(getattr(e, 'reason', None), socket.timeout)):
+				raise OctopartException({'url' : req_url}, {}, {'timeout' : limits.timeout}, 15)
+			raise
+		received = _timer()
+		json_obj = json.loads(unicode(response))
+		if call is not None:
+			if open_url is None:
+				call.phases['network'] = received - start
+			else:
+				call.phases['network'] = opened - start
+				call.phases['download'] = received - opened
+			call.phases['parse'] = _timer() - received
+			call.bytes += len(response)
+		return json_obj, response
+	
+	def _event(self, call, name):
+		"""Records a named event, such as a cache hit or retry, during an API call."""
+		
+		call.events.append(name)
+		for hook in self.hooks:
+			hook.event(call, name)
+	
+	def _uncached(self, call, kind, keys):
+		"""Returns the keys not in the negative cache, recording a 'cache_hit' event 
+		for each key which is.
+		"""
+		
+		if self.negative_cache is None:
+			return list(keys)
+		remaining = []
+		for key in keys:
+			if self.negative_cache.contains(kind, key):
+				self._event(call, 'cache_hit')
+			else:
+				remaining.append(key)
+		return remaining
+	
+	def _add_missing(self, kind, keys):
+		"""Adds keys whose lookup found nothing to the negative cache."""
+		
+		if self.negative_cache is not None:
+			self.negative_cache.add(kind, keys)
+	
+	def _fetch(self, request, call, limits=None):
+		"""Makes the request for an API call.
+		
+		If the client's apikey is an OctopartKeyPool, each attempt takes the next key, 
+		and a request refused with one of the pool's cooldown_statuses is retried with 
+		another key, up to once per key.
+		@param request: OctopartRequest to make.
+		@param call: OctopartCall to record the URL, phase timings and retries in.
+		@param limits: _CallLimits of the call, which also bound waits for a key.
+		@return: A pair of the JSON response from server and the raw response body.
+		"""
+		
+		keys = self.apikey if isinstance(self.apikey, OctopartKeyPool) else None
+		attempt = 1
+		while True:
+			key = None
+			if keys is not None:
+				if limits is None:
+					key = keys.acquire()
+				else:
+					key = keys.acquire(limits.remaining(), limits.cancel)
+			call.url = req_url = request.url(self.base_url, self._apikey(key))
+			try:
+				return self._get_response(req_url, call, limits)
+			except urllib2.HTTPError as e:
+				if keys is None:
+					raise
+				keys.report(key, e.code)
+				if e.code not in keys.cooldown_statuses or attempt >= len(keys):
+					raise
+				attempt += 1
+				self._event(call, 'retry')
+	
+	def _call(self, method, make_args, build, none_on_404=False, batch_size=None, timeout=None, cancel=None, \
+			cached=None, missing=None, with_body=False):
+		"""Performs an API call, notifying hooks of its progress.
+		
+		@param method: String containing the method path, such as "parts/search".
+		@param make_args: Function returning the validated arguments dict.
+		@param build: Function converting the JSON response to the method's return value.
+		@param none_on_404: Return None on HTTP Error 404 rather than raising an exception.
+		@param batch_size: Number of items requested, for multi-item methods.
+		@param timeout: OctopartTimeout or total seconds for this call, in place of the client's timeout.
+		@param cancel: OctopartCancelToken for this call.
+		@param cached: Function called with the OctopartCall and the validated arguments 
+		before any request, returning a pair of whether the call is answered from a cache 
+		and, if so, its result. It may remove cached items from the arguments.
+		@param missing: Function called when none_on_404 turns an HTTP Error 404 into None.
+		@param with_body: Also pass build the raw response body, for the hydration pool.
+		@return: The result of build, or None if no JSON object is found.
+		"""
+		
+		call = OctopartCall(method, batch_size)
+		for hook in self.hooks:
+			hook.call_started(call)
+		try:
+			start = _timer()
+			args = make_args()
+			call.phases['validate'] = _timer() - start
+			if cached is not None:
+				hit, result = cached(call, args)
+				if hit:
+					return result
+			if timeout is None:
+				timeout = self.timeout
+			limits = None
+			if timeout is not None or cancel is not None:
+				limits = _CallLimits(timeout, cancel)
+			start = _timer()
+			request = self._request(method, args)
+			call.phases['url'] = _timer() - start
+			try:
+				if self.scheduler is None:
+					json_obj, body = self._fetch(request, call, limits)
+				else:
+					priority_class = self.scheduler.classify(method)
+					if limits is None:
+						call.phases['queue'] = self.scheduler.acquire(priority_class)
+					else:
+						call.phases['queue'] = self.scheduler.acquire(priority_class, limits.remaining(), cancel)
+					try:
+						json_obj, body = self._fetch(request, call, limits)
+					finally:
+						self.scheduler.release(priority_class)
+			except urllib2.HTTPError as e:
+				if e.code == 404:
+					if none_on_404:
+						if missing is not None:
+							missing()
+						return None
+					raise OctopartException(args, {}, {}, 7)
+				elif e.code == 503:
+					raise OctopartException(args, {}, {}, 8)
+				else:
+					raise
+			if not json_obj:
+				return None
+			if cancel is not None and cancel.cancelled:
+				raise OctopartException(args, {}, {}, 16)
+			start = _timer()
+			result = build(json_obj, body) if with_body else build(json_obj)
+			call.phases['build'] = _timer() - start
+			return result
+		except Exception as e:
+			call.error = e
+			raise
+		finally:
+			call.duration = _timer() - call.start
+			for hook in self.hooks:
+				hook.call_finished(call)
+	
+	def _translate_periods(self, args):
+		"""Translates Python-friendly keyword arguments to valid Octopart API arguments.
+		
+		Several Octopart API arguments contain a period in their name.
+		Unfortunately, trying to unpack a keyword argument in a Python function with 
+		a period in the argument name will cause a syntax code: 
+		'keyword can't be an expression'
+		
+		Therefore, the Python API methods expect an underscore in place of the
+		periods in the argument names. This method replaces those underscores with
+		periods for passing to the private class methods, which do not attempt
+		to unpack the arguments dict.
+		
+		@param args: Unpackable keyword arguments dict from a public API call. 
+		It is not modified.
+		@return New translated keyword arguments dict.
+		"""
+		
+		translation = {'drilldown_include' : 'drilldown.include', \
+					'drilldown_fieldname' : 'drilldown.fieldname', \
+					'drilldown_facets_prefix' : 'drilldown.facets.prefix', \
+					'drilldown_facets_start' : 'drilldown.facets.start', \
+					'drilldown_facets_limit' : 'drilldown.facets.limit', \
+					'drilldown_facets_sortby' : 'drilldown.facets.sortby', \
+					'drilldown_facets_include_hits' : 'drilldown.facets.include_hits', \
+					'optimize_return_stubs' : 'optimize.return_stubs', \
+					'optimize_hide_datasheets' : 'optimize.hide_datasheets', \
+					'optimize_hide_descriptions' : 'optimize.hide_descriptions', \
+					'optimize_hide_images' : 'optimize.hide_images', \
+					'optimize_hide_offers' : 'optimize.hide_offers', \
+					'optimize_hide_unauthorized_offers' : 'optimize.hide_unauthorized_offers', \
+					'optimize_hide_specs' : 'optimize.hide_specs', \
+					# Misspelled names accepted by earlier versions
+					'optimize_hide_hide_offers' : 'optimize.hide_offers', \
+					'optimize_hide_hide_unauthorized_offers' : 'optimize.hide_unauthorized_offers'}
+		
+		translated = {}
+		for key, value in args.iteritems():
+			# Handle any list/dict arguments which may contain more arguments within 
+			if type(value) is DictType:
+				value = self._translate_periods(value)
+			elif type(value) is ListType:
+				value = [self._translate_periods(a) if type(a) is DictType else a for a in value]
+			translated[translation.get(key, key)] = value
+			
+		return translated
+	
+	# Part fields which the API can leave out of responses, and the flags to do so
+	_projection_flags = {'images' : 'optimize_hide_images', \
+						'datasheets' : 'optimize_hide_datasheets', \
+						'descriptions' : 'optimize_hide_descriptions', \
+						'specs' : 'optimize_hide_specs', \
+						'offers' : 'optimize_hide_offers'}
+	
+	def _projection(self, kwargs):
+		"""Removes a 'fields' projection from public method keyword arguments.
+		
+		Sets the optimize.hide_* flags for any fields outside the projection which the
+		API can omit, unless the caller passed those flags explicitly.
+		@param kwargs: Keyword arguments dict from a public API call.
+		@return: Frozenset of requested OctopartPart fields, or None if no projection was given.
+		@raise OctopartException: If an unknown field is requested.
+		"""
+		
+		fields = kwargs.pop('fields', None)
+		if fields is None:
+			return None
+		fields = frozenset(fields)
+		if not fields.issubset(OctopartPart.PROJECTABLE_FIELDS):
+			raise OctopartException({'fields' : sorted(fields)}, {'fields' : sorted(OctopartPart.PROJECTABLE_FIELDS)}, {}, 1)
+		for field, flag in self._projection_flags.iteritems():
+			if field not in fields:
+				kwargs.setdefault(flag, True)
+		return fields
+	
+	def _apply_optimize(self, args, arg_types):
+		"""Adds the client's default optimize.* arguments which the method accepts 
+		and the caller did not pass.
+		
+		@param args: Translated arguments dict.
+		@param arg_types: The method's valid argument types.
+		"""
+		
+		for key, value in self.optimize.iteritems():
+			if key in arg_types and key not in args:
+				args[key] = value
+	
+	def _hydrate(self, part_dicts, fields, body=None, path=None):
+		"""Builds OctopartParts from JSON part dicts, in the hydration pool if there is one.
+		
+		@param body: Raw response body the part dicts were parsed from, which is sent 
+		to the pool in their place.
+		@param path: Where the part dicts are in the body, as for OctopartHydrationPool.hydrate().
+		"""
+		
+		if self.hydration is None:
+			return [OctopartPart.new_from_dict(part, fields) for part in part_dicts]
+		return self.hydration.hydrate(part_dicts, fields, body, path)
+	
+	def _categories_get_args(self, id):
+		"""Validate and format arguments passed to categories_get().
+		
+		@return: Dictionary of valid arguments to pass to _make_url().
+		@raise OctopartException: Raised if invalid argument syntax is passed in.
+		"""
+		
+		arg_types = {'id': (IntType, LongType)}
+		arg_ranges = {}
+		args = {'id' : id}
+		self._validate_args(args, arg_types, arg_ranges)
+		
+		return args
+
+	def categories_get(self, id, timeout=None, cancel=None):
+		"""Fetch a category object by its id. 
+		
+		@return: A pair containing:
+			-The raw JSON result dictionary. 
+			-An OctopartCategory object.
+		If no JSON object is found without an Exception being raised, returns None.
+		"""
+		
+		return self._call('categories/get', lambda: self._categories_get_args(id), \
+						lambda json_obj: (json_obj, OctopartCategory.new_from_dict(json_obj)), none_on_404=True, timeout=timeout, cancel=cancel, \
+						cached=lambda call, args: (not self._uncached(call, 'category', [id]), None), \
+						missing=lambda: self._add_missing('category', [id]))
+
+	def _categories_get_multi_args(self, ids):
+		"""Validate and format arguments passed to categories_get_multi().
+		
+		@return: Dictionary of valid arguments to pass to _make_url().
+		@raise OctopartException: Raised if invalid argument syntax is passed in.
+		"""
+		
+		arg_types = {'ids': ListType}
+		arg_ranges = {}
+		args = {'ids' : ids}
+		self._validate_args(args, arg_types, arg_ranges)
+		for id in args['ids']:
+			if type(id) not in (IntType, LongType):
+				raise OctopartException(args, arg_types, arg_ranges, 2)
+		
+		return args
+	
+	def categories_get_multi(self, ids, timeout=None, cancel=None):
+		"""Fetch multiple category objects by their ids. 
+		
+		@return: A pair containing:
+			-The raw JSON result dictionary. 
+			-A list of OctopartCategory objects.
+		Ids in the client's negative cache are not requested.
+		If no JSON object is found without an Exception being raised, returns None.
+		"""
+		
+		remaining = []
+		def cached(call, args):
+			remaining[:] = args['ids'] = self._uncached(call, 'category', ids)
+			return bool(ids) and not remaining, ([], [])
+		def build(json_obj):
+			categories = [OctopartCategory.new_from_dict(category) for category in json_obj]
+			self._add_missing('category', set(remaining) - set(category.id for category in categories))
+			return json_obj, categories
+		return self._call('categories/get_multi', lambda: self._categories_get_multi_args(ids), build, \
+						batch_size=len(ids) if type(ids) is ListType else None, timeout=timeout, cancel=cancel, cached=cached)
+
+	def _categories_search_args(self, args):
+		"""Validate and format arguments passed to categories_search().
+		
+		@return: Dictionary of valid arguments to pass to _make_url().
+		@raise OctopartException: Raised if invalid argument syntax is passed in.
+		"""
+		
+		arg_types = {'q': StringType, 'start' : IntType, 'limit' : IntType, 'ancestor_id' : IntType}
+		arg_ranges = {}
+		self._validate_args(args, arg_types, arg_ranges)
+		
+		return args	
+	
+	def categories_search(self, timeout=None, cancel=None, **kwargs):
+		"""Execute search over all result objects. 
+		
+		@return: A pair containing:
+			-The raw JSON result dictionary. 
+			-A list of (OctopartCategory, highlight_text) pairs for each result.
+		If no JSON object is found without an Exception being raised, returns None.
+		"""
+		
+		def build(json_obj):
+			results = [(OctopartCategory.new_from_dict(result['item']), result['highlight']) for result in json_obj['results']]
+			return json_obj, results
+		return self._call('categories/search', lambda: self._categories_search_args(kwargs), build, timeout=timeout, cancel=cancel)
+
+	def _parts_get_args(self, uid, args):
+		"""Validate and format arguments passed to parts_get().
+		
+		@return: Dictionary of valid arguments to pass to _make_url().
+		@raise OctopartException: Raised if invalid argument syntax is passed in.
+		"""
+		
+		arg_types = {'uid': (IntType, LongType), \
+					'optimize.hide_datasheets' : BooleanType, \
+					'optimize.hide_descriptions' : BooleanType, \
+					'optimize.hide_images' : BooleanType, \
+					'optimize.hide_offers' : BooleanType, \
+					'optimize.hide_unauthorized_offers' : BooleanType, \
+					'optimize.hide_specs' : BooleanType}
+		arg_ranges = {}
+		args = self._translate_periods(args)
+		self._apply_optimize(args, arg_types)
+		args['uid'] = uid
+		self._validate_args(args, arg_types, arg_ranges)
+		
+		return args
+	
+	def parts_get(self, uid, timeout=None, cancel=None, **kwargs):
+		"""Fetch a part object by its id.
+		
+		@param fields: Optional set of OctopartPart fields to fetch and build. 
+		See OctopartPart.PROJECTABLE_FIELDS.
+		@return: A pair containing:
+			-The raw JSON result dictionary. 
+			-An OctopartPart object.
+		If no JSON object is found without an Exception being raised, returns None.
+		"""
+		
+		fields = self._projection(kwargs)
+		return self._call('parts/get', lambda: self._parts_get_args(uid, kwargs), \
+						lambda json_obj: (json_obj, OctopartPart.new_from_dict(json_obj, fields)), none_on_404=True, timeout=timeout, cancel=cancel, \
+						cached=lambda call, args: (not self._uncached(call, 'part', [uid]), None), \
+						missing=lambda: self._add_missing('part', [uid]))
+
+	def _parts_get_multi_args(self, uids, args):
+		"""Validate and format arguments passed to parts_get_multi().
+		
+		@return: Dictionary of valid arguments to pass to _make_url().
+		@raise OctopartException: Raised if invalid argument syntax is passed in.
+		"""
+		
+		arg_types = {'uids': ListType, \
+					'optimize.hide_datasheets' : BooleanType, \
+					'optimize.hide_descriptions' : BooleanType, \
+					'optimize.hide_images' : BooleanType, \
+					'optimize.hide_offers' : BooleanType, \
+					'optimize.hide_unauthorized_offers' : BooleanType, \
+					'optimize.hide_specs' : BooleanType}
+		arg_ranges = {'uids': (0, 100)}
+		args = self._translate_periods(args)
+		self._apply_optimize(args, arg_types)
+		args['uids'] = uids
+		self._validate_args(args, arg_types, arg_ranges)
+		for id in args['uids']:
+			if type(id) not in (IntType, LongType):
+				raise OctopartException(args, arg_types, arg_ranges, 2)
+		
+		return args
+	
+	def parts_get_multi(self, uids, timeout=None, cancel=None, **kwargs):
+		"""Fetch multiple part objects by their ids.
+		
+		@param fields: Optional set of OctopartPart fields to fetch and build. 
+		See OctopartPart.PROJECTABLE_FIELDS.
+		@return: A pair containing:
+			-The raw JSON result dictionary. 
+			-A list of OctopartPart objects.
+		Uids in the client's negative cache are not requested.
+		If no JSON object is found without an Exception being raised, returns None.
+		"""
+		
+		fields = self._projection(kwargs)
+		remaining = []
+		def cached(call, args):
+			remaining[:] = args['uids'] = self._uncached(call, 'part', uids)
+			return bool(uids) and not remaining, ([], [])
+		def build(json_obj, body=None):
+			self._add_missing('part', set(remaining) - set(part.get('uid') for part in json_obj))
+			return json_obj, self._hydrate(json_obj, fields, body, ('*',))
+		return self._call('parts/get_multi', lambda: self._parts_get_multi_args(uids, kwargs), build, \
+						batch_size=len(uids) if type(uids) is ListType else None, timeout=timeout, cancel=cancel, cached=cached, with_body=True)
+
+	def _parts_search_args(self, args):
+		"""Validate and format arguments passed to parts_search().
+		
+		@return: Dictionary of valid arguments to pass to _make_url().
+		@raise OctopartException: Raised if invalid argument syntax is passed in.
+		"""
+		
+		arg_types = {'q': StringType, \
+					'start' : IntType, \
+					'limit' : IntType, \
+					'filters' : ListType, \
+					'rangedfilters' : ListType, \
+					'sortby' : ListType, \
+					'drilldown.include' : BooleanType, \
+					'drilldown.fieldname' : StringType, \
+					'drilldown.facets.prefix' : StringType, \
+					'drilldown.facets.start' : IntType, \
+					'drilldown.facets.limit' : IntType, \
+					'drilldown.facets.sortby' : StringType, \
+					'drilldown.facets.include_hits' : BooleanType, \
+					'optimize.hide_datasheets' : BooleanType, \
+					'optimize.hide_descriptions' : BooleanType, \
+					'optimize.hide_images' : BooleanType, \
+					'optimize.hide_offers' : BooleanType, \
+					'optimize.hide_unauthorized_offers' : BooleanType, \
+					'optimize.hide_specs' : BooleanType}
+		arg_ranges = {'start' : (0, 1000), \
+					'limit' : (0, 100), \
+					'drilldown.facets.start' : (0, 1000), \
+					'drilldown.facets.limit' : (0, 100)}
+		
+		args = self._translate_periods(args)
+		self._apply_optimize(args, arg_types)
+		# Method-specific checks not covered by validate_args:
+		for filter in args.get('filters', []):
+			if len(filter) != 2:
+				raise OctopartException(args, arg_types, arg_ranges, 9)
+			if isinstance(filter[0], basestring) is False:
+				raise OctopartException(args, arg_types, arg_ranges, 2)
+			if type(filter[1]) is not ListType:
+				raise OctopartException(args, arg_types, arg_ranges, 2)
+		
+		for filter in args.get('rangedfilters', []):
+			if len(filter) != 2:
+				raise OctopartException(args, arg_types, arg_ranges, 9)
+			if isinstance(filter[0], basestring) is False:
+				raise OctopartException(args, arg_types, arg_ranges, 2)
+			if type(filter[1]) is not ListType:
+				raise OctopartException(args, arg_types, arg_ranges, 2)
+			for r in filter[1]:
+				if len(r) != 2:
+					raise OctopartException(args, arg_types, arg_ranges, 9)
+				for limit in r:
+					if type(limit) not in (IntType, FloatType, NoneType, LongType):
+						raise OctopartException(args, arg_types, arg_ranges, 2)
+	
+		for order in args.get('sortby', []):
+			if len(order) != 2:
+				raise OctopartException(args, arg_types, arg_ranges, 9)
+			if isinstance(order[0], basestring) is False:
+				raise OctopartException(args, arg_types, arg_ranges, 2)
+			if isinstance(order[1], basestring) is False:
+				raise OctopartException(args, arg_types, arg_ranges, 2)
+			if order[1] not in ('asc', 'desc'):
+				raise OctopartException(args, arg_types, arg_ranges, 10)
+		
+				
+		self._validate_args(args, arg_types, arg_ranges)
+		
+		return args
+		
+	
+	def parts_search(self, timeout=None, cancel=None, **kwargs):
+		"""Execute a search over all result objects.
+		
+		@param fields: Optional set of OctopartPart fields to fetch and build. 
+		See OctopartPart.PROJECTABLE_FIELDS.
+		@return: A pair containing:
+			-The raw JSON result dictionary. 
+			-A list of (OctopartPart, highlight_text) pairs for each result.
+		If no JSON object is found without an Exception being raised, returns None.
+		"""
+		
+		fields = self._projection(kwargs)
+		def build(json_obj, body=None):
+			parts = self._hydrate([result['item'] for result in json_obj['results']], fields, body, ('results', '*', 'item'))
+			results = [(part, result['highlight']) for part, result in zip(parts, json_obj['results'])]
+			return json_obj, results
+		return self._call('parts/search', lambda: self._parts_search_args(kwargs), build, timeout=timeout, cancel=cancel, \
+						with_body=True)
+
+	def _parts_suggest_args(self, q, args):
+		"""Validate and format arguments passed to parts_suggest().
+		
+		@return: Dictionary of valid arguments to pass to _make_url().
+		@raise OctopartException: Raised if invalid argument syntax is passed in.
+		"""
+		
+		arg_types = {'q': StringType, 'limit' : IntType}
+		arg_ranges = {'q': (2, float("inf")), 'limit' : (0, 10)}
+		args['q'] = q
+		self._validate_args(args, arg_types, arg_ranges)
+		
+		return args
+		
+	
+	def parts_suggest(self, q, timeout=None, cancel=None, **kwargs):
+		"""Suggest a part search query string.
+		
+		Optimized for speed (useful for auto-complete features).
+		@return: A pair containing:
+			-The raw JSON result dictionary. 
+			-A list of manufacturer part number strings.
+		If no JSON object is found without an Exception being raised, returns None.
+		"""
+		
+		return self._call('parts/suggest', lambda: self._parts_suggest_args(q, kwargs), \
+						lambda json_obj: (json_obj, json_obj['results']), timeout=timeout, cancel=cancel)
+
+	def _parts_match_args(self, manufacturer_name, mpn):
+		"""Validate and format arguments passed to parts_match().
+		
+		@return: Dictionary of valid arguments to pass to _make_url().
+		@raise OctopartException: Raised if invalid argument syntax is passed in.
+		"""
+		
+		arg_types = {'manufacturer_name': StringType, 'mpn' : StringType}
+		arg_ranges = {}
+		args = {'manufacturer_name': manufacturer_name, 'mpn' : mpn}
+		self._validate_args(args, arg_types, arg_ranges)
+		
+		return args
+	
+	def parts_match(self, manufacturer_name, mpn, timeout=None, cancel=None):
+		"""Match (manufacturer name, mpn) to part uid. 
+		
+		@return: a list of (part uid, manufacturer displayname, mpn) tuples.
+		If no JSON object is found without an Exception being raised, returns None.
+		"""
+		
+		return self._call('parts/match', lambda: self._parts_match_args(manufacturer_name, mpn), \
+						lambda json_obj: json_obj, timeout=timeout, cancel=cancel)
+
+	def _partattributes_get_args(self, fieldname):
+		"""Validate and format arguments passed to partattributes_get().
+		
+		@return: Dictionary of valid arguments to pass to _make_url().
+		@raise OctopartException: Raised if invalid argument syntax is passed in.
+		"""
+		
+		arg_types = {'fieldname': StringType}
+		arg_ranges = {}
+		args = {'fieldname': fieldname}
+		self._validate_args(args, arg_types, arg_ranges)
+		
+		return args
+	
+	def partattributes_get(self, fieldname, timeout=None, cancel=None):
+		"""Fetch a PartAttribute object by its fieldname.
+		
+		@return: A pair containing:
+			-The raw JSON result dictionary. 
+			-An OctopartPartAttribute object.
+		If no JSON object is found without an Exception being raised, returns None.
+		"""
+		
+		return self._call('partattributes/get', lambda: self._partattributes_get_args(fieldname), \
+						lambda json_obj: (json_obj, OctopartPartAttribute.new_from_dict(json_obj)), none_on_404=True, timeout=timeout, cancel=cancel, \
+						cached=lambda call, args: (not self._uncached(call, 'attribute', [fieldname]), None), \
+						missing=lambda: self._add_missing('attribute', [fieldname]))
+
+	def _partattributes_get_multi_args(self, fieldnames):
+		"""Validate and format arguments passed to partattributes_get_multi().
+		
+		@return: Dictionary of valid arguments to pass to _make_url().
+		@raise OctopartException: Raised if invalid argument syntax is passed in.
+		"""
+		
+		arg_types = {'fieldnames': ListType}
+		arg_ranges = {}
+		args = {'fieldnames': fieldnames}
+		self._validate_args(args, arg_types, arg_ranges)
+		for name in args['fieldnames']:
+			if isinstance(name, basestring) is False:
+				raise OctopartException(args, arg_types, arg_ranges, 2)
+		
+		return args
+	
+	def partattributes_get_multi(self, fieldnames, timeout=None, cancel=None):
+		"""Fetch multiple PartAttribute objects by their fieldnames.
+		
+		@return: A pair containing:
+			-The raw JSON result dictionary. 
+			-A list of OctopartPartAttribute objects.
+		Fieldnames in the client's negative cache are not requested.
+		If no JSON object is found without an Exception being raised, returns None.
+		"""
+		
+		remaining = []
+		def cached(call, args):
+			remaining[:] = args['fieldnames'] = self._uncached(call, 'attribute', fieldnames)
+			return bool(fieldnames) and not remaining, ([], [])
+		def build(json_obj):
+			attributes = [OctopartPartAttribute.new_from_dict(attrib) for attrib in json_obj]
+			self._add_missing('attribute', set(remaining) - set(attrib.fieldname for attrib in attributes))
+			return json_obj, attributes
+		return self._call('partattributes/get_multi', lambda: self._partattributes_get_multi_args(fieldnames), build, \
+						batch_size=len(fieldnames) if type(fieldnames) is ListType else None, timeout=timeout, cancel=cancel, cached=cached)
+
+	def _bom_match_args(self, lines, args):
+		"""Validate and format arguments passed to bom_match().
+		
+		@return: Dictionary of valid arguments to pass to _make_url().
+		@raise OctopartException: Raised if invalid argument syntax is passed in.
+		"""
+		
+		arg_types = {'lines': ListType, \
+					'optimize.return_stubs' : BooleanType, \
+					'optimize.hide_datasheets' : BooleanType, \
+					'optimize.hide_descriptions' : BooleanType, \
+					'optimize.hide_images' : BooleanType, \
+					'optimize.hide_offers' : BooleanType, \
+					'optimize.hide_unauthorized_offers' : BooleanType, \
+					'optimize.hide_specs' : BooleanType}
+		arg_ranges = {}
+		args = self._translate_periods(args)
+		self._apply_optimize(args, arg_types)
+		args['lines'] = lines
+		# Check the primary args dict as normal, then the lines in it
+		self._validate_args(args, arg_types, arg_ranges)
+		# DictType arguments need to be validated just like the normal args dict
+		lines_required_args = frozenset()
+		lines_arg_types = {'q': StringType, \
+					'mpn' : StringType, \
+					'manufacturer' : StringType, \
+					'sku' : StringType, \
+					'supplier' : StringType, \
+					'mpn_or_sku' : StringType, \
+					'start' : IntType, \
+					'limit' : IntType, \
+					'reference' : StringType}
+		lines_arg_ranges = {'limit' : (0, 20)}
+		for line in lines:
+			self._validate_args(line, lines_arg_types, lines_arg_ranges)
+			# Method-specific checks not covered by validate_args:
+			if lines_required_args.issubset(set(line.keys())) is False:
+				raise OctopartException(line, lines_arg_types, lines_arg_ranges, 0)
+			if (line.get('start', 0) + line.get('match', 0)) > 100:
+				raise OctopartException(line, lines_arg_types, lines_arg_ranges, 6)
+		
+		return args
+	
+	def bom_match(self, lines, timeout=None, cancel=None, **kwargs):
+		"""Match a list of part numbers to Octopart part objects.
+		 
+		@param fields: Optional set of OctopartPart fields to fetch and build. 
+		See OctopartPart.PROJECTABLE_FIELDS.
+		@return: A pair containing:
+			-The raw JSON result dictionary. 
+			-A list of dicts containing:
+				-A list of OctopartParts.
+				-A reference string.
+				-A status string.
+				-Optionally, the number of search hits.
+		Lines in the client's negative cache are not requested; their results have 
+		status "no_match" in both the raw and built results.
+		If no JSON object is found without an Exception being raised, returns None.
+		"""
+		
+		fields = self._projection(kwargs)
+		keys = []
+		remaining = []
+		def cached(call, args):
+			remaining[:] = range(len(lines))
+			if self.negative_cache is None:
+				return False, None
+			keys[:] = [OctopartNegativeCache.line_key(line) for line in lines]
+			uncached = set(self._uncached(call, 'bom_line', keys))
+			remaining[:] = [i for i, key in enumerate(keys) if key in uncached]
+			if remaining or not lines:
+				args['lines'] = [lines[i] for i in remaining]
+				return False, None
+			return True, build({'results' : []})
+		def build(json_obj, body=None):
+			if keys:
+				self._add_missing('bom_line', [keys[i] for i, result in zip(remaining, json_obj['results']) \
+											if result['status'] == 'no_match'])
+			if len(remaining) < len(lines):
+				# Fill in the lines answered from the negative cache
+				all_results = [{'items' : [], 'reference' : line.get('reference', ''), 'status' : 'no_match'} for line in lines]
+				for i, result in zip(remaining, json_obj['results']):
+					all_results[i] = result
+				json_obj = dict(json_obj, results=all_results)
+			results = []
+			# Build the items of every line together, so a large match is built in the pool. 
+			# Lines filled in from the negative cache have no items, so the items are 
+			# in the same order in the body.
+			parts = self._hydrate([item for result in json_obj['results'] for item in result['items']], fields, \
+								body, ('results', '*', 'items', '*'))
+			start = 0
+			for result in json_obj['results']:
+				items = parts[start:start + len(result['items'])]
+				start += len(items)
+				new_result = {'items' : items, 'reference' : result.get('reference', ''), 'status' : result['status']}
+				if result.get('hits') is not None:
+					new_result['hits'] = result.get('hits')
+				results.append(new_result)
+			return json_obj, results
+		return self._call('bom/match', lambda: self._bom_match_args(lines, kwargs), build, \
+						batch_size=len(lines) if type(lines) is ListType else None, timeout=timeout, cancel=cancel, cached=cached, with_body=True)
+	
+	def plan_batches(self, method, items, max_url_length=None, max_items=None, **kwargs):
+		"""Split the items of a multi-item call into as few requests as possible.
+		
+		Items are packed in order into the largest batches whose request URLs are no 
+		longer than max_url_length, and which hold no more items than max_items or the 
+		method's batch_limits. The length of each URL is computed as the items are packed.
+		@param method: 'parts/get_multi', 'categories/get_multi', 
+		'partattributes/get_multi' or 'bom/match'.
+		@param items: List of uids, category ids, fieldnames or bom_match lines.
+		@param max_url_length: Longest request URL, in place of the client's max_url_length.
+		@param max_items: Most items in a batch, if fewer than the method's batch_limits.
+		@param kwargs: Other arguments of the method, which count towards the URL length.
+		@return: List of lists of items.
+		@raise OctopartException: If an item is invalid, or too long to be requested alone.
+		@raise ValueError: If method is not a multi-item method.
+		"""
+		
+		if method not in Octopart.batch_args:
+			raise ValueError('Not a multi-item method: %s' % method)
+		if max_url_length is None:
+			max_url_length = self.max_url_length
+		# A projection's optimize flags count towards the URL length
+		kwargs = dict(kwargs)
+		self._projection(kwargs)
+		limit = self.batch_limits.get(method)
+		if max_items is not None and (limit is None or max_items < limit):
+			limit = max_items
+		# Validate the items, then measure the URL without any of them
+		items = list(items)
+		if method == 'parts/get_multi':
+			args = self._parts_get_multi_args([], dict(kwargs))
+			for uid in items:
+				if type(uid) not in (IntType, LongType):
+					raise OctopartException({'uids' : items}, {'uids' : ListType}, {}, 2)
+		elif method == 'categories/get_multi':
+			args = self._categories_get_multi_args(items)
+		elif method == 'partattributes/get_multi':
+			args = self._partattributes_get_multi_args(items)
+		else:
+			args = self._bom_match_args(items, dict(kwargs))
+		args[Octopart.batch_args[method]] = []
+		apikey = self._apikey()
+		if isinstance(self.apikey, OctopartKeyPool):
+			apikey = max(self.apikey.keys, key=len)
+		empty_length = len(self._request(method, args).url(self.base_url, apikey))
+		
+		batches = []
+		batch = []
+		length = empty_length
+		for item in items:
+			# Encoding a list encodes each item in turn, between commas and brackets
+			size = len(_encode_value([item])) - 2
+			if batch and (length + 1 + size > max_url_length or (limit is not None and len(batch) >= limit)):
+				batches.append(batch)
+				batch = []
+			if batch:
+				length += 1 + size
+			else:
+				length = empty_length + size
+				if length > max_url_length:
+					raise OctopartException(item, {}, {'max_url_length' : max_url_length}, 17)
+			batch.append(item)
+		if batch:
+			batches.append(batch)
+		return batches
+	
+	def iter_batches(self, method, items, max_url_length=None, max_items=None, timeout=None, cancel=None, **kwargs):
+		"""Call a multi-item method for each batch of items planned by plan_batches().
+		
+		@param method: 'parts/get_multi', 'categories/get_multi', 
+		'partattributes/get_multi' or 'bom/match'.
+		@param items: List of uids, category ids, fieldnames or bom_match lines.
+		@param max_url_length: Longest request URL, in place of the client's max_url_length.
+		@param max_items: Most items in a batch, if fewer than the method's batch_limits.
+		@param timeout: OctopartTimeout or total seconds for each call.
+		@param cancel: OctopartCancelToken which stops the calls.
+		@param kwargs: Other arguments of the method.
+		@return: Generator of (batch, result) pairs, where result is the return value 
+		of the method for the batch.
+		"""
+		
+		batches = self.plan_batches(method, items, max_url_length, max_items, **kwargs)
+		call = {'parts/get_multi' : self.parts_get_multi, \
+			'categories/get_multi' : self.categories_get_multi, \
+			'partattributes/get_multi' : self.partattributes_get_multi, \
+			'bom/match' : self.bom_match}[method]
+		for batch in batches:
+			yield batch, call(batch, timeout=timeout, cancel=cancel, **kwargs)
+	
+	def iter_search(self, page_size=100, max_results=None, timeout=None, cancel=None, **kwargs):
+		"""Page through the results of a search with parts_search().
+		
+		Pages are requested one at a time as the generator is consumed, from the 
+		start argument (default 0) until the search's hits, max_results, or the last 
+		start the API serves (1000) is reached.
+		@param page_size: Results per request, up to 100.
+		@param max_results: Most results to fetch in total.
+		@param timeout: OctopartTimeout or total seconds for each call.
+		@param cancel: OctopartCancelToken which stops the calls.
+		@param kwargs: Other arguments of parts_search.
+		@return: Generator of parts_search results, one per page.
+		"""
+		
+		start = kwargs.pop('start', 0)
+		fetched = 0
+		while max_results is None or fetched < max_results:
+			limit = page_size if max_results is None else min(page_size, max_results - fetched)
+			result = self.parts_search(start=start, limit=limit, timeout=timeout, cancel=cancel, **kwargs)
+			if result is None or not result[1]:
+				return
+			yield result
+			start += len(result[1])
+			fetched += len(result[1])
+			if start >= result[0].get('hits', 0) or start > 1000:
+				return
+
+def _offer_key(offer):
+	"""Returns the (supplier id, sku) pair identifying an offer."""
+	
+	supplier = offer.get('supplier')
+	if isinstance(supplier, OctopartBrand):
+		supplier_id = supplier.id
+	elif type(supplier) is DictType:
+		supplier_id = supplier.get('id')
+	else:
+		supplier_id = supplier
+	return (supplier_id, offer.get('sku'))
+
+def _index_offers(offers):
+	"""Returns a dictionary of (supplier id, sku) -> offer."""
+	
+	return dict((_offer_key(offer), offer) for offer in offers)
+
+def _index_specs(specs):
+	"""Returns a dictionary of attribute fieldname -> spec."""
+	
+	index = {}
+	for spec in specs:
+		attribute = spec.get('attribute')
+		if isinstance(attribute, OctopartPartAttribute):
+			index[attribute.fieldname] = spec
+		elif type(attribute) is DictType:
+			index[attribute.get('fieldname')] = spec
+	return index
+
+def diff_offers(old_part, new_part):
+	"""Compares the offers of two snapshots of the same part.
+	
+	Only the fields that change between refreshes (stock and prices) are compared;
+	offers are matched on their (supplier id, sku) pair.
+	@param old_part: The previously stored OctopartPart, or None.
+	@param new_part: The freshly fetched OctopartPart.
+	@return: A list of change dicts containing:
+		-The part uid.
+		-The supplier id and sku of the offer.
+		-The kind of change: 'added', 'removed' or 'changed'.
+		-The old and new offers (None where not applicable).
+	"""
+	
+	old_offers = {}
+	if old_part is not None:
+		old_offers = _index_offers(old_part.offers)
+	changes = []
+	seen = set()
+	for offer in new_part.offers:
+		key = _offer_key(offer)
+		seen.add(key)
+		old = old_offers.get(key)
+		if old is None:
+			kind = 'added'
+		elif old.get('avail') != offer.get('avail') or old.get('prices') != offer.get('prices'):
+			kind = 'changed'
+		else:
+			continue
+		changes.append({'uid' : new_part.uid, 'supplier_id' : key[0], 'sku' : key[1], \
+					'change' : kind, 'old' : old, 'new' : offer})
+	for key, old in old_offers.items():
+		if key not in seen:
+			changes.append({'uid' : new_part.uid, 'supplier_id' : key[0], 'sku' : key[1], \
+						'change' : 'removed', 'old' : old, 'new' : None})
+	return changes
+
+class OctopartPartDiff(object):
+	
+	"""Structural differences between two snapshots of a part.
+	
+	Each difference is identified by a path tuple: ('mpn',) for a scalar field,
+	('offers', (supplier_id, sku)) for a whole offer, ('offers', (supplier_id, sku), 'avail')
+	for a field of an offer, ('specs', fieldname) and ('specs', fieldname, 'values') for specs.
+	The empty path () refers to the whole part.
+	"""
+	
+	__slots__ = ['uid', 'added', 'removed', 'changed']
+	
+	def __init__(self, uid):
+		self.uid = uid
+		self.added = []	# List of (path, new value) pairs
+		self.removed = []	# List of (path, old value) pairs
+		self.changed = []	# List of (path, old value, new value) triples
+	
+	def __nonzero__(self):
+		return bool(self.added or self.removed or self.changed)
+	
+	def __len__(self):
+		return len(self.added) + len(self.removed) + len(self.changed)
+	
+	def paths(self):
+		"""Return the set of all paths which differ."""
+		
+		return set([d[0] for d in self.added] + [d[0] for d in self.removed] + [d[0] for d in self.changed])
+	
+	def __str__(self):
+		return ''.join(('Diff of part ', str(self.uid), ': ', str(len(self.added)), ' added, ', \
+					str(len(self.removed)), ' removed, ', str(len(self.changed)), ' changed'))
+
+_DIFF_PART_FIELDS = ('mpn', 'manufacturer', 'detail_url', 'avg_price', 'avg_avail', 'market_status', \
+					'num_suppliers', 'num_authsuppliers', 'short_description', 'category_ids', \
+					'images', 'datasheets', 'descriptions', 'hyperlinks')
+
+def _diff_keyed(diff, field, old_index, new_index):
+	"""Diffs two keyed dictionaries of offers or specs into diff, field by field."""
+	
+	for key, new in new_index.iteritems():
+		old = old_index.get(key)
+		if old is None:
+			diff.added.append(((field, key), new))
+			continue
+		for name in set(old).union(new):
+			if not _same_value(old.get(name), new.get(name)):
+				diff.changed.append(((field, key, name), old.get(name), new.get(name)))
+	for key, old in old_index.iteritems():
+		if key not in new_index:
+			diff.removed.append(((field, key), old))
+
+def diff_parts(old_part, new_part):
+	"""Computes the structural differences between two snapshots of a part.
+	
+	Offers are matched by (supplier id, sku) and specs by attribute fieldname,
+	so the diff runs in time linear in the number of offers and specs.
+	@param old_part: The previous OctopartPart, or None if the part is new.
+	@param new_part: The current OctopartPart, or None if the part was removed.
+	@return: An OctopartPartDiff, which is false if the snapshots are equivalent.
+	"""
+	
+	if old_part is None:
+		diff = OctopartPartDiff(new_part.uid)
+		diff.added.append(((), new_part))
+		return diff
+	diff = OctopartPartDiff(old_part.uid)
+	if new_part is None:
+		diff.removed.append(((), old_part))
+		return diff
+	for field in _DIFF_PART_FIELDS:
+		old, new = getattr(old_part, field), getattr(new_part, field)
+		if not _same_value(old, new):
+			diff.changed.append(((field,), old, new))
+	_diff_keyed(diff, 'offers', _index_offers(old_part.offers), _index_offers(new_part.offers))
+	_diff_keyed(diff, 'specs', _index_specs(old_part.specs), _index_specs(new_part.specs))
+	return diff
+
+def diff_part_sets(old_parts, new_parts):
+	"""Generates the differences between two collections of parts.
+	
+	@param old_parts: Dictionary of uid -> OctopartPart for the previous snapshot.
+	@param new_parts: Dictionary of uid -> OctopartPart for the current snapshot.
+	@return: A generator of non-empty OctopartPartDiffs, including diffs for 
+	parts which were added or removed.
+	"""
+	
+	for uid, new in new_parts.iteritems():
+		diff = diff_parts(old_parts.get(uid), new)
+		if diff:
+			yield diff
+	for uid, old in old_parts.iteritems():
+		if uid not in new_parts:
+			yield diff_parts(old, None)
+
+class OctopartRefreshScheduler(object):
+	
+	"""Incrementally refreshes the offers of a stored set of parts.
+	
+	A part's age is the time since its oldest offer was updated (per the offer's 
+	update_ts), or since it was last checked, whichever is more recent. Parts older 
+	than max_age are stale; stale parts are refreshed oldest-first, with each age 
+	scaled by the part's importance weight, in parts_get_multi batches.
+	"""
+	
+	batch_size = 100	# Most uids refreshed per request, within the URL length limit
+	
+	def __init__(self, api, parts=None, max_age=datetime.timedelta(days=1), importance=None, default_importance=1.0, \
+				offer_index=None):
+		"""
+		@param api: An Octopart instance used to fetch fresh parts.
+		@param parts: Iterable of OctopartParts to track.
+		@param max_age: timedelta after which a part is considered stale.
+		@param importance: Dictionary of part uid -> importance weight.
+		@param default_importance: Weight for parts not listed in importance.
+		@param offer_index: OctopartOfferIndex kept up to date with the tracked parts.
+		"""
+		
+		self.api = api
+		self.max_age = max_age
+		self.importance = dict(importance or {})
+		self.default_importance = default_importance
+		self.offer_index = offer_index
+		self.parts = {}
+		self._checked = {}
+		for part in parts or []:
+			self.add(part)
+	
+	def add(self, part, importance=None):
+		"""Start tracking a part, optionally setting its importance weight."""
+		
+		self.parts[part.uid] = part
+		if importance is not None:
+			self.importance[part.uid] = importance
+		if self.offer_index is not None:
+			self.offer_index.update(part)
+	
+	def remove(self, uid):
+		"""Stop tracking a part."""
+		
+		self.parts.pop(uid, None)
+		self._checked.pop(uid, None)
+		self.importance.pop(uid, None)
+		if self.offer_index is not None:
+			self.offer_index.remove(uid)
+	
+	def age(self, uid, now=None):
+		"""Return the age of a tracked part as a timedelta.
+		
+		@return: None if the part has never had a timestamped offer and has never 
+		been checked, meaning it is infinitely stale.
+		"""
+		
+		if now is None:
+			now = datetime.datetime.utcnow()
+		stamps = [o['update_ts'] for o in self.parts[uid].offers if isinstance(o.get('update_ts'), datetime.datetime)]
+		updated = min(stamps) if stamps else None
+		checked = self._checked.get(uid)
+		if checked is not None and (updated is None or checked > updated):
+			updated = checked
+		if updated is None:
+			return None
+		return now - updated
+	
+	def priority(self, uid, now=None):
+		"""Return the refresh priority of a tracked part. Larger is more urgent."""
+		
+		age = self.age(uid, now)
+		if age is None:
+			return float('inf')
+		seconds = age.days * 86400 + age.seconds + age.microseconds / 1e6
+		return seconds * self.importance.get(uid, self.default_importance)
+	
+	def stale_uids(self, now=None, limit=None):
+		"""Return the uids of all stale parts, most urgent first.
+		
+		@param limit: Maximum number of uids to return.
+		"""
+		
+		if now is None:
+			now = datetime.datetime.utcnow()
+		stale = []
+		for uid in self.parts:
+			age = self.age(uid, now)
+			if age is None or age >= self.max_age:
+				stale.append((self.priority(uid, now), uid))
+		if limit is None:
+			stale.sort(reverse=True)
+		else:
+			stale = heapq.nlargest(limit, stale)
+		return [uid for p, uid in stale]
+	
+	def refresh(self, max_requests=1, now=None, timeout=None, cancel=None, **kwargs):
+		"""Refresh the most urgent stale parts within a request budget.
+		
+		When the timeout passes or the cancel token is cancelled, the batch in flight 
+		is abandoned and the changes found by the earlier batches are returned.
+		@param max_requests: Maximum number of parts_get_multi calls to make.
+		@param timeout: OctopartTimeout or total seconds for the whole refresh. Its 
+		connect and read limits apply to each call.
+		@param cancel: OctopartCancelToken which stops the refresh.
+		@param kwargs: Additional arguments passed to parts_get_multi.
+		@return: A list of offer changes, as returned by diff_offers().
+		"""
+		
+		if now is None:
+			now = datetime.datetime.utcnow()
+		limits = _CallLimits(timeout, cancel)
+		uids = self.stale_uids(now, max_requests * self.batch_size)
+		changes = []
+		for batch in self.api.plan_batches('parts/get_multi', uids, max_items=self.batch_size, **kwargs)[:max_requests]:
+			call_timeout = None
+			if limits.timeout is not None:
+				remaining = limits.remaining()
+				if remaining is not None and remaining <= 0:
+					break
+				call_timeout = OctopartTimeout(remaining, limits.timeout.connect, limits.timeout.read)
+			if cancel is not None and cancel.cancelled:
+				break
+			checked = dict((uid, self._checked.get(uid)) for uid in batch)
+			for uid in batch:
+				self._checked[uid] = now
+			try:
+				result = self.api.parts_get_multi(batch, timeout=call_timeout, cancel=cancel, **kwargs)
+			except OctopartException as e:
+				if e.code not in (15, 16):
+					raise
+				# The batch was not refreshed, so it stays as stale as it was
+				for uid, checked_at in checked.iteritems():
+					if checked_at is None:
+						self._checked.pop(uid, None)
+					else:
+						self._checked[uid] = checked_at
+				break
+			if result is None:
+				continue
+			json_obj, new_parts = result
+			for part in new_parts:
+				if part.uid not in self.parts:
+					continue
+				changes.extend(diff_offers(self.parts[part.uid], part))
+				self.parts[part.uid] = part
+				if self.offer_index is not None:
+					self.offer_index.update(part)
+		return changes
+
+# Names defined in submodules, which are only imported when one of their names is
+# first used, so that importing the client stays cheap: the stub server needs
+# BaseHTTPServer, the worker pools multiprocessing and the snapshots mmap.
+_LAZY_NAMES = {'OctopartStubServer' : 'stub', \
+				'OctopartCrawler' : 'parallel', \
+				'OctopartHydrationPool' : 'parallel', \
+				'OctopartFacet' : 'analytics', \
+				'OctopartFacetCache' : 'analytics', \
+				'OctopartFacetIndex' : 'analytics', \
+				'OctopartOfferIndex' : 'analytics', \
+				'offer_unit_price' : 'analytics', \
+				'optimize_bom' : 'analytics', \
+				'parse_drilldown' : 'analytics', \
+				'part_facet_values' : 'analytics', \
+				'BINARY_MAGIC' : 'storage', \
+				'BINARY_VERSION' : 'storage', \
+				'OctopartBinaryReader' : 'storage', \
+				'OctopartBinaryWriter' : 'storage', \
+				'OctopartMetadataCache' : 'storage', \
+				'OctopartSnapshot' : 'storage', \
+				'SNAPSHOT_MAGIC' : 'storage', \
+				'SNAPSHOT_VERSION' : 'storage', \
+				'from_binary' : 'storage', \
+				'to_binary' : 'storage', \
+				'write_snapshot' : 'storage', \
+				'BOM_COLUMNS' : 'export', \
+				'EXPORT_FORMATS' : 'export', \
+				'OFFER_COLUMNS' : 'export', \
+				'OFFER_MODES' : 'export', \
+				'PART_COLUMNS' : 'export', \
+				'SEARCH_COLUMNS' : 'export', \
+				'SPEC_MODES' : 'export', \
+				'bom_rows' : 'export', \
+				'export_bom' : 'export', \
+				'export_columns' : 'export', \
+				'export_search' : 'export', \
+				'part_rows' : 'export', \
+				'search_rows' : 'export', \
+				'write_csv' : 'export', \
+				'write_jsonl' : 'export'}
+
+class _LazyModule(ModuleType):
+	
+	"""The octopart package, importing a submodule when one of its names is first used.
+	
+	It replaces this module in sys.modules, holding a copy of its globals. The 
+	functions above still read the original globals, so setting or deleting an 
+	attribute of the package, such as patching _timer or urllib2 in tests, is 
+	done on both. Changes made directly to the package's __dict__ are not.
+	"""
+	
+	def __getattr__(self, name):
+		submodule = _LAZY_NAMES.get(name)
+		if submodule is None:
+			raise AttributeError("'module' object has no attribute '%s'" % name)
+		__import__('octopart.' + submodule)
+		value = getattr(sys.modules['octopart.' + submodule], name)
+		setattr(self, name, value)
+		return value
+	
+	def __setattr__(self, name, value):
+		ModuleType.__setattr__(self, name, value)
+		setattr(self.__dict__['_original'], name, value)
+	
+	def __delattr__(self, name):
+		ModuleType.__delattr__(self, name)
+		original = self.__dict__['_original']
+		if name in original.__dict__:
+			delattr(original, name)
+
+__all__ = sorted(filter(lambda name: not name.startswith('_'), globals().keys()) + list(_LAZY_NAMES))
+_package = _LazyModule(__name__, __doc__)
+_package.__dict__.update(globals())
+# The functions above keep using this module's globals, so it must stay alive
+_package.__dict__['_original'] = sys.modules[__name__]
+sys.modules[__name__] = _package
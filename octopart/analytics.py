@@ -0,0 +1,721 @@
+"""
+Supplier offer index, BOM cost optimizer and drilldown facets.
+
+The octopart package imports this module when one of its names is first used.
+"""
+
+import json
+import threading
+import collections
+import binascii
+import operator
+from types import *
+
+from octopart import OctopartBrand, OctopartPartAttribute, _offer_key, _timer
+
+def offer_unit_price(offer, quantity, currency='USD'):
+	"""Returns the unit price of an offer when buying a quantity, from its price breaks.
+	
+	@return: The price of the largest break not above quantity, or None if the offer 
+	has no price in the currency at that quantity.
+	"""
+	
+	price = None
+	best_break = None
+	for price_break in offer.get('prices') or []:
+		break_quantity, unit_price, break_currency = price_break[:3]
+		if break_currency == currency and break_quantity <= quantity and \
+				(best_break is None or break_quantity > best_break):
+			best_break = break_quantity
+			price = unit_price
+	return price
+
+def _price_breaks(offer, currency):
+	"""Returns the (quantity, unit price) price breaks of an offer in a currency, by quantity."""
+	
+	return sorted((price_break[0], price_break[1]) for price_break in offer.get('prices') or [] \
+				if price_break[2] == currency)
+
+def _break_price(breaks, quantity):
+	"""Returns the unit price of the largest of sorted price breaks not above quantity, or None."""
+	
+	price = None
+	for break_quantity, unit_price in breaks:
+		if break_quantity > quantity:
+			break
+		price = unit_price
+	return price
+
+def _purchase(breaks, avail, moq, needed):
+	"""Returns the cheapest (cost, quantity, unit price) for buying at least needed 
+	units at sorted price breaks, within stock, or None if that is not possible.
+	
+	Buying up to a higher price break is considered, as it can cost less in total. 
+	At least moq (minimum order quantity) units are bought, if it is given.
+	"""
+	
+	minimum = max(needed, moq or 0)
+	best = None
+	for break_quantity, ignored in breaks:
+		quantity = max(minimum, break_quantity)
+		if quantity > avail:
+			continue
+		unit_price = _break_price(breaks, quantity)
+		if unit_price is not None and (best is None or unit_price * quantity < best[0]):
+			best = (unit_price * quantity, quantity, unit_price)
+	return best
+
+class OctopartOfferIndex(object):
+	
+	"""Inverted index of the offers of a set of parts, by supplier.
+	
+	Each offer is a row, with the part uid, supplier id, sku, stock, minimum order 
+	quantity, price breaks in the index's currency and offer dict held in columns; 
+	rows are found by supplier id, by (supplier id, sku) and by part uid. update() 
+	replaces the rows of one part, so the index can follow an OctopartRefreshScheduler.
+	"""
+	
+	def __init__(self, parts=None, currency='USD'):
+		"""
+		@param parts: Iterable of OctopartParts to index.
+		@param currency: Currency of the price breaks held in the prices column.
+		"""
+		
+		self.currency = currency
+		self.uids = []
+		self.supplier_ids = []
+		self.skus = []
+		self.avail = []
+		self.moqs = []
+		self.prices = []	# Sorted (quantity, unit price) price breaks in the index's currency
+		self.offers = []
+		self._free = []
+		self._by_supplier = {}	# supplier id -> set of rows
+		self._by_sku = {}	# (supplier id, sku) -> list of rows, in the order they were indexed
+		self._by_uid = {}	# part uid -> list of rows
+		for part in parts or []:
+			self.update(part)
+	
+	def __len__(self):
+		return len(self.uids) - len(self._free)
+	
+	def update(self, part):
+		"""Index the offers of a part, replacing any it had before."""
+		
+		self.remove(part.uid)
+		rows = []
+		for offer in part.offers:
+			supplier_id, sku = _offer_key(offer)
+			if self._free:
+				row = self._free.pop()
+				self.uids[row] = part.uid
+				self.supplier_ids[row] = supplier_id
+				self.skus[row] = sku
+				self.avail[row] = offer.get('avail')
+				self.moqs[row] = offer.get('moq')
+				self.prices[row] = _price_breaks(offer, self.currency)
+				self.offers[row] = offer
+			else:
+				row = len(self.uids)
+				self.uids.append(part.uid)
+				self.supplier_ids.append(supplier_id)
+				self.skus.append(sku)
+				self.avail.append(offer.get('avail'))
+				self.moqs.append(offer.get('moq'))
+				self.prices.append(_price_breaks(offer, self.currency))
+				self.offers.append(offer)
+			self._by_supplier.setdefault(supplier_id, set()).add(row)
+			self._by_sku.setdefault((supplier_id, sku), []).append(row)
+			rows.append(row)
+		if rows:
+			self._by_uid[part.uid] = rows
+	
+	def remove(self, uid):
+		"""Remove the offers of a part."""
+		
+		for row in self._by_uid.pop(uid, []):
+			supplier_id = self.supplier_ids[row]
+			rows = self._by_supplier[supplier_id]
+			rows.discard(row)
+			if not rows:
+				del self._by_supplier[supplier_id]
+			sku_rows = self._by_sku[(supplier_id, self.skus[row])]
+			sku_rows.remove(row)
+			if not sku_rows:
+				del self._by_sku[(supplier_id, self.skus[row])]
+			self.uids[row] = self.supplier_ids[row] = self.skus[row] = self.avail[row] = None
+			self.moqs[row] = self.prices[row] = self.offers[row] = None
+			self._free.append(row)
+	
+	def supplier_ids_for(self, uids):
+		"""Return the set of ids of the suppliers offering any of the parts."""
+		
+		return set(self.supplier_ids[row] for uid in uids for row in self._by_uid.get(uid, []))
+	
+	def get(self, supplier_id, sku):
+		"""Return the (part uid, offer) pair of a supplier's sku, or None.
+		
+		If several parts have offers with the sku, the most recently indexed is returned.
+		"""
+		
+		rows = self._by_sku.get((supplier_id, sku))
+		if not rows:
+			return None
+		return self.uids[rows[-1]], self.offers[rows[-1]]
+	
+	def _rows(self, supplier_id, uids, min_avail):
+		if uids is None:
+			rows = sorted(self._by_supplier.get(supplier_id, ()))
+		else:
+			# Looking up the parts is faster than scanning a large supplier
+			rows = [row for uid in uids for row in self._by_uid.get(uid, []) \
+					if self.supplier_ids[row] == supplier_id]
+		return [row for row in rows if min_avail is None or (self.avail[row] or 0) >= min_avail]
+	
+	def supplier_offers(self, supplier_id, uids=None, min_avail=1):
+		"""Return the (part uid, offer) pairs of a supplier.
+		
+		@param uids: Only return offers for these parts, such as the parts of a BOM.
+		@param min_avail: Minimum stock, or None to include offers without stock.
+		"""
+		
+		return [(self.uids[row], self.offers[row]) for row in self._rows(supplier_id, uids, min_avail)]
+	
+	def basket(self, supplier_id, quantities, currency=None):
+		"""Price buying parts from a single supplier.
+		
+		For each part, the offer of the supplier with the cheapest purchase within its 
+		stock is used. As for optimize_bom(), at least an offer's minimum order quantity 
+		is bought, and buying up to a higher price break is considered.
+		@param quantities: Dictionary of part uid -> quantity.
+		@param currency: Currency to price in. Defaults to the index's currency, whose 
+		prices are held in the index; others are read from the offer dicts.
+		@return: A dict containing:
+			-The supplier id.
+			-'lines': Dictionary of part uid -> (offer, unit price, line total, quantity bought) 
+			for each part the supplier can fill.
+			-'missing': Sorted list of the uids of parts it cannot.
+			-'total': The sum of the line totals.
+		"""
+		
+		lines = {}
+		for uid, quantity in quantities.iteritems():
+			for row in self._rows(supplier_id, [uid], quantity):
+				if currency is None or currency == self.currency:
+					breaks = self.prices[row]
+				else:
+					breaks = _price_breaks(self.offers[row], currency)
+				purchase = _purchase(breaks, self.avail[row] or 0, self.moqs[row], quantity)
+				if purchase is not None and (uid not in lines or purchase[0] < lines[uid][2]):
+					lines[uid] = (self.offers[row], purchase[2], purchase[0], purchase[1])
+		return {'supplier_id' : supplier_id, 'lines' : lines, \
+				'missing' : sorted(uid for uid in quantities if uid not in lines), \
+				'total' : sum(line[2] for line in lines.itervalues())}
+	
+	def best_baskets(self, quantities, currency=None, limit=None):
+		"""Price buying parts from each supplier which offers any of them.
+		
+		@param quantities: Dictionary of part uid -> quantity.
+		@param limit: Maximum number of baskets to return.
+		@return: A list of basket() results, those filling the most lines first, 
+		then the cheapest.
+		"""
+		
+		baskets = [self.basket(supplier_id, quantities, currency) for supplier_id in self.supplier_ids_for(quantities)]
+		baskets = [basket for basket in baskets if basket['lines']]
+		baskets.sort(key=lambda basket: (-len(basket['lines']), basket['total'], basket['supplier_id']))
+		return baskets[:limit] if limit is not None else baskets
+
+def _offer_purchase(offer, needed, currency):
+	"""Returns the cheapest (cost, quantity, unit price) for buying at least needed 
+	units from an offer, within its stock, or None if that is not possible.
+	
+	An offer's 'moq' (minimum order quantity), if given, is respected. See _purchase().
+	"""
+	
+	return _purchase(_price_breaks(offer, currency), offer.get('avail') or 0, offer.get('moq'), needed)
+
+def _bom_candidates(results, quantities, build_quantity, currency, authorized_only):
+	"""Returns, for each BOM line, a list of (cost, supplier id, quantity, unit price, 
+	part, offer) purchase options, cheapest first.
+	"""
+	
+	candidates = []
+	for result, quantity in zip(results, quantities):
+		needed = quantity * build_quantity
+		options = []
+		if needed <= 0:
+			# Nothing to buy for this line
+			candidates.append(options)
+			continue
+		for part in (result or {}).get('items', []):
+			for offer in part.offers:
+				if authorized_only and offer.get('is_authorized') is not True:
+					continue
+				purchase = _offer_purchase(offer, needed, currency)
+				if purchase is not None:
+					options.append((purchase[0], _offer_key(offer)[0], purchase[1], purchase[2], part, offer))
+		options.sort(key=lambda option: option[:2])
+		candidates.append(options)
+	return candidates
+
+def _cheapest_per_supplier(candidates):
+	"""Returns, for each line, a dictionary of supplier id -> its cheapest option."""
+	
+	per_supplier = []
+	for options in candidates:
+		cheapest = {}
+		for option in options:
+			if option[1] not in cheapest:
+				cheapest[option[1]] = option
+		per_supplier.append(cheapest)
+	return per_supplier
+
+def _plan_cost(per_supplier, suppliers, supplier_costs):
+	"""Returns the total cost of filling every fillable line from a set of suppliers, 
+	and the option chosen for each line, or (None, None) if a line cannot be filled.
+	"""
+	
+	total = sum(supplier_costs.get(supplier_id, 0) for supplier_id in suppliers)
+	chosen = []
+	for cheapest in per_supplier:
+		if not cheapest:
+			chosen.append(None)
+			continue
+		best = None
+		for supplier_id, option in cheapest.iteritems():
+			if supplier_id in suppliers and (best is None or option[:2] < best[:2]):
+				best = option
+		if best is None:
+			return None, None
+		chosen.append(best)
+		total += best[0]
+	return total, chosen
+
+def _greedy_suppliers(per_supplier, supplier_costs):
+	"""Picks the cheapest supplier of each line, then repeatedly drops the supplier 
+	whose removal lowers the total the most, counting each used supplier's fixed cost.
+	"""
+	
+	suppliers = set(min(cheapest.itervalues(), key=lambda option: option[:2])[1] \
+					for cheapest in per_supplier if cheapest)
+	if not supplier_costs:
+		return suppliers
+	cost = _plan_cost(per_supplier, suppliers, supplier_costs)[0]
+	while True:
+		best = None
+		for supplier_id in sorted(suppliers):
+			trial = suppliers - set([supplier_id])
+			trial_cost = _plan_cost(per_supplier, trial, supplier_costs)[0]
+			if trial_cost is not None and trial_cost < cost:
+				best, cost = trial, trial_cost
+		if best is None:
+			return suppliers
+		suppliers = best
+
+def _exact_suppliers(per_supplier, supplier_costs, max_work=None):
+	"""Finds the set of suppliers with the lowest total cost by branch and bound.
+	
+	@param max_work: Most line evaluations to spend. Once they are spent, the best 
+	set found so far, which is at least as cheap as the greedy one, is returned.
+	"""
+	
+	candidates = sorted(set(supplier_id for cheapest in per_supplier for supplier_id in cheapest))
+	lines = [cheapest for cheapest in per_supplier if cheapest]
+	best = [_greedy_suppliers(per_supplier, supplier_costs)]
+	best_cost = [_plan_cost(per_supplier, best[0], supplier_costs)[0]]
+	work = [0]
+	
+	def search(i, chosen):
+		if max_work is not None and work[0] >= max_work:
+			return
+		work[0] += len(lines)
+		# Lower bound: the fixed costs chosen so far, plus each line at its cheapest 
+		# among the chosen and undecided suppliers, plus the fixed cost of the cheapest 
+		# undecided supplier able to fill the line which the chosen ones cannot fill 
+		# and whose cheapest such supplier costs the most
+		undecided = set(candidates[i:])
+		bound = sum(supplier_costs.get(supplier_id, 0) for supplier_id in chosen)
+		extra = 0
+		for cheapest in lines:
+			line_best = None
+			covered = False
+			for supplier_id, option in cheapest.iteritems():
+				if supplier_id in chosen:
+					covered = True
+				elif supplier_id not in undecided:
+					continue
+				if line_best is None or option[0] < line_best:
+					line_best = option[0]
+			if line_best is None:
+				return
+			bound += line_best
+			if not covered:
+				extra = max(extra, min(supplier_costs.get(supplier_id, 0) for supplier_id in cheapest \
+									if supplier_id in undecided))
+		if bound + extra >= best_cost[0]:
+			return
+		if i == len(candidates):
+			cost = _plan_cost(per_supplier, chosen, supplier_costs)[0]
+			if cost is not None and cost < best_cost[0]:
+				best[0], best_cost[0] = set(chosen), cost
+			return
+		search(i + 1, chosen | set([candidates[i]]))
+		search(i + 1, chosen)
+	
+	search(0, frozenset())
+	return best[0]
+
+def optimize_bom(results, quantities, build_quantity=1, currency='USD', authorized_only=False, \
+				supplier_costs=None, exact=None, max_exact_suppliers=16, max_exact_work=500000):
+	"""Chooses an offer for each BOM line, minimizing the total purchase cost.
+	
+	Each line is bought from one offer with enough stock, at the cheapest quantity 
+	at or above the line's need (buying up to a higher price break can cost less). 
+	Without supplier_costs the cheapest offer of each line is optimal. With them, 
+	the greedy mode drops suppliers while that lowers the total, and the exact mode 
+	searches every set of suppliers, which is only practical for a few suppliers.
+	Lines with a quantity of 0 are skipped.
+	@param results: bom_match results, one per line.
+	@param quantities: Quantity of each line per build.
+	@param build_quantity: Number of builds.
+	@param currency: Currency of the price breaks to use.
+	@param authorized_only: Only buy from authorized offers.
+	@param supplier_costs: Dictionary of supplier id -> fixed cost of ordering from the 
+	supplier at all, such as shipping.
+	@param exact: True for the exact mode, False for the greedy mode. By default the 
+	exact mode is used if there are at most max_exact_suppliers candidate suppliers, 
+	and stops after max_exact_work line evaluations with the best plan found so far, 
+	which is at least as cheap as the greedy plan.
+	@return: A dict containing:
+		-'lines': For each line, None if it is skipped or cannot be filled, or a dict 
+		with the line's OctopartPart, offer, supplier_id, quantity, unit_price and cost.
+		-'unfilled': Indexes of the lines which cannot be filled.
+		-'skipped': Indexes of the lines with a quantity of 0.
+		-'suppliers': Dictionary of supplier id -> total of its lines, plus its fixed cost.
+		-'total': Total cost of the plan.
+	@raise ValueError: If results and quantities have different lengths.
+	"""
+	
+	if len(results) != len(quantities):
+		raise ValueError('%d bom_match results for %d quantities' % (len(results), len(quantities)))
+	supplier_costs = supplier_costs or {}
+	per_supplier = _cheapest_per_supplier(_bom_candidates(results, quantities, build_quantity, \
+															currency, authorized_only))
+	max_work = None
+	if exact is None:
+		num_suppliers = len(set(supplier_id for cheapest in per_supplier for supplier_id in cheapest))
+		exact = bool(supplier_costs) and num_suppliers <= max_exact_suppliers
+		max_work = max_exact_work
+	if exact and supplier_costs:
+		suppliers = _exact_suppliers(per_supplier, supplier_costs, max_work)
+	else:
+		suppliers = _greedy_suppliers(per_supplier, supplier_costs)
+	chosen = _plan_cost(per_supplier, suppliers, supplier_costs)[1]
+	lines = []
+	totals = {}
+	for option in chosen:
+		if option is None:
+			lines.append(None)
+			continue
+		cost, supplier_id, quantity, unit_price, part, offer = option
+		lines.append({'part' : part, 'offer' : offer, 'supplier_id' : supplier_id, \
+					'quantity' : quantity, 'unit_price' : unit_price, 'cost' : cost})
+		totals[supplier_id] = totals.get(supplier_id, supplier_costs.get(supplier_id, 0)) + cost
+	skipped = [i for i, quantity in enumerate(quantities) if quantity * build_quantity <= 0]
+	skipped_set = set(skipped)
+	return {'lines' : lines, 'unfilled' : [i for i, line in enumerate(lines) if line is None and i not in skipped_set], \
+			'skipped' : skipped, 'suppliers' : totals, 'total' : sum(totals.itervalues())}
+
+class OctopartFacet(object):
+	
+	"""Counts of the parts having each value of one field, from a drilldown."""
+	
+	__slots__ = ["fieldname", "values", "missing_count", "attribute"]
+	
+	def __init__(self, fieldname, values, missing_count=0, attribute=None):
+		"""
+		@param fieldname: Name of the field, such as 'manufacturer.displayname'.
+		@param values: List of (value, count) pairs, most frequent first.
+		@param missing_count: Number of parts without a value for the field.
+		@param attribute: The field's OctopartPartAttribute, if the API gave one.
+		"""
+		
+		self.fieldname = fieldname
+		self.values = values
+		self.missing_count = missing_count
+		self.attribute = attribute
+	
+	def counts(self):
+		"""Return a dictionary of value -> count."""
+		
+		return dict(self.values)
+	
+	def __repr__(self):
+		return 'OctopartFacet(%r, %r, missing_count=%r)' % (self.fieldname, self.values, self.missing_count)
+
+def parse_drilldown(json_obj):
+	"""Extract the facets of a parts_search response made with drilldown_include=True.
+	
+	@return: Dictionary of fieldname -> OctopartFacet.
+	"""
+	
+	facets = {}
+	for entry in json_obj.get('drilldown') or []:
+		attribute = entry.get('attribute')
+		if type(attribute) is DictType:
+			attribute = OctopartPartAttribute.new_from_dict(attribute)
+			fieldname = attribute.fieldname
+		else:
+			fieldname = entry.get('fieldname')
+		values = [(facet['value'], facet['count']) for facet in entry.get('facets', [])]
+		facets[fieldname] = OctopartFacet(fieldname, values, entry.get('missing_count', 0), attribute)
+	return facets
+
+def _normalized_filters(filters):
+	"""Returns filters sorted by fieldname, with sorted values, so equivalent filter lists compare equal."""
+	
+	return sorted([fieldname, sorted(values)] for fieldname, values in filters or [])
+
+class OctopartFacetCache(object):
+	
+	"""Fetches and caches the drilldown facets of part searches.
+	
+	Facets are cached per query, filters and drilldown arguments, regardless of the 
+	order of the filters and their values. The least recently used entries are 
+	evicted beyond max_entries, and entries expire after ttl seconds.
+	"""
+	
+	def __init__(self, api, max_entries=256, ttl=None):
+		"""
+		@param api: An Octopart instance used to search.
+		@param max_entries: Number of facet responses to keep.
+		@param ttl: Seconds for which a response is reused, or None to keep it until evicted.
+		"""
+		
+		self.api = api
+		self.max_entries = max_entries
+		self.ttl = ttl
+		self.hits = 0
+		self.misses = 0
+		self._entries = collections.OrderedDict()
+		self._lock = threading.Lock()
+	
+	def facets(self, q='', filters=None, rangedfilters=None, **kwargs):
+		"""Return the facets of the parts matching a search.
+		
+		@param q: Query string.
+		@param filters: List of [fieldname, [values]] filters, as for parts_search.
+		@param rangedfilters: List of [fieldname, [[min, max]]] filters, as for parts_search.
+		@param kwargs: drilldown_* arguments passed to parts_search. Facet searches 
+		always ask for no results with drilldowns, so limit and drilldown_include are ignored.
+		@return: Dictionary of fieldname -> OctopartFacet.
+		"""
+		
+		kwargs.pop('limit', None)
+		kwargs.pop('drilldown_include', None)
+		filters = _normalized_filters(filters)
+		rangedfilters = _normalized_filters(rangedfilters)
+		key = json.dumps([q, filters, rangedfilters, sorted(kwargs.items())])
+		now = _timer()
+		with self._lock:
+			entry = self._entries.pop(key, None)
+			if entry is not None and (self.ttl is None or now - entry[0] < self.ttl):
+				self._entries[key] = entry
+				self.hits += 1
+				return entry[1]
+			self.misses += 1
+		args = dict(kwargs)
+		if filters:
+			args['filters'] = filters
+		if rangedfilters:
+			args['rangedfilters'] = rangedfilters
+		args['limit'] = 0
+		args['drilldown_include'] = True
+		result = self.api.parts_search(q=q, **args)
+		facets = parse_drilldown(result[0]) if result is not None else {}
+		with self._lock:
+			self._entries[key] = (now, facets)
+			while len(self._entries) > self.max_entries:
+				self._entries.popitem(last=False)
+		return facets
+	
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+def part_facet_values(part):
+	"""Yields the (fieldname, value) pairs OctopartFacetIndex indexes a part by default.
+	
+	Fields are 'manufacturer.displayname', 'market_status', 'category_ids', 
+	'offers.supplier.displayname' and 'specs.<attribute fieldname>' for each spec.
+	"""
+	
+	if part.manufacturer is not None:
+		yield 'manufacturer.displayname', part.manufacturer.displayname
+	if part.market_status is not None:
+		yield 'market_status', part.market_status
+	for category_id in part.category_ids:
+		yield 'category_ids', category_id
+	for offer in part.offers:
+		if isinstance(offer.get('supplier'), OctopartBrand):
+			yield 'offers.supplier.displayname', offer['supplier'].displayname
+	for spec in part.specs:
+		if isinstance(spec.get('attribute'), OctopartPartAttribute):
+			for value in spec.get('values', []):
+				yield 'specs.' + spec['attribute'].fieldname, value
+
+class OctopartFacetIndex(object):
+	
+	"""Computes facet counts over a stored set of parts, without API calls.
+	
+	Each facet value is indexed by a bitmap of the parts having it, held as a Python 
+	integer, so selecting parts and counting facets take a few bitwise operations 
+	per facet value regardless of how many parts are stored. Parts are keyed by uid: 
+	update() replaces a part's bits, so the index can follow an OctopartRefreshScheduler.
+	"""
+	
+	def __init__(self, parts=None, facet_values=part_facet_values):
+		"""
+		@param parts: Iterable of OctopartParts, such as an OctopartSnapshot.
+		@param facet_values: Function returning the (fieldname, value) pairs of a part.
+		"""
+		
+		self.facet_values = facet_values
+		self.parts = []	# By position; None for removed parts
+		self._values = []	# Set of the (fieldname, value) pairs of each part, by position
+		self._by_uid = {}	# part uid -> position
+		self._removed = 0	# Bitmap of the positions of removed parts
+		self._bitmaps = {}	# fieldname -> value -> bitmap of part positions
+		self._present = {}	# fieldname -> bitmap of parts with any value
+		self._pending = {}	# (fieldname, value) -> positions not yet in the bitmaps
+		for part in parts or []:
+			self.add(part)
+	
+	def __len__(self):
+		return len(self._by_uid)
+	
+	def add(self, part):
+		"""Index one more part. A part with the uid of an indexed part replaces it, as for update()."""
+		
+		self.update(part)
+	
+	def update(self, part):
+		"""Index a part, replacing the facet values of any part with the same uid."""
+		
+		position = self._by_uid.get(part.uid)
+		if position is None:
+			position = len(self.parts)
+			self.parts.append(part)
+			self._values.append(None)
+			self._by_uid[part.uid] = position
+		else:
+			self._clear(position)
+			self.parts[position] = part
+		values = self._values[position] = set(self.facet_values(part))
+		for key in values:
+			self._pending.setdefault(key, []).append(position)
+	
+	def remove(self, uid):
+		"""Remove a part."""
+		
+		position = self._by_uid.pop(uid, None)
+		if position is None:
+			return
+		self._clear(position)
+		self.parts[position] = self._values[position] = None
+		self._removed |= 1 << position
+	
+	def _clear(self, position):
+		"""Clears the bits of the part at a position from the bitmaps."""
+		
+		bitmaps = self.bitmaps	# Merges any pending positions first
+		mask = ~(1 << position)
+		for fieldname, value in self._values[position]:
+			values = bitmaps[fieldname]
+			values[value] &= mask
+			if not values[value]:
+				del values[value]
+			self._present[fieldname] &= mask
+	
+	@staticmethod
+	def _bitmap(positions):
+		"""Returns the integer with the given bits set, in time linear in the highest bit."""
+		
+		data = bytearray(max(positions) // 8 + 1)
+		for position in positions:
+			data[position >> 3] |= 1 << (position & 7)
+		data.reverse()
+		return int(binascii.hexlify(data), 16)
+	
+	@property
+	def bitmaps(self):
+		"""Dictionary of fieldname -> value -> bitmap of the positions of the parts with the value."""
+		
+		# Setting bits one at a time copies the whole integer each time, so added 
+		# parts are merged into the bitmaps in one pass when next needed
+		if self._pending:
+			present = {}
+			for (fieldname, value), positions in self._pending.iteritems():
+				bitmap = self._bitmap(positions)
+				values = self._bitmaps.setdefault(fieldname, {})
+				values[value] = values.get(value, 0) | bitmap
+				present.setdefault(fieldname, []).append(bitmap)
+			for fieldname, bitmaps in present.iteritems():
+				self._present[fieldname] = reduce(operator.or_, bitmaps, self._present.get(fieldname, 0))
+			self._pending.clear()
+		return self._bitmaps
+	
+	def select(self, filters=None):
+		"""Return the bitmap of the parts matching filters.
+		
+		@param filters: List of [fieldname, [values]] filters, as for parts_search. 
+		A part matches if, for every filter, it has one of the values.
+		"""
+		
+		selected = ((1 << len(self.parts)) - 1) & ~self._removed
+		bitmaps = self.bitmaps
+		for fieldname, values in filters or []:
+			field = bitmaps.get(fieldname, {})
+			matches = 0
+			for value in values:
+				matches |= field.get(value, 0)
+			selected &= matches
+		return selected
+	
+	def search(self, filters=None):
+		"""Return the parts matching filters, in the order they were added."""
+		
+		bits = bin(self.select(filters))[:1:-1]
+		return [self.parts[i] for i, bit in enumerate(bits) if bit == '1']
+	
+	def count(self, filters=None):
+		"""Return the number of parts matching filters."""
+		
+		return bin(self.select(filters)).count('1')
+	
+	def facets(self, filters=None, fieldnames=None, limit=None):
+		"""Count the values of each field among the parts matching filters.
+		
+		@param fieldnames: Fields to count. Defaults to every indexed field.
+		@param limit: Maximum number of values returned per field.
+		@return: Dictionary of fieldname -> OctopartFacet, with values in order of 
+		descending count.
+		"""
+		
+		selected = self.select(filters)
+		total = bin(selected).count('1')
+		bitmaps = self.bitmaps
+		facets = {}
+		for fieldname in fieldnames if fieldnames is not None else bitmaps:
+			values = []
+			for value, bitmap in bitmaps.get(fieldname, {}).iteritems():
+				count = bin(bitmap & selected).count('1')
+				if count:
+					values.append((value, count))
+			values.sort(key=lambda pair: (-pair[1], pair[0]))
+			if limit is not None:
+				values = values[:limit]
+			missing = total - bin(self._present.get(fieldname, 0) & selected).count('1')
+			facets[fieldname] = OctopartFacet(fieldname, values, missing)
+		return facets
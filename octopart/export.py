@@ -0,0 +1,270 @@
+"""
+Streaming export of parts_search and bom_match results as JSON Lines or CSV.
+
+Results are fetched page by page or batch by batch, flattened into rows and
+written as they arrive, so an export holds one page or batch in memory at a time.
+
+The octopart package imports this module when one of its names is first used.
+"""
+
+import csv
+import datetime
+import json
+from types import *
+
+from octopart import OctopartBrand, OctopartPartAttribute, _resource_dict
+
+EXPORT_FORMATS = ('jsonl', 'csv')
+OFFER_MODES = ('nested', 'rows', 'none')
+SPEC_MODES = ('nested', 'columns', 'none')
+
+PART_COLUMNS = ['uid', 'mpn', 'manufacturer.id', 'manufacturer.displayname', 'detail_url', \
+				'short_description', 'market_status', 'avg_price', 'avg_avail', 'num_suppliers', \
+				'num_authsuppliers', 'category_ids']
+OFFER_COLUMNS = ['offer.supplier.id', 'offer.supplier.displayname', 'offer.sku', 'offer.avail', \
+				'offer.is_authorized', 'offer.prices', 'offer.update_ts', 'offer.clickthrough_url']
+SEARCH_COLUMNS = ['highlight']
+BOM_COLUMNS = ['line', 'reference', 'status', 'hits']
+
+# OctopartPart fields exported in every mode; others are only fetched when exported
+_EXPORTED_FIELDS = frozenset(('avg_price', 'avg_avail', 'market_status', 'num_suppliers', \
+							'num_authsuppliers', 'short_description', 'category_ids'))
+
+def _check_modes(format, offers, specs, spec_fields):
+	if format not in EXPORT_FORMATS:
+		raise ValueError('Unknown export format: %r' % (format,))
+	if offers not in OFFER_MODES:
+		raise ValueError('Unknown offers mode: %r' % (offers,))
+	if specs not in SPEC_MODES:
+		raise ValueError('Unknown specs mode: %r' % (specs,))
+	if format == 'csv' and specs == 'columns' and spec_fields is None:
+		raise ValueError('CSV exports of spec columns need spec_fields')
+
+def _export_fields(offers, specs):
+	"""Returns the projection of OctopartPart fields an export writes."""
+	
+	fields = set(_EXPORTED_FIELDS)
+	if offers != 'none':
+		fields.add('offers')
+	if specs != 'none':
+		fields.add('specs')
+	return fields
+
+def _timestamp(value):
+	if isinstance(value, datetime.datetime):
+		return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+	return value
+
+def _offer_row(offer):
+	supplier = offer.get('supplier')
+	if isinstance(supplier, OctopartBrand):
+		supplier_id, supplier_name = supplier.id, supplier.displayname
+	elif type(supplier) is DictType:
+		supplier_id, supplier_name = supplier.get('id'), supplier.get('displayname')
+	else:
+		supplier_id, supplier_name = supplier, None
+	return {'offer.supplier.id' : supplier_id, 'offer.supplier.displayname' : supplier_name, \
+			'offer.sku' : offer.get('sku'), 'offer.avail' : offer.get('avail'), \
+			'offer.is_authorized' : offer.get('is_authorized'), 'offer.prices' : offer.get('prices'), \
+			'offer.update_ts' : _timestamp(offer.get('update_ts')), \
+			'offer.clickthrough_url' : offer.get('clickthrough_url')}
+
+def _spec_fieldname(spec):
+	attribute = spec.get('attribute')
+	if isinstance(attribute, OctopartPartAttribute):
+		return attribute.fieldname
+	elif type(attribute) is DictType:
+		return attribute.get('fieldname')
+	return None
+
+def part_rows(part, offers='nested', specs='nested', spec_fields=None):
+	"""Flattens an OctopartPart into export rows.
+	
+	@param offers: 'nested' to keep the part's offers as a list in an 'offers' column,
+	'rows' for a row per offer with 'offer.*' columns (a part without offers still
+	has one row), or 'none' to leave offers out.
+	@param specs: 'nested' to keep the part's specs as a list in a 'specs' column,
+	'columns' for a 'spec.<fieldname>' column per spec, or 'none' to leave specs out.
+	A spec column holds the spec's value, or its list of values if it has several.
+	@param spec_fields: Optional list of the fieldnames given spec columns.
+	@return: A list of row dicts, keyed by column name.
+	"""
+	
+	manufacturer = part.manufacturer
+	row = {'uid' : part.uid, 'mpn' : part.mpn, 'detail_url' : part.detail_url, \
+		'manufacturer.id' : manufacturer.id if manufacturer is not None else None, \
+		'manufacturer.displayname' : manufacturer.displayname if manufacturer is not None else None, \
+		'short_description' : part.short_description, 'market_status' : part.market_status, \
+		'avg_price' : part.avg_price, 'avg_avail' : part.avg_avail, 'num_suppliers' : part.num_suppliers, \
+		'num_authsuppliers' : part.num_authsuppliers, 'category_ids' : part.category_ids}
+	if offers == 'nested':
+		row['offers'] = [dict(offer, supplier=_resource_dict(offer.get('supplier')), \
+							update_ts=_timestamp(offer.get('update_ts'))) for offer in part.offers]
+	if specs == 'nested':
+		row['specs'] = [dict(spec, attribute=_resource_dict(spec.get('attribute'))) for spec in part.specs]
+	elif specs == 'columns':
+		wanted = set(spec_fields) if spec_fields is not None else None
+		for spec in part.specs:
+			fieldname = _spec_fieldname(spec)
+			if fieldname is None or (wanted is not None and fieldname not in wanted):
+				continue
+			values = spec.get('values') or []
+			row['spec.' + fieldname] = values[0] if len(values) == 1 else values
+	if offers != 'rows' or not part.offers:
+		return [row]
+	rows = []
+	for offer in part.offers:
+		offer_row = row.copy()
+		offer_row.update(_offer_row(offer))
+		rows.append(offer_row)
+	return rows
+
+def search_rows(results, offers='nested', specs='nested', spec_fields=None):
+	"""Flattens parts_search results, such as the pages of Octopart.iter_search().
+	
+	@param results: Iterable of parts_search results.
+	@return: Generator of row dicts, with a 'highlight' column and those of part_rows().
+	"""
+	
+	for json_obj, parts in results:
+		for part, highlight in parts:
+			for row in part_rows(part, offers, specs, spec_fields):
+				row['highlight'] = highlight
+				yield row
+
+def bom_rows(results, offers='nested', specs='nested', spec_fields=None):
+	"""Flattens bom_match results, such as the batches of Octopart.iter_batches().
+	
+	Each matched item gives rows as part_rows(); lines without items give one row
+	with only the line columns. A batch whose result is None (an empty response)
+	gives such a row for each of its lines, with no status.
+	@param results: Iterable of (batch, bom_match result) pairs.
+	@return: Generator of row dicts, with 'line' (the index of the line over all
+	batches), 'reference', 'status' and 'hits' columns and those of part_rows().
+	"""
+	
+	line = 0
+	for batch, result in results:
+		if result is None:
+			for batch_line in batch:
+				yield {'line' : line, 'reference' : batch_line.get('reference'), 'status' : None, 'hits' : None}
+				line += 1
+			continue
+		json_obj, matches = result
+		for match in matches:
+			line_row = {'line' : line, 'reference' : match['reference'], 'status' : match['status'], \
+					'hits' : match.get('hits')}
+			if not match['items']:
+				yield line_row
+			for part in match['items']:
+				for row in part_rows(part, offers, specs, spec_fields):
+					row.update(line_row)
+					yield row
+			line += 1
+
+def export_columns(offers='nested', specs='nested', spec_fields=None, prefix=()):
+	"""Returns the CSV columns of rows flattened with the same modes.
+	
+	@param prefix: Columns put before the part columns, such as BOM_COLUMNS.
+	"""
+	
+	columns = list(prefix) + PART_COLUMNS
+	if offers == 'nested':
+		columns.append('offers')
+	elif offers == 'rows':
+		columns.extend(OFFER_COLUMNS)
+	if specs == 'nested':
+		columns.append('specs')
+	elif specs == 'columns':
+		columns.extend('spec.' + fieldname for fieldname in spec_fields)
+	return columns
+
+def write_jsonl(rows, fileobj):
+	"""Writes rows to a file as JSON Lines, one JSON object per line.
+	
+	@return: The number of rows written.
+	"""
+	
+	count = 0
+	for row in rows:
+		fileobj.write(json.dumps(row, sort_keys=True, separators=(',', ':')))
+		fileobj.write('\n')
+		count += 1
+	return count
+
+def _csv_value(value):
+	if value is None:
+		return ''
+	elif type(value) in (ListType, DictType):
+		return json.dumps(value, separators=(',', ':'))
+	elif type(value) is UnicodeType:
+		return value.encode('utf-8')
+	return value
+
+def write_csv(rows, fileobj, columns):
+	"""Writes rows to a file as CSV, with a header line of column names.
+	
+	Missing and None values are written as empty cells, and lists and dicts as JSON.
+	Row keys outside columns are not written.
+	@return: The number of rows written.
+	"""
+	
+	writer = csv.writer(fileobj)
+	writer.writerow(columns)
+	count = 0
+	for row in rows:
+		writer.writerow([_csv_value(row.get(column)) for column in columns])
+		count += 1
+	return count
+
+def _write(rows, fileobj, format, columns):
+	if format == 'csv':
+		return write_csv(rows, fileobj, columns)
+	return write_jsonl(rows, fileobj)
+
+def export_search(api, fileobj, format='jsonl', offers='nested', specs='nested', spec_fields=None, \
+				page_size=100, max_results=None, timeout=None, cancel=None, **kwargs):
+	"""Exports the results of a search, fetching and writing one page at a time.
+	
+	Unless a fields projection is passed, only the part fields the export writes are fetched.
+	@param api: Octopart client.
+	@param fileobj: File to write to.
+	@param format: 'jsonl' or 'csv'.
+	@param offers: Offer mode, as for part_rows().
+	@param specs: Spec mode, as for part_rows(). CSV exports of spec columns need spec_fields.
+	@param spec_fields: Optional list of the fieldnames given spec columns.
+	@param page_size, max_results, timeout, cancel: As for Octopart.iter_search().
+	@param kwargs: Other arguments of parts_search.
+	@return: The number of rows written.
+	@raise ValueError: If a format or mode is unknown.
+	"""
+	
+	_check_modes(format, offers, specs, spec_fields)
+	kwargs.setdefault('fields', _export_fields(offers, specs))
+	pages = api.iter_search(page_size, max_results, timeout=timeout, cancel=cancel, **kwargs)
+	columns = export_columns(offers, specs, spec_fields, SEARCH_COLUMNS) if format == 'csv' else None
+	return _write(search_rows(pages, offers, specs, spec_fields), fileobj, format, columns)
+
+def export_bom(api, lines, fileobj, format='jsonl', offers='nested', specs='nested', spec_fields=None, \
+			max_url_length=None, max_items=None, timeout=None, cancel=None, **kwargs):
+	"""Exports the matches of BOM lines, fetching and writing one batch at a time.
+	
+	Unless a fields projection is passed, only the part fields the export writes are fetched.
+	@param api: Octopart client.
+	@param lines: List of bom_match lines.
+	@param fileobj: File to write to.
+	@param format: 'jsonl' or 'csv'.
+	@param offers: Offer mode, as for part_rows().
+	@param specs: Spec mode, as for part_rows(). CSV exports of spec columns need spec_fields.
+	@param spec_fields: Optional list of the fieldnames given spec columns.
+	@param max_url_length, max_items, timeout, cancel: As for Octopart.iter_batches().
+	@param kwargs: Other arguments of bom_match.
+	@return: The number of rows written.
+	@raise ValueError: If a format or mode is unknown.
+	"""
+	
+	_check_modes(format, offers, specs, spec_fields)
+	kwargs.setdefault('fields', _export_fields(offers, specs))
+	batches = api.iter_batches('bom/match', lines, max_url_length, max_items, timeout=timeout, cancel=cancel, **kwargs)
+	columns = export_columns(offers, specs, spec_fields, BOM_COLUMNS) if format == 'csv' else None
+	return _write(bom_rows(batches, offers, specs, spec_fields), fileobj, format, columns)
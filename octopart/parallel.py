@@ -0,0 +1,346 @@
+"""
+Worker process pools for building parts and crawling categories.
+
+The octopart package imports this module when one of its names is first used.
+"""
+
+import json
+import os
+import threading
+import time
+import itertools
+import multiprocessing
+import Queue
+
+from octopart import Octopart, OctopartPart, _error_name, _timer
+from octopart.storage import OctopartBinaryReader, OctopartBinaryWriter, from_binary, to_binary
+
+def _select(obj, path):
+	"""Yields the values at a path in a JSON object, where '*' stands for every item of a list."""
+	
+	if not path:
+		yield obj
+		return
+	values = obj if path[0] == '*' else [obj[path[0]]]
+	for value in values:
+		for item in _select(value, path[1:]):
+			yield item
+
+def _hydrate_chunk(args):
+	"""Builds OctopartParts from a slice of the part dicts in a response body, in a pool worker.
+	
+	@return: The parts, encoded with to_binary().
+	"""
+	
+	body, path, start, stop, fields = args
+	part_dicts = itertools.islice(_select(json.loads(unicode(body)), path), start, stop)
+	return to_binary(OctopartPart.new_from_dict(part, fields) for part in part_dicts)
+
+class OctopartHydrationPool(object):
+	
+	"""Builds OctopartPart objects from large responses in a pool of worker processes.
+	
+	Each worker is sent the raw response body and the range of parts to build, and 
+	sends the parts back in the compact binary format, which the calling process 
+	decodes in less than half the time building them takes. Lists shorter than 
+	threshold are built in the calling process, where the cost of shipping the data 
+	would exceed the time saved, as is everything when there is only one worker process.
+	"""
+	
+	def __init__(self, processes=None, threshold=100, chunks_per_process=1):
+		"""
+		@param processes: Number of worker processes. Defaults to the number of CPUs.
+		@param threshold: Smallest number of parts built in the pool.
+		@param chunks_per_process: Number of chunks each worker is sent per list, 
+		so that uneven chunks balance out. Every chunk parses the whole body again.
+		"""
+		
+		self.processes = processes or multiprocessing.cpu_count()
+		self.threshold = threshold
+		self.chunks_per_process = chunks_per_process
+		self._pool = None
+		self._lock = threading.Lock()
+	
+	def hydrate(self, part_dicts, fields=None, body=None, path=None):
+		"""Build an OctopartPart from each JSON part dict.
+		
+		@param fields: Optional set of OctopartPart.PROJECTABLE_FIELDS to build.
+		@param body: Optional raw JSON response body which part_dicts were parsed from. 
+		It is sent to the workers in place of the part dicts.
+		@param path: Sequence of the keys leading to the part dicts in body, where '*' 
+		stands for every item of a list, such as ('results', '*', 'item').
+		@return: A list of OctopartParts, in the order of part_dicts.
+		"""
+		
+		if self.processes < 2 or len(part_dicts) < max(self.threshold, 1):
+			return [OctopartPart.new_from_dict(part, fields) for part in part_dicts]
+		with self._lock:
+			if self._pool is None:
+				self._pool = multiprocessing.Pool(self.processes)
+		size = -(-len(part_dicts) // (self.processes * self.chunks_per_process))
+		if body is not None:
+			chunks = [(body, path, i, i + size, fields) for i in xrange(0, len(part_dicts), size)]
+		else:
+			# Without a body to share, each worker is sent its own part dicts
+			chunks = [(json.dumps(part_dicts[i:i + size], separators=(',', ':')), ('*',), 0, size, fields) \
+					for i in xrange(0, len(part_dicts), size)]
+		return list(itertools.chain.from_iterable(from_binary(data) for data in self._pool.map(_hydrate_chunk, chunks, 1)))
+	
+	def close(self):
+		"""Stop the worker processes."""
+		
+		with self._lock:
+			if self._pool is not None:
+				self._pool.close()
+				self._pool.join()
+				self._pool = None
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+class _SharedRateLimiter(object):
+	
+	"""Spaces requests made by several processes at least 1/rate seconds apart."""
+	
+	def __init__(self, rate):
+		self.interval = 1.0 / rate if rate else 0.0
+		self._next = multiprocessing.Value('d', 0.0, lock=False)
+		self._lock = multiprocessing.Lock()
+	
+	def wait(self):
+		"""Blocks until this process may make its next request."""
+		
+		if not self.interval:
+			return
+		with self._lock:
+			now = time.time()
+			slot = max(now, self._next.value)
+			self._next.value = slot + self.interval
+		if slot > now:
+			time.sleep(slot - now)
+
+def _crawl_worker(tasks, results, limiter, client_kwargs, search_kwargs, page_size, leaves_only):
+	"""Worker process of an OctopartCrawler.
+	
+	Takes (category id, start) tasks until it receives None. A task starting at 0 
+	fetches the category and reports its children; the category's parts are then 
+	searched page by page. Each page is reported as it arrives.
+	"""
+	
+	api = Octopart(**client_kwargs)
+	while True:
+		task = tasks.get()
+		if task is None:
+			return
+		category_id, start = task
+		try:
+			if start == 0:
+				limiter.wait()
+				result = api.categories_get(category_id)
+				children = list(result[1].children_ids) if result is not None else []
+				results.put(('children', category_id, children))
+				if result is None or (children and leaves_only):
+					results.put(('page', category_id, 0, [], 0, True))
+					continue
+			while True:
+				limiter.wait()
+				result = api.parts_search(start=start, limit=page_size, \
+										filters=[['category_ids', [category_id]]], **search_kwargs)
+				parts = [part for part, highlight in result[1]] if result is not None else []
+				hits = result[0].get('hits', 0) if result is not None else 0
+				start += len(parts)
+				# The API returns results up to start=1000
+				last = not parts or start >= hits or start > 1000
+				results.put(('page', category_id, start, parts, hits, last))
+				if last:
+					break
+		except Exception as e:
+			results.put(('error', category_id, start, '%s: %s' % (_error_name(e), e)))
+
+class OctopartCrawler(object):
+	
+	"""Crawls the parts of whole category subtrees with several worker processes.
+	
+	Workers take categories from a shared queue. Each category is fetched, its 
+	children are queued, and its parts are paged through with parts_search. By 
+	default only categories without children are searched, on the assumption that 
+	every part is filed in a leaf category. Requests from all workers together 
+	are limited to rate per second.
+	
+	The parent process writes each part once, however many categories it is found 
+	in, to numbered binary segment files in directory. A checkpoint file records 
+	the categories done and in progress, and how much of each segment was written. 
+	An interrupted crawl resumes from the checkpoint when run again with the same 
+	directory: writes after the checkpoint are discarded and their pages fetched again.
+	
+	The API returns at most 1100 results per search; categories with more hits 
+	are reported as truncated.
+	"""
+	
+	checkpoint_name = 'checkpoint.json'
+	segment_pattern = 'parts-%05d.opb'
+	# Seconds between checkpoints
+	checkpoint_interval = 5.0
+	
+	def __init__(self, directory, root_ids, processes=4, rate=None, page_size=100, leaves_only=True, \
+				client_kwargs=None, search_kwargs=None):
+		"""
+		@param directory: Directory for the segment files and checkpoint. It is created if needed.
+		@param root_ids: Ids of the categories whose subtrees are crawled.
+		@param processes: Number of worker processes.
+		@param rate: Maximum requests per second across all workers, or None for no limit.
+		@param page_size: Results per parts_search request, up to 100.
+		@param leaves_only: Only search categories without children.
+		@param client_kwargs: Keyword arguments for the Octopart client of each worker, 
+		such as apikey, base_url and optimize.
+		@param search_kwargs: Additional arguments passed to parts_search.
+		"""
+		
+		self.directory = directory
+		self.root_ids = list(root_ids)
+		self.processes = processes
+		self.rate = rate
+		self.page_size = page_size
+		self.leaves_only = leaves_only
+		self.client_kwargs = dict(client_kwargs or {})
+		self.search_kwargs = dict(search_kwargs or {})
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+	
+	def _load_checkpoint(self):
+		path = os.path.join(self.directory, self.checkpoint_name)
+		if not os.path.exists(path):
+			return {'completed' : [], 'pending' : dict((str(id), 0) for id in self.root_ids), \
+					'segments' : {}, 'truncated' : []}
+		with open(path) as f:
+			return json.load(f)
+	
+	def _save_checkpoint(self, state):
+		path = os.path.join(self.directory, self.checkpoint_name)
+		with open(path + '.tmp', 'w') as f:
+			json.dump(state, f, sort_keys=True)
+			f.flush()
+			os.fsync(f.fileno())
+		os.rename(path + '.tmp', path)
+	
+	def _segments(self, state):
+		"""Truncates the segments to their checkpointed lengths, returning their paths."""
+		
+		paths = []
+		for name, length in sorted(state['segments'].items()):
+			path = os.path.join(self.directory, name)
+			with open(path, 'r+b') as f:
+				f.truncate(length)
+			paths.append(path)
+		return paths
+	
+	def parts(self):
+		"""Return a generator of the OctopartParts written so far."""
+		
+		for path in self._segments(self._load_checkpoint()):
+			with open(path, 'rb') as f:
+				for part in OctopartBinaryReader(f):
+					yield part
+	
+	def run(self):
+		"""Crawl every category not yet done, resuming from any checkpoint.
+		
+		@return: Dictionary of statistics for this run:
+			-'categories': Number of categories completed.
+			-'parts': Number of new parts written.
+			-'duplicates': Number of parts found again in another category.
+			-'pages': Number of search pages received.
+			-'errors': List of (category id, message) for categories left to a later run.
+			-'truncated': Ids of categories with more hits than the API returns.
+		@raise RuntimeError: If a worker process dies.
+		"""
+		
+		state = self._load_checkpoint()
+		completed = set(state['completed'])
+		pending = dict((int(id), start) for id, start in state['pending'].items())
+		truncated = set(state['truncated'])
+		seen = set()
+		for part in self.parts():
+			seen.add(part.uid)
+		name = self.segment_pattern % len(state['segments'])
+		fileobj = open(os.path.join(self.directory, name), 'wb')
+		writer = OctopartBinaryWriter(fileobj)
+		stats = {'categories' : 0, 'parts' : 0, 'duplicates' : 0, 'pages' : 0, 'errors' : [], 'truncated' : []}
+		
+		def checkpoint():
+			writer.flush()
+			os.fsync(fileobj.fileno())
+			state['segments'][name] = fileobj.tell()
+			state['completed'] = sorted(completed)
+			state['pending'] = dict((str(id), start) for id, start in pending.items())
+			state['truncated'] = sorted(truncated)
+			self._save_checkpoint(state)
+		
+		tasks = multiprocessing.Queue()
+		results = multiprocessing.Queue()
+		limiter = _SharedRateLimiter(self.rate)
+		for id, start in sorted(pending.items()):
+			tasks.put((id, start))
+		outstanding = len(pending)
+		workers = [multiprocessing.Process(target=_crawl_worker, args=(tasks, results, limiter, self.client_kwargs, \
+					self.search_kwargs, self.page_size, self.leaves_only)) for i in range(self.processes)]
+		for worker in workers:
+			worker.daemon = True
+			worker.start()
+		try:
+			checkpoint()
+			last_checkpoint = _timer()
+			while outstanding:
+				try:
+					message = results.get(timeout=0.5)
+				except Queue.Empty:
+					if any(worker.exitcode not in (None, 0) for worker in workers):
+						raise RuntimeError('An OctopartCrawler worker process died')
+					continue
+				kind, category_id = message[:2]
+				if kind == 'children':
+					for child in message[2]:
+						if child not in completed and child not in pending:
+							pending[child] = 0
+							tasks.put((child, 0))
+							outstanding += 1
+				elif kind == 'page':
+					next_start, parts, hits, last = message[2:]
+					if parts:
+						stats['pages'] += 1
+					for part in parts:
+						if part.uid in seen:
+							stats['duplicates'] += 1
+						else:
+							seen.add(part.uid)
+							writer.write(part)
+							stats['parts'] += 1
+					if last:
+						if hits > next_start:
+							truncated.add(category_id)
+							stats['truncated'].append(category_id)
+						del pending[category_id]
+						completed.add(category_id)
+						stats['categories'] += 1
+						outstanding -= 1
+					else:
+						pending[category_id] = next_start
+				else:
+					stats['errors'].append((category_id, message[3]))
+					outstanding -= 1
+				if _timer() - last_checkpoint >= self.checkpoint_interval:
+					checkpoint()
+					last_checkpoint = _timer()
+		finally:
+			for worker in workers:
+				tasks.put(None)
+			checkpoint()
+			fileobj.close()
+			for worker in workers:
+				worker.join(1.0)
+				if worker.is_alive():
+					worker.terminate()
+		return stats
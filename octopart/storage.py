@@ -0,0 +1,837 @@
+"""
+Compact binary format, memory-mapped part snapshots and the metadata cache.
+
+The octopart package imports this module when one of its names is first used.
+"""
+
+import json
+import datetime
+import struct
+import StringIO
+import mmap
+import os
+import threading
+import time
+import Queue
+from types import *
+
+from octopart import OctopartBrand, OctopartCategory, OctopartPart, OctopartPartAttribute, _timer
+
+# Binary serialization format.
+# 
+# A stream is the magic string 'OPB' and a format version byte, followed by records.
+# Each record is a varint byte length followed by one tagged value. Strings, and 
+# OctopartBrand/OctopartPartAttribute objects (suppliers, manufacturers and spec 
+# attributes), are added to tables the first time they are written and referenced 
+# by index afterwards. The tables persist across records until a reset record.
+
+BINARY_MAGIC = 'OPB'
+BINARY_VERSION = 1
+
+_T_NONE, _T_FALSE, _T_TRUE, _T_INT, _T_FLOAT, _T_STR, _T_STRDEF, _T_STRREF, \
+	_T_LIST, _T_DICT, _T_DATETIME = range(11)
+_T_RESET, _T_OBJREF, _T_BRAND, _T_ATTRIBUTE, _T_CATEGORY, _T_PART = range(14, 20)
+
+_PART_FIELDS = ('avg_price', 'avg_avail', 'market_status', 'num_suppliers', 'num_authsuppliers', \
+				'short_description', 'category_ids', 'images', 'datasheets', 'descriptions', \
+				'hyperlinks', 'offers', 'specs')
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+def _encode_varint(n, out):
+	"""Appends the unsigned LEB128 encoding of n to the list out."""
+	
+	while n > 0x7f:
+		out.append(chr((n & 0x7f) | 0x80))
+		n >>= 7
+	out.append(chr(n))
+
+def _decode_varint(data, pos):
+	"""Decodes an unsigned LEB128 integer from data at pos.
+	
+	@return: A (value, new position) pair.
+	"""
+	
+	result = 0
+	shift = 0
+	while True:
+		b = ord(data[pos])
+		pos += 1
+		result |= (b & 0x7f) << shift
+		if b < 0x80:
+			return result, pos
+		shift += 7
+
+class _BinaryEncoder(object):
+	
+	"""Encodes values into tagged binary form, maintaining the string and object tables."""
+	
+	def __init__(self, intern_max_length=64):
+		self.intern_max_length = intern_max_length
+		self.strings = {}
+		self.objects = {}
+	
+	def reset(self):
+		self.strings.clear()
+		self.objects.clear()
+	
+	def encode_string(self, value, out):
+		index = self.strings.get(value)
+		if index is not None:
+			out.append(chr(_T_STRREF))
+			_encode_varint(index, out)
+			return
+		if isinstance(value, unicode):
+			data = value.encode('utf-8')
+		else:
+			data = value
+		if len(data) <= self.intern_max_length:
+			self.strings[value] = len(self.strings)
+			out.append(chr(_T_STRDEF))
+		else:
+			out.append(chr(_T_STR))
+		_encode_varint(len(data), out)
+		out.append(data)
+	
+	def _encode_interned(self, key, tag, fields, out):
+		index = self.objects.get(key)
+		if index is not None:
+			out.append(chr(_T_OBJREF))
+			_encode_varint(index, out)
+			return
+		out.append(chr(tag))
+		for field in fields:
+			self.encode(field, out)
+		# Nested values may not be interned, so the index is assigned after the fields
+		self.objects[key] = len(self.objects)
+	
+	def encode(self, value, out):
+		"""Appends the tagged encoding of value to the list out."""
+		
+		t = type(value)
+		if t is UnicodeType or t is StringType:
+			self.encode_string(value, out)
+		elif t is IntType or t is LongType:
+			out.append(chr(_T_INT))
+			_encode_varint(value << 1 if value >= 0 else (-value << 1) - 1, out)
+		elif t is DictType:
+			out.append(chr(_T_DICT))
+			_encode_varint(len(value), out)
+			for k, v in value.iteritems():
+				self.encode(k, out)
+				self.encode(v, out)
+		elif t is ListType or t is TupleType:
+			out.append(chr(_T_LIST))
+			_encode_varint(len(value), out)
+			for v in value:
+				self.encode(v, out)
+		elif value is None:
+			out.append(chr(_T_NONE))
+		elif t is BooleanType:
+			out.append(chr(_T_TRUE if value else _T_FALSE))
+		elif t is FloatType:
+			out.append(chr(_T_FLOAT))
+			out.append(struct.pack('<d', value))
+		elif isinstance(value, datetime.datetime):
+			delta = value - _EPOCH
+			out.append(chr(_T_DATETIME))
+			seconds = delta.days * 86400 + delta.seconds
+			_encode_varint(seconds << 1 if seconds >= 0 else (-seconds << 1) - 1, out)
+			_encode_varint(delta.microseconds, out)
+		elif isinstance(value, OctopartBrand):
+			self._encode_interned((_T_BRAND, value.id, value.displayname, value.homepage_url), \
+								_T_BRAND, (value.id, value.displayname, value.homepage_url), out)
+		elif isinstance(value, OctopartPartAttribute):
+			key = (_T_ATTRIBUTE, value.fieldname, value.displayname, value.type, json.dumps(value.metadata, sort_keys=True))
+			self._encode_interned(key, _T_ATTRIBUTE, (value.fieldname, value.displayname, value.type, value.metadata), out)
+		elif isinstance(value, OctopartPart):
+			out.append(chr(_T_PART))
+			self.encode(value.uid, out)
+			self.encode(value.mpn, out)
+			self.encode(value.manufacturer, out)
+			self.encode(value.detail_url, out)
+			for field in _PART_FIELDS:
+				self.encode(getattr(value, field), out)
+		elif isinstance(value, OctopartCategory):
+			out.append(chr(_T_CATEGORY))
+			for field in (value.id, value.parent_id, value.nodename, value.images, value.children_ids, \
+						value.ancestor_ids, value.ancestors, value.num_parts):
+				self.encode(field, out)
+		else:
+			raise TypeError('Cannot encode %r in binary format' % value)
+
+class _BinaryDecoder(object):
+	
+	"""Decodes tagged binary values, maintaining the string and object tables.
+	
+	The tables may be any indexable sequences; they are only appended to when 
+	the data defines new entries.
+	"""
+	
+	def __init__(self, strings=None, objects=None):
+		self.strings = strings if strings is not None else []
+		self.objects = objects if objects is not None else []
+	
+	def reset(self):
+		del self.strings[:]
+		del self.objects[:]
+	
+	def decode(self, data, pos):
+		"""Decodes one tagged value from data at pos.
+		
+		@return: A (value, new position) pair.
+		"""
+		
+		tag = ord(data[pos])
+		pos += 1
+		# Most indexes, counts and lengths fit in a single varint byte
+		if tag == _T_STRREF:
+			index = ord(data[pos])
+			if index < 0x80:
+				return self.strings[index], pos + 1
+			index, pos = _decode_varint(data, pos)
+			return self.strings[index], pos
+		elif tag == _T_INT:
+			n = ord(data[pos])
+			if n < 0x80:
+				pos += 1
+			else:
+				n, pos = _decode_varint(data, pos)
+			return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+		elif tag == _T_DICT:
+			count = ord(data[pos])
+			if count < 0x80:
+				pos += 1
+			else:
+				count, pos = _decode_varint(data, pos)
+			value = {}
+			for i in xrange(count):
+				k, pos = self.decode(data, pos)
+				value[k], pos = self.decode(data, pos)
+			return value, pos
+		elif tag == _T_LIST:
+			count = ord(data[pos])
+			if count < 0x80:
+				pos += 1
+			else:
+				count, pos = _decode_varint(data, pos)
+			value = []
+			for i in xrange(count):
+				v, pos = self.decode(data, pos)
+				value.append(v)
+			return value, pos
+		elif tag == _T_STR or tag == _T_STRDEF:
+			length = ord(data[pos])
+			if length < 0x80:
+				pos += 1
+			else:
+				length, pos = _decode_varint(data, pos)
+			value = data[pos:pos + length].decode('utf-8')
+			if tag == _T_STRDEF:
+				self.strings.append(value)
+			return value, pos + length
+		elif tag == _T_OBJREF:
+			index, pos = _decode_varint(data, pos)
+			return self.objects[index], pos
+		elif tag == _T_NONE:
+			return None, pos
+		elif tag == _T_TRUE:
+			return True, pos
+		elif tag == _T_FALSE:
+			return False, pos
+		elif tag == _T_FLOAT:
+			return struct.unpack('<d', data[pos:pos + 8])[0], pos + 8
+		elif tag == _T_DATETIME:
+			n, pos = _decode_varint(data, pos)
+			microseconds, pos = _decode_varint(data, pos)
+			seconds = (n >> 1) if not n & 1 else -((n + 1) >> 1)
+			return _EPOCH + datetime.timedelta(seconds=seconds, microseconds=microseconds), pos
+		elif tag == _T_BRAND or tag == _T_ATTRIBUTE:
+			value, pos = self.decode_fields(tag, data, pos)
+			self.objects.append(value)
+			return value, pos
+		elif tag == _T_CATEGORY:
+			return self.decode_fields(tag, data, pos)
+		elif tag == _T_PART:
+			# Bypass __init__: the encoded fields are already in class format
+			part = OctopartPart.__new__(OctopartPart)
+			part._uid, pos = self.decode(data, pos)
+			part._mpn, pos = self.decode(data, pos)
+			part.manufacturer, pos = self.decode(data, pos)
+			part.detail_url, pos = self.decode(data, pos)
+			for field in _PART_FIELDS:
+				value, pos = self.decode(data, pos)
+				setattr(part, field, value)
+			return part, pos
+		raise ValueError('Invalid tag %d in binary data at offset %d' % (tag, pos - 1))
+	
+	def decode_fields(self, tag, data, pos):
+		"""Decodes the fields following a brand, part attribute or category tag, without 
+		adding the object to the object table.
+		"""
+		
+		fields = []
+		for i in xrange((3, 4, 8)[tag - _T_BRAND]):
+			field, pos = self.decode(data, pos)
+			fields.append(field)
+		if tag == _T_BRAND:
+			return OctopartBrand(*fields), pos
+		elif tag == _T_ATTRIBUTE:
+			return OctopartPartAttribute(*fields), pos
+		return OctopartCategory(*fields), pos
+
+class OctopartBinaryWriter(object):
+	
+	"""Streams OctopartPart, OctopartCategory, OctopartBrand and OctopartPartAttribute 
+	objects (or plain JSON values) to a file in the compact binary format.
+	"""
+	
+	def __init__(self, fileobj, max_strings=65536, max_objects=65536, intern_max_length=64):
+		"""
+		@param fileobj: A file-like object opened for binary writing.
+		@param max_strings: String table size at which the tables are reset.
+		@param max_objects: Object table size at which the tables are reset.
+		@param intern_max_length: Longest string, in bytes, added to the string table.
+		"""
+		
+		self.fileobj = fileobj
+		self.max_strings = max_strings
+		self.max_objects = max_objects
+		self._encoder = _BinaryEncoder(intern_max_length)
+		self.count = 0
+		fileobj.write(BINARY_MAGIC + chr(BINARY_VERSION))
+	
+	def write(self, obj):
+		"""Write a single object as one record."""
+		
+		encoder = self._encoder
+		if len(encoder.strings) >= self.max_strings or len(encoder.objects) >= self.max_objects:
+			encoder.reset()
+			self.fileobj.write('\x01' + chr(_T_RESET))
+		body = []
+		encoder.encode(obj, body)
+		body = ''.join(body)
+		header = []
+		_encode_varint(len(body), header)
+		self.fileobj.write(''.join(header))
+		self.fileobj.write(body)
+		self.count += 1
+	
+	def write_many(self, objs):
+		for obj in objs:
+			self.write(obj)
+	
+	def flush(self):
+		self.fileobj.flush()
+
+class OctopartBinaryReader(object):
+	
+	"""Reads objects written by OctopartBinaryWriter, yielding model instances directly."""
+	
+	chunk_size = 1 << 16
+	
+	def __init__(self, fileobj):
+		"""
+		@param fileobj: A file-like object opened for binary reading.
+		@raise ValueError: If the stream is not in a supported binary format.
+		"""
+		
+		self.fileobj = fileobj
+		self._decoder = _BinaryDecoder()
+		self._buf = ''
+		self._pos = 0
+		header = fileobj.read(len(BINARY_MAGIC) + 1)
+		if header[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+			raise ValueError('Not an Octopart binary stream')
+		if ord(header[-1]) != BINARY_VERSION:
+			raise ValueError('Unsupported binary format version %d' % ord(header[-1]))
+	
+	def _fill(self, n):
+		"""Ensures n unread bytes are buffered. Returns False at end of stream."""
+		
+		available = len(self._buf) - self._pos
+		if available >= n:
+			return True
+		chunks = [self._buf[self._pos:]]
+		while available < n:
+			chunk = self.fileobj.read(max(self.chunk_size, n - available))
+			if not chunk:
+				break
+			chunks.append(chunk)
+			available += len(chunk)
+		self._buf = ''.join(chunks)
+		self._pos = 0
+		return available >= n
+	
+	def read(self):
+		"""Read the next object.
+		
+		@raise EOFError: At the end of the stream.
+		"""
+		
+		while True:
+			# A varint record length is at most 10 bytes long
+			if not self._fill(10) and self._pos >= len(self._buf):
+				raise EOFError
+			length, pos = _decode_varint(self._buf, self._pos)
+			self._pos = pos
+			if not self._fill(length):
+				raise ValueError('Truncated record in binary stream')
+			if length == 1 and self._buf[self._pos] == chr(_T_RESET):
+				self._decoder.reset()
+				self._pos += 1
+				continue
+			value, pos = self._decoder.decode(self._buf, self._pos)
+			if pos != self._pos + length:
+				raise ValueError('Corrupt record in binary stream')
+			self._pos = pos
+			return value
+	
+	def __iter__(self):
+		while True:
+			try:
+				yield self.read()
+			except EOFError:
+				return
+
+def to_binary(objs):
+	"""Encode an iterable of objects into a binary format string."""
+	
+	out = StringIO.StringIO()
+	OctopartBinaryWriter(out).write_many(objs)
+	return out.getvalue()
+
+def from_binary(data):
+	"""Decode a binary format string into a list of objects."""
+	
+	return list(OctopartBinaryReader(StringIO.StringIO(data)))
+
+# Snapshot format.
+# 
+# A header, followed by the part records, the string table, the object table and 
+# the uid index. Records use the binary format tags, but only reference the 
+# shared tables, so any record can be decoded on its own. Tables are stored as an 
+# array of offsets followed by the entry data; the index is sorted by uid.
+
+SNAPSHOT_MAGIC = 'OPS'
+SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct('<3sBQQQQQQ')
+_SNAPSHOT_INDEX_ENTRY = struct.Struct('<qQI')
+_SNAPSHOT_OFFSET = struct.Struct('<Q')
+
+class _SnapshotEncoder(_BinaryEncoder):
+	
+	"""Encoder which collects strings and objects into tables written separately from the records."""
+	
+	def __init__(self, intern_max_length=64):
+		_BinaryEncoder.__init__(self, intern_max_length)
+		self.string_list = []
+		self.object_list = []
+	
+	def encode_string(self, value, out):
+		index = self.strings.get(value)
+		if index is None:
+			data = value.encode('utf-8') if isinstance(value, unicode) else value
+			if len(data) > self.intern_max_length:
+				out.append(chr(_T_STR))
+				_encode_varint(len(data), out)
+				out.append(data)
+				return
+			index = self.strings[value] = len(self.string_list)
+			self.string_list.append(data)
+		out.append(chr(_T_STRREF))
+		_encode_varint(index, out)
+	
+	def _encode_interned(self, key, tag, fields, out):
+		index = self.objects.get(key)
+		if index is None:
+			body = [chr(tag)]
+			for field in fields:
+				self.encode(field, body)
+			index = self.objects[key] = len(self.object_list)
+			self.object_list.append(''.join(body))
+		out.append(chr(_T_OBJREF))
+		_encode_varint(index, out)
+
+def _write_table(fileobj, entries):
+	"""Writes a table of byte strings as an offset array followed by the data."""
+	
+	offset = 0
+	for entry in entries:
+		fileobj.write(_SNAPSHOT_OFFSET.pack(offset))
+		offset += len(entry)
+	fileobj.write(_SNAPSHOT_OFFSET.pack(offset))
+	for entry in entries:
+		fileobj.write(entry)
+
+def write_snapshot(path, parts, intern_max_length=64):
+	"""Write a snapshot file of OctopartParts for use with OctopartSnapshot.
+	
+	Parts are streamed to disk as they are encoded; only the string and object 
+	tables and the uid index are held in memory. If a uid occurs more than once, 
+	the last part with that uid is indexed.
+	@param path: Path of the snapshot file to create.
+	@param parts: Iterable of OctopartParts.
+	@return: The number of parts in the snapshot.
+	"""
+	
+	encoder = _SnapshotEncoder(intern_max_length)
+	index = {}
+	with open(path, 'wb') as f:
+		f.write('\0' * _SNAPSHOT_HEADER.size)
+		offset = _SNAPSHOT_HEADER.size
+		for part in parts:
+			body = []
+			encoder.encode(part, body)
+			body = ''.join(body)
+			f.write(body)
+			index[part.uid] = (offset, len(body))
+			offset += len(body)
+		strings_offset = offset
+		_write_table(f, encoder.string_list)
+		objects_offset = f.tell()
+		_write_table(f, encoder.object_list)
+		index_offset = f.tell()
+		for uid in sorted(index):
+			f.write(_SNAPSHOT_INDEX_ENTRY.pack(uid, index[uid][0], index[uid][1]))
+		f.seek(0)
+		f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(index), index_offset, \
+									strings_offset, len(encoder.string_list), objects_offset, len(encoder.object_list)))
+	return len(index)
+
+class _SnapshotTable(object):
+	
+	"""Read-only table in a snapshot, decoding and caching entries on first access."""
+	
+	def __init__(self, data, offset, count, convert):
+		self.data = data
+		self.offset = offset
+		self.count = count
+		self.convert = convert
+		self.base = offset + (count + 1) * _SNAPSHOT_OFFSET.size
+		self.cache = {}
+	
+	def __len__(self):
+		return self.count
+	
+	def __getitem__(self, i):
+		try:
+			return self.cache[i]
+		except KeyError:
+			if not 0 <= i < self.count:
+				raise IndexError(i)
+			start, end = struct.unpack_from('<QQ', self.data, self.offset + i * _SNAPSHOT_OFFSET.size)
+			value = self.cache[i] = self.convert(self.data[self.base + start:self.base + end])
+			return value
+
+class OctopartSnapshot(object):
+	
+	"""Read-only, memory-mapped part catalog written by write_snapshot().
+	
+	Opening a snapshot only reads its header; parts are decoded from the mapped 
+	file when accessed, and strings and brands on first use. Processes which open
+	(or inherit) the same snapshot share a single page cache copy of it.
+	"""
+	
+	def __init__(self, path):
+		"""
+		@raise ValueError: If the file is not a supported snapshot.
+		"""
+		
+		self.path = path
+		self._file = open(path, 'rb')
+		self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, version, self._count, self._index_offset, strings_offset, strings_count, \
+			objects_offset, objects_count = _SNAPSHOT_HEADER.unpack_from(self._data, 0)
+		if magic != SNAPSHOT_MAGIC:
+			self.close()
+			raise ValueError('Not an Octopart snapshot: %s' % path)
+		if version != SNAPSHOT_VERSION:
+			self.close()
+			raise ValueError('Unsupported snapshot version %d: %s' % (version, path))
+		self._decoder = _BinaryDecoder()
+		self._decoder.strings = _SnapshotTable(self._data, strings_offset, strings_count, \
+											lambda data: data.decode('utf-8'))
+		self._decoder.objects = _SnapshotTable(self._data, objects_offset, objects_count, \
+											lambda data: self._decoder.decode_fields(ord(data[0]), data, 1)[0])
+	
+	def close(self):
+		self._data.close()
+		self._file.close()
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+	
+	def __len__(self):
+		return self._count
+	
+	def _entry(self, i):
+		return _SNAPSHOT_INDEX_ENTRY.unpack_from(self._data, self._index_offset + i * _SNAPSHOT_INDEX_ENTRY.size)
+	
+	def _find(self, uid):
+		"""Binary search of the uid index. Returns an (offset, length) pair or None."""
+		
+		lo, hi = 0, self._count
+		while lo < hi:
+			mid = (lo + hi) // 2
+			entry = self._entry(mid)
+			if entry[0] < uid:
+				lo = mid + 1
+			elif entry[0] > uid:
+				hi = mid
+			else:
+				return entry[1], entry[2]
+		return None
+	
+	def __contains__(self, uid):
+		return self._find(uid) is not None
+	
+	def get(self, uid, default=None):
+		"""Decode and return the part with the given uid."""
+		
+		location = self._find(uid)
+		if location is None:
+			return default
+		return self._decoder.decode(self._data, location[0])[0]
+	
+	def get_multi(self, uids):
+		"""Return the parts with the given uids, skipping those not in the snapshot."""
+		
+		return [part for part in (self.get(uid) for uid in uids) if part is not None]
+	
+	def uids(self):
+		"""Generate all part uids in ascending order."""
+		
+		for i in xrange(self._count):
+			yield self._entry(i)[0]
+	
+	def __iter__(self):
+		"""Generate all parts in ascending uid order."""
+		
+		for i in xrange(self._count):
+			yield self._decoder.decode(self._data, self._entry(i)[1])[0]
+
+class OctopartMetadataCache(object):
+	
+	"""Serves categories and part attributes from memory, refreshing them in the background.
+	
+	Cached objects are returned at once, even when older than max_age; an expired 
+	object is queued for refresh by a background thread, which fetches queued ids 
+	with categories_get_multi and partattributes_get_multi. Only objects which were 
+	never cached are fetched in the calling thread, and not even those once 
+	block_on_miss is turned off. The cache can be saved to disk with save() and 
+	preloaded at startup with load().
+	
+	When a fetch fails, or the API does not return an object, the object is not 
+	requested again until a retry delay has passed. The delay starts at retry_delay 
+	seconds and doubles with each consecutive failure, up to max_age.
+	"""
+	
+	batch_size = 100
+	retry_delay = 30.0
+	
+	def __init__(self, api, max_age=3600, block_on_miss=True):
+		"""
+		@param api: An Octopart instance used to fetch metadata.
+		@param max_age: Seconds after which a cached object is refreshed.
+		@param block_on_miss: Fetch uncached objects in the calling thread. Otherwise 
+		they are queued for the background thread and reported as missing.
+		"""
+		
+		self.api = api
+		self.max_age = max_age
+		self.block_on_miss = block_on_miss
+		self.errors = 0
+		self.last_error = None
+		# ('category', id) or ('attribute', fieldname) -> (fetched time, object or None, consecutive failures)
+		self._entries = {}
+		self._queued = set()
+		self._queue = Queue.Queue()
+		self._thread = None
+		self._lock = threading.Lock()
+	
+	def _get_multi(self, kind, keys):
+		"""Returns a dictionary of key -> object for the keys found in the cache, 
+		fetching or queueing the others, and queueing those which have expired.
+		"""
+		
+		now = _timer()
+		found = {}
+		missing = []
+		with self._lock:
+			for key in keys:
+				entry = self._entries.get((kind, key))
+				if entry is None:
+					missing.append(key)
+				elif entry[1] is None:
+					# Not found or failed before: only fetched again once the retry is due
+					if now - entry[0] >= self.max_age:
+						missing.append(key)
+				else:
+					found[key] = entry[1]
+					if now - entry[0] >= self.max_age:
+						self._enqueue((kind, key))
+			if not self.block_on_miss:
+				for key in missing:
+					self._enqueue((kind, key))
+		if missing and self.block_on_miss:
+			found.update(self._fetch(kind, missing))
+		return found
+	
+	def _enqueue(self, entry_key):
+		"""Queues an entry for the background thread. Must be called with the lock held."""
+		
+		if entry_key in self._queued:
+			return
+		self._queued.add(entry_key)
+		self._queue.put(entry_key)
+		if self._thread is None:
+			self._thread = threading.Thread(target=self._revalidate, name='OctopartMetadataCache')
+			self._thread.daemon = True
+			self._thread.start()
+	
+	def _fetch(self, kind, keys):
+		"""Fetches objects from the API and caches them.
+		
+		@return: Dictionary of key -> object for the objects found.
+		"""
+		
+		found = {}
+		done = set()
+		method = 'categories/get_multi' if kind == 'category' else 'partattributes/get_multi'
+		try:
+			for batch, result in self.api.iter_batches(method, keys, max_items=self.batch_size):
+				now = _timer()
+				with self._lock:
+					for obj in (result[1] if result is not None else []):
+						key = obj.id if kind == 'category' else obj.fieldname
+						self._entries[(kind, key)] = (now, obj, 0)
+						found[key] = obj
+					self._retry_later(kind, [key for key in batch if key not in found])
+				done.update(batch)
+		except Exception:
+			with self._lock:
+				self._retry_later(kind, [key for key in keys if key not in done])
+			raise
+		return found
+	
+	def _retry_later(self, kind, keys):
+		"""Delays the next fetch of keys which failed or were not found. Must be called with the lock held.
+		
+		The entry's fetched time is set so that it expires when the retry is due.
+		"""
+		
+		now = _timer()
+		for key in keys:
+			entry = self._entries.get((kind, key))
+			obj, failures = (entry[1], entry[2] + 1) if entry is not None else (None, 1)
+			delay = min(self.retry_delay * 2 ** (failures - 1), self.max_age)
+			self._entries[(kind, key)] = (now - self.max_age + delay, obj, failures)
+	
+	def _revalidate(self):
+		"""Background thread: fetches queued entries, in batches, until stopped."""
+		
+		while True:
+			entry_key = self._queue.get()
+			if entry_key is None:
+				return
+			batch = [entry_key]
+			stop = False
+			while len(batch) < self.batch_size:
+				try:
+					entry_key = self._queue.get_nowait()
+				except Queue.Empty:
+					break
+				if entry_key is None:
+					stop = True
+					break
+				batch.append(entry_key)
+			for kind in ('category', 'attribute'):
+				keys = [key for k, key in batch if k == kind]
+				if not keys:
+					continue
+				try:
+					self._fetch(kind, keys)
+				except Exception as e:
+					# Keep serving the cached objects; they are retried once the delay has passed
+					self.errors += 1
+					self.last_error = e
+			with self._lock:
+				self._queued.difference_update(batch)
+			if stop:
+				return
+	
+	def category(self, id):
+		"""Return the OctopartCategory with the given id, or None if it is not known."""
+		
+		return self._get_multi('category', [id]).get(id)
+	
+	def categories(self, ids):
+		"""Return the known OctopartCategories among ids, in order."""
+		
+		found = self._get_multi('category', ids)
+		return [found[id] for id in ids if id in found]
+	
+	def attribute(self, fieldname):
+		"""Return the OctopartPartAttribute with the given fieldname, or None if it is not known."""
+		
+		return self._get_multi('attribute', [fieldname]).get(fieldname)
+	
+	def attributes(self, fieldnames):
+		"""Return the known OctopartPartAttributes among fieldnames, in order."""
+		
+		found = self._get_multi('attribute', fieldnames)
+		return [found[fieldname] for fieldname in fieldnames if fieldname in found]
+	
+	def pending(self):
+		"""Return the number of objects queued for refresh."""
+		
+		with self._lock:
+			return len(self._queued)
+	
+	def save(self, path):
+		"""Write every cached object to a file in the binary format."""
+		
+		with self._lock:
+			objs = [entry[1] for entry in self._entries.itervalues() if entry[1] is not None]
+		with open(path, 'wb') as f:
+			OctopartBinaryWriter(f).write_many(objs)
+	
+	def load(self, path):
+		"""Add the objects saved in a file to the cache.
+		
+		They are treated as fetched when the file was last modified, so objects from 
+		an old file are served at once and refreshed in the background.
+		@return: Number of objects loaded.
+		"""
+		
+		fetched = _timer() - max(0, time.time() - os.path.getmtime(path))
+		count = 0
+		with open(path, 'rb') as f:
+			objs = list(OctopartBinaryReader(f))
+		with self._lock:
+			for obj in objs:
+				if isinstance(obj, OctopartCategory):
+					entry_key = ('category', obj.id)
+				elif isinstance(obj, OctopartPartAttribute):
+					entry_key = ('attribute', obj.fieldname)
+				else:
+					continue
+				existing = self._entries.get(entry_key)
+				if existing is None or existing[1] is None or existing[0] < fetched:
+					self._entries[entry_key] = (fetched, obj, 0)
+					count += 1
+		return count
+	
+	def close(self):
+		"""Stop the background thread once it has finished the queued refreshes."""
+		
+		with self._lock:
+			thread = self._thread
+			self._thread = None
+			if thread is not None:
+				self._queue.put(None)
+		if thread is not None:
+			thread.join()
@@ -0,0 +1,129 @@
+"""
+Local HTTP server which serves recorded Octopart API responses.
+
+The octopart package imports this module when one of its names is first used.
+"""
+
+import random
+import threading
+import time
+import BaseHTTPServer
+import SocketServer
+import socket
+import sys
+from types import *
+
+from octopart import canonical_url, load_recordings
+
+class _StubRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	
+	def do_GET(self):
+		server = self.server
+		with server.lock:
+			server.requests += 1
+			delay = server.latency
+			if type(delay) is TupleType:
+				delay = server.random.uniform(*delay)
+			fail = server.error_rate > 0 and server.random.random() < server.error_rate
+		if delay:
+			time.sleep(delay)
+		recording = server.recordings.get(canonical_url(self.path))
+		if fail:
+			status, body = server.error_code, ''
+		elif recording is None:
+			status, body = 404, ''
+		else:
+			status, body = recording['status'], recording['body']
+		if isinstance(body, unicode):
+			body = body.encode('utf-8')
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+	
+	def log_message(self, format, *args):
+		pass
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+	
+	def handle_error(self, request, client_address):
+		# Clients which time out or cancel close the connection before the response is sent
+		if not isinstance(sys.exc_info()[1], socket.error):
+			BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+class OctopartStubServer(object):
+	
+	"""Local HTTP server which serves recorded API responses.
+	
+	Point a client at it with Octopart(base_url=server.url). Requests which were 
+	not recorded receive a 404 response.
+	"""
+	
+	def __init__(self, recordings, latency=0.0, error_rate=0.0, error_code=503, seed=None, host='127.0.0.1', port=0):
+		"""
+		@param recordings: A recordings dictionary, or the path of a recordings file.
+		@param latency: Seconds to wait before each response, or a (min, max) pair 
+		to wait a uniformly random time.
+		@param error_rate: Fraction of requests, chosen at random, answered with error_code.
+		@param seed: Random seed, for reproducible latency and error injection.
+		@param port: Port to listen on. The default picks a free port.
+		"""
+		
+		if isinstance(recordings, basestring):
+			recordings = load_recordings(recordings)
+		self._server = _ThreadingHTTPServer((host, port), _StubRequestHandler)
+		self._server.recordings = recordings
+		self._server.latency = latency
+		self._server.error_rate = error_rate
+		self._server.error_code = error_code
+		self._server.random = random.Random(seed)
+		self._server.lock = threading.Lock()
+		self._server.requests = 0
+		self._thread = None
+	
+	@property
+	def url(self):
+		"""The API root URL served by the stub server."""
+		
+		host, port = self._server.server_address[:2]
+		return 'http://%s:%d/api/v2/' % (host, port)
+	
+	@property
+	def requests(self):
+		"""Number of requests received so far."""
+		
+		return self._server.requests
+	
+	def configure(self, latency=None, error_rate=None, error_code=None):
+		"""Change the latency and error injection of a running server."""
+		
+		with self._server.lock:
+			if latency is not None:
+				self._server.latency = latency
+			if error_rate is not None:
+				self._server.error_rate = error_rate
+			if error_code is not None:
+				self._server.error_code = error_code
+	
+	def start(self):
+		"""Start serving in a background thread."""
+		
+		self._thread = threading.Thread(target=self._server.serve_forever)
+		self._thread.daemon = True
+		self._thread.start()
+		return self
+	
+	def stop(self):
+		"""Stop serving and close the listening socket."""
+		
+		self._server.shutdown()
+		self._server.server_close()
+		self._thread.join()
+	
+	def __enter__(self):
+		return self.start()
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.stop()
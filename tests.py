@@ -1,12 +1,24 @@
 """
-NOTE: Running this unit test generates 24 API requests.
+NOTE: DataEquivalenceTest replays the responses recorded in test_recordings.json,
+so the tests make no API requests.
+
+Set OCTOPART_RECORD to a file path to make DataEquivalenceTest's 24 requests to the
+live API and record them there, and OCTOPART_REPLAY to the path of another recording
+to replay it instead.
 """
 
+import copy
 import os
+import sys
+import atexit
 import unittest
 import urllib2
+import urlparse
 import json
 import traceback
+import threading
+import time
+import datetime
 
 # Add build directory to search path
 if os.path.exists("build"):
@@ -43,10 +55,18 @@ class DictDiffer(object):
     def unchanged(self):
         return set(o for o in self.intersect if self.past_dict[o] == self.current_dict[o])
 
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_recordings.json')
+
+if os.environ.get('OCTOPART_RECORD'):
+	transport = RecordingTransport()
+	atexit.register(transport.save, os.environ['OCTOPART_RECORD'])
+else:
+	transport = ReplayTransport(os.environ.get('OCTOPART_REPLAY') or RECORDINGS)
+
 def get(req_url):
 	"""Return a JSON dictionary from a pre-formed request URL."""
 	
-	response = unicode(urllib2.urlopen(req_url).read())
+	response = unicode(transport.fetch(req_url))
 	return json.loads(response)
 
 def json_eq(a, b):
@@ -97,21 +117,78 @@ def json_eq(a, b):
 			traceback.print_exc()
 			raise AssertionError(a, b)
 
-api = Octopart(apikey='92bdca1b')
+def brand_json(id, displayname):
+	"""Return a synthetic JSON Brand resource."""
+	
+	return {'__class__' : 'Brand', 'id' : id, 'displayname' : displayname, \
+		'homepage_url' : 'http://www.example.com/%d' % id}
+
+def offer_json(supplier_id, sku, avail, prices, update_ts='2012-01-01T00:00:00Z', is_authorized=True):
+	"""Return a synthetic JSON offer as found in a Part resource."""
+	
+	return {'supplier' : brand_json(supplier_id, 'Supplier %d' % supplier_id), 'sku' : sku, \
+		'avail' : avail, 'prices' : prices, 'is_authorized' : is_authorized, \
+		'clickthrough_url' : 'http://octopart.com/click/%s' % sku, 'update_ts' : update_ts}
+
+def part_json(uid, mpn='PART', offers=None, specs=None):
+	"""Return a synthetic JSON Part resource."""
+	
+	return {'__class__' : 'Part', 'uid' : uid, 'mpn' : mpn, \
+		'manufacturer' : brand_json(1, 'Maker'), 'detail_url' : 'http://octopart.com/%d' % uid, \
+		'avg_price' : [1.0, 'USD', 1], 'avg_avail' : 100, 'market_status' : 'Active', \
+		'num_suppliers' : 1, 'num_authsuppliers' : 1, 'short_description' : 'Part %d' % uid, \
+		'category_ids' : [4174], 'images' : [], 'datasheets' : [], 'descriptions' : [], \
+		'hyperlinks' : {}, 'offers' : offers or [], 'specs' : specs or []}
+
+class FakeClock(object):
+	
+	"""Stands in for octopart._timer, in the package and its imported submodules, 
+	so tests move time forward with advance() rather than sleeping.
+	"""
+	
+	def __init__(self, now=1000.0):
+		self.now = now
+		self.patched = []
+	
+	def __call__(self):
+		return self.now
+	
+	def advance(self, seconds):
+		self.now += seconds
+	
+	def __enter__(self):
+		for name, module in sys.modules.items():
+			if (name == 'octopart' or name.startswith('octopart.')) and module is not None and '_timer' in module.__dict__:
+				self.patched.append((module, module._timer))
+				module._timer = self
+		return self
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		for module, timer in self.patched:
+			module._timer = timer
+		self.patched = []
+
+api = Octopart(apikey='92bdca1b', transport=transport)
 # Reference JSON objects with known-good URL
 brand = OctopartBrand(459, "Digi-Key", "http://www.digikey.com")
-categories_get_ref = get('http://octopart.com/api/v2/categories/get?id=4174&apikey=92bdca1b')
-categories_get_multi_ref = get('http://octopart.com/api/v2/categories/get_multi?ids=[4215,4174,4780]&apikey=92bdca1b')
-categories_search_ref = get('http://octopart.com/api/v2/categories/search?q=resistor&apikey=92bdca1b')
-parts_get_ref = get('http://octopart.com/api/v2/parts/get?uid=39619421&apikey=92bdca1b')
-parts_get_multi_ref = get('http://octopart.com/api/v2/parts/get_multi?uids=[39619421,29035751,31119928]&apikey=92bdca1b')
-parts_search_ref = get('http://octopart.com/api/v2/parts/search?q=resistor&limit=10&apikey=92bdca1b')
-parts_suggest_ref = get('http://octopart.com/api/v2/parts/suggest?q=sn74f&limit=3&apikey=92bdca1b')
-parts_match_ref = get('http://octopart.com/api/v2/parts/match?manufacturer_name=texas+instruments&mpn=SN74LS240N&apikey=92bdca1b')
-partattributes_get_ref = get('http://octopart.com/api/v2/partattributes/get?fieldname=capacitance&apikey=92bdca1b')
-partattributes_get_multi_ref = get('http://octopart.com/api/v2/partattributes/get_multi?fieldnames=["capacitance","resistance"]&apikey=92bdca1b')
-bom_match_ref = get('http://octopart.com/api/v2/bom/match?lines=[{%22mpn%22%3A+%22SN74LS240N%22%2C+%22manufacturer%22%3A+%22Texas+Instruments%22},' +
-                    '{%22mpn%22%3A+%22RB-220-07A+R%22%2C+%22manufacturer%22%3A+%22C%26K%20Components%22}]&apikey=92bdca1b')
+
+def load_references():
+	"""Fetch the reference JSON objects with known-good URLs."""
+	
+	global categories_get_ref, categories_get_multi_ref, categories_search_ref, parts_get_ref, parts_get_multi_ref, parts_search_ref, \
+		parts_suggest_ref, parts_match_ref, partattributes_get_ref, partattributes_get_multi_ref, bom_match_ref
+	categories_get_ref = get('http://octopart.com/api/v2/categories/get?id=4174&apikey=92bdca1b')
+	categories_get_multi_ref = get('http://octopart.com/api/v2/categories/get_multi?ids=[4215,4174,4780]&apikey=92bdca1b')
+	categories_search_ref = get('http://octopart.com/api/v2/categories/search?q=resistor&apikey=92bdca1b')
+	parts_get_ref = get('http://octopart.com/api/v2/parts/get?uid=39619421&apikey=92bdca1b')
+	parts_get_multi_ref = get('http://octopart.com/api/v2/parts/get_multi?uids=[39619421,29035751,31119928]&apikey=92bdca1b')
+	parts_search_ref = get('http://octopart.com/api/v2/parts/search?q=resistor&limit=10&apikey=92bdca1b')
+	parts_suggest_ref = get('http://octopart.com/api/v2/parts/suggest?q=sn74f&limit=3&apikey=92bdca1b')
+	parts_match_ref = get('http://octopart.com/api/v2/parts/match?manufacturer_name=texas+instruments&mpn=SN74LS240N&apikey=92bdca1b')
+	partattributes_get_ref = get('http://octopart.com/api/v2/partattributes/get?fieldname=capacitance&apikey=92bdca1b')
+	partattributes_get_multi_ref = get('http://octopart.com/api/v2/partattributes/get_multi?fieldnames=["capacitance","resistance"]&apikey=92bdca1b')
+	bom_match_ref = get('http://octopart.com/api/v2/bom/match?lines=[{%22mpn%22%3A+%22SN74LS240N%22%2C+%22manufacturer%22%3A+%22Texas+Instruments%22},' +
+	                    '{%22mpn%22%3A+%22RB-220-07A+R%22%2C+%22manufacturer%22%3A+%22C%26K%20Components%22}]&apikey=92bdca1b')
 
 class ArgumentValidationTest(unittest.TestCase):
 	
@@ -120,9 +197,39 @@ class ArgumentValidationTest(unittest.TestCase):
 	
 	def tearDown(self):
 		unittest.TestCase.tearDown(self)
+	
+	def assertCode(self, code, arguments, method, *args):
+		try:
+			method(*args)
+		except OctopartException as e:
+			assert (e.code, e.arguments) == (code, arguments), (e.code, e.arguments)
+		else:
+			raise AssertionError('No OctopartException raised')
+	
+	def test_multi_item_types(self):
+		for negative_cache in (None, OctopartNegativeCache()):
+			client = Octopart(transport=FakeTransport({}), negative_cache=negative_cache)
+			self.assertCode(2, {'uids' : 5}, client.parts_get_multi, 5)
+			self.assertCode(2, {'fieldnames' : None}, client.partattributes_get_multi, None)
+			# Tuples and strings are not lists, and are not split
+			self.assertCode(2, {'ids' : (1, 2)}, client.categories_get_multi, (1, 2))
+			self.assertCode(2, {'uids' : 'abc'}, client.parts_get_multi, 'abc')
+			self.assertCode(2, {'lines' : ({'mpn' : 'PART'},)}, client.bom_match, ({'mpn' : 'PART'},))
+			# Unhashable items are rejected before they reach the negative cache
+			self.assertCode(2, {'uids' : [[1]]}, client.parts_get_multi, [[1]])
+			self.assertCode(2, {'uid' : [1]}, client.parts_get, [1])
+			# An empty list is still requested
+			transport = FakeTransport({'categories/get_multi?ids=[]' : []})
+			client = Octopart(transport=transport, negative_cache=negative_cache)
+			assert client.categories_get_multi([]) is None and len(transport.urls) == 1
+		print 'test_multi_item_types OK'
 
 class DataEquivalenceTest(unittest.TestCase):
 	
+	@classmethod
+	def setUpClass(cls):
+		load_references()
+	
 	def test_categories_get(self):
 		json_obj, category = api.categories_get(4174)
 		assert json_obj is not None
@@ -231,6 +338,1355 @@ class DataEquivalenceTest(unittest.TestCase):
 				assert part.equals_json(json_obj['results'][results.index(result)]['items'][result['items'].index(part)])
 		print 'test_bom_match OK'
 	
+class RefreshSchedulerTest(unittest.TestCase):
+	
+	class FakeApi(Octopart):
+		def __init__(self, parts):
+			Octopart.__init__(self)
+			self.parts = parts
+			self.calls = []
+		def parts_get_multi(self, uids, **kwargs):
+			self.calls.append(list(uids))
+			found = [self.parts[uid] for uid in uids if uid in self.parts]
+			return found, [OctopartPart.new_from_dict(p) for p in found]
+	
+	def setUp(self):
+		self.now = datetime.datetime(2012, 1, 10)
+		old = [OctopartPart.new_from_dict(part_json(1, offers=[offer_json(459, 'A', 10, [[1, 1.0, 'USD']], '2012-01-01T00:00:00Z')])), 
+			OctopartPart.new_from_dict(part_json(2, offers=[offer_json(459, 'B', 5, [[1, 2.0, 'USD']], '2012-01-09T12:00:00Z')])), 
+			OctopartPart.new_from_dict(part_json(3, offers=[offer_json(459, 'C', 0, [[1, 3.0, 'USD']], '2012-01-05T00:00:00Z')]))]
+		self.fresh = {1 : part_json(1, offers=[offer_json(459, 'A', 7, [[1, 1.0, 'USD']], '2012-01-10T00:00:00Z'), 
+				offer_json(1885, 'A2', 3, [[1, 0.9, 'USD']], '2012-01-10T00:00:00Z')]), 
+			3 : part_json(3, offers=[offer_json(459, 'C', 0, [[1, 3.0, 'USD']], '2012-01-10T00:00:00Z')])}
+		self.api = self.FakeApi(self.fresh)
+		self.scheduler = OctopartRefreshScheduler(self.api, old, importance={3 : 10.0})
+	
+	def test_stale_uids(self):
+		# Part 3 is younger than part 1 but ten times as important
+		assert self.scheduler.stale_uids(self.now) == [3, 1]
+		assert self.scheduler.stale_uids(self.now, limit=1) == [3]
+		print 'test_stale_uids OK'
+	
+	def test_refresh(self):
+		changes = self.scheduler.refresh(now=self.now)
+		assert self.api.calls == [[3, 1]]
+		assert sorted((c['uid'], c['supplier_id'], c['sku'], c['change']) for c in changes) == \
+			[(1, 459, 'A', 'changed'), (1, 1885, 'A2', 'added')]
+		assert self.scheduler.parts[1].offers[0]['avail'] == 7
+		assert self.scheduler.stale_uids(self.now) == []
+		print 'test_refresh OK'
+	
+	def test_refresh_cancel(self):
+		cancel = OctopartCancelToken()
+		api = self.api
+		def parts_get_multi(uids, **kwargs):
+			if api.calls:
+				# Cancelled while the second batch is in flight
+				kwargs['cancel'].cancel()
+				raise OctopartException({}, {}, {}, 16)
+			return self.FakeApi.parts_get_multi(api, uids, **kwargs)
+		api.parts_get_multi = parts_get_multi
+		self.scheduler.batch_size = 1
+		self.scheduler.refresh(max_requests=2, now=self.now, cancel=cancel)
+		assert self.api.calls == [[3]]
+		assert self.scheduler.stale_uids(self.now) == [1]
+		print 'test_refresh_cancel OK'
+	
+	def test_refresh_budget(self):
+		self.scheduler.batch_size = 1
+		self.scheduler.refresh(max_requests=1, now=self.now)
+		assert self.api.calls == [[3]]
+		print 'test_refresh_budget OK'
+	
+class PartDiffTest(unittest.TestCase):
+	
+	def setUp(self):
+		capacitance = {'__class__' : 'PartAttribute', 'fieldname' : 'capacitance', 'displayname' : 'Capacitance', 'type' : 'number', 'metadata' : {}}
+		voltage = {'__class__' : 'PartAttribute', 'fieldname' : 'voltage', 'displayname' : 'Voltage', 'type' : 'number', 'metadata' : {}}
+		self.old = OctopartPart.new_from_dict(part_json(1, offers=[offer_json(459, 'A', 10, [[1, 1.0, 'USD']]), 
+				offer_json(459, 'B', 10, [[1, 1.0, 'USD']])], 
+			specs=[{'attribute' : capacitance, 'values' : [1e-06]}, {'attribute' : voltage, 'values' : [5]}]))
+		new_json = part_json(1, offers=[offer_json(459, 'B', 10, [[1, 1.0, 'USD']]), 
+				offer_json(459, 'A', 4, [[1, 1.0, 'USD']]), offer_json(1885, 'C', 1, [[1, 0.5, 'USD']])], 
+			specs=[{'attribute' : capacitance, 'values' : [2.2e-06]}])
+		new_json['market_status'] = 'EOL'
+		self.new = OctopartPart.new_from_dict(new_json)
+	
+	def test_diff_parts(self):
+		diff = diff_parts(self.old, self.new)
+		assert diff
+		assert [(d[0], d[1], d[2]) for d in diff.changed if d[0][0] == 'market_status'] == [(('market_status',), 'Active', 'EOL')]
+		assert diff.paths() == set([('market_status',), ('offers', (459, 'A'), 'avail'), ('offers', (1885, 'C')), 
+			('specs', 'capacitance', 'values'), ('specs', 'voltage')])
+		assert [d[0] for d in diff.added] == [('offers', (1885, 'C'))]
+		assert [d[0] for d in diff.removed] == [('specs', 'voltage')]
+		assert not diff_parts(self.old, OctopartPart.new_from_dict(part_json(1, offers=[offer_json(459, 'B', 10, [[1, 1.0, 'USD']]), 
+				offer_json(459, 'A', 10, [[1, 1.0, 'USD']])], specs=self.old.specs)))
+		print 'test_diff_parts OK'
+	
+	def test_diff_part_sets(self):
+		two = OctopartPart.new_from_dict(part_json(2))
+		three = OctopartPart.new_from_dict(part_json(3))
+		diffs = dict((d.uid, d) for d in diff_part_sets({1 : self.old, 2 : two}, {1 : self.old, 3 : three}))
+		assert sorted(diffs.keys()) == [2, 3]
+		assert diffs[2].removed == [((), two)] and diffs[3].added == [((), three)]
+		diffs = list(diff_part_sets({1 : self.old}, {1 : self.new}))
+		assert [d.uid for d in diffs] == [1]
+		print 'test_diff_part_sets OK'
+	
+class HashingTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.offers = [offer_json(459, 'A', 10, [[1, 1.0, 'USD']]), offer_json(1885, 'B', 3, [[1, 0.5, 'USD']])]
+		self.part = OctopartPart.new_from_dict(part_json(1, offers=self.offers))
+	
+	def test_hash(self):
+		parts = set([self.part, OctopartPart.new_from_dict(part_json(1, offers=self.offers)), OctopartPart.new_from_dict(part_json(2))])
+		assert len(parts) == 2
+		brands = {OctopartBrand(459, "Digi-Key", "http://www.digikey.com") : 1}
+		assert brands[brand] == 1
+		assert isinstance(hash(OctopartPartAttribute('capacitance', 'Capacitance', 'number', {})), int)
+		print 'test_hash OK'
+	
+	def test_fingerprint(self):
+		reordered = OctopartPart.new_from_dict(part_json(1, offers=list(reversed(self.offers))))
+		assert self.part.fingerprint() == reordered.fingerprint()
+		assert self.part.fingerprint() != OctopartPart.new_from_dict(part_json(2)).fingerprint()
+		self.part.offers[0]['avail'] = 0
+		assert self.part.fingerprint() == reordered.fingerprint()
+		assert self.part.fingerprint(refresh=True) != reordered.fingerprint()
+		print 'test_fingerprint OK'
+	
+	def test_to_dict(self):
+		assert self.part.equals_json(self.part.to_dict())
+		assert self.part.equals_json(part_json(1, offers=list(reversed(self.offers))))
+		assert not self.part.equals_json(part_json(1, offers=self.offers[:1]))
+		assert brand.equals_json(brand.to_dict())
+		print 'test_to_dict OK'
+	
+class BinaryFormatTest(unittest.TestCase):
+	
+	def setUp(self):
+		attribute = {'__class__' : 'PartAttribute', 'fieldname' : 'capacitance', 'displayname' : 'Capacitance', \
+			'type' : 'number', 'metadata' : {'datatype' : 'decimal', 'unit' : {'name' : 'farads', 'symbol' : 'F'}}}
+		self.parts = [OctopartPart.new_from_dict(part_json(uid, mpn=u'MPN-\u00b5%d' % uid, 
+				offers=[offer_json(459, 'A%d' % uid, uid * 10, [[1, 0.25, 'USD'], [100, 0.125, 'USD']]), 
+					offer_json(1885, 'B%d' % uid, 0, [], is_authorized=False)], 
+				specs=[{'attribute' : attribute, 'values' : [uid * 1e-06]}])) for uid in range(1, 50)]
+		self.category = OctopartCategory(4174, 4161, 'Resistors', [{'url' : 'http://example.com/r.png'}], [4175, 4176], [4161], [], 12345)
+	
+	def test_round_trip(self):
+		objs = self.parts + [self.category, brand, OctopartPartAttribute('resistance', 'Resistance', 'number', {}), 
+			{'json' : [None, True, False, -5, 2 ** 70, 1.5, datetime.datetime(1969, 7, 20, 20, 17, 40)]}]
+		data = to_binary(objs)
+		decoded = from_binary(data)
+		assert len(decoded) == len(objs)
+		for a, b in zip(objs, decoded):
+			assert a == b
+			assert type(a) == type(b)
+		assert decoded[0].offers[0]['supplier'] is decoded[1].offers[0]['supplier']
+		assert len(data) < len(json.dumps([p.to_dict() for p in self.parts])) / 2
+		print 'test_round_trip OK'
+	
+	def test_streaming(self):
+		import StringIO
+		out = StringIO.StringIO()
+		writer = OctopartBinaryWriter(out, max_strings=16)
+		for part in self.parts:
+			writer.write(part)
+		reader = OctopartBinaryReader(StringIO.StringIO(out.getvalue()))
+		reader.chunk_size = 7
+		assert list(reader) == self.parts
+		self.assertRaises(ValueError, OctopartBinaryReader, StringIO.StringIO('JSON'))
+		print 'test_streaming OK'
+	
+class SnapshotTest(unittest.TestCase):
+	
+	def setUp(self):
+		import tempfile
+		self.parts = [OctopartPart.new_from_dict(part_json(uid, offers=[offer_json(459, 'A%d' % uid, uid, [[1, 0.5, 'USD']])])) 
+			for uid in (39619421, 29035751, 31119928, 5)]
+		fd, self.path = tempfile.mkstemp()
+		os.close(fd)
+		write_snapshot(self.path, self.parts)
+	
+	def tearDown(self):
+		os.remove(self.path)
+	
+	def test_snapshot(self):
+		with OctopartSnapshot(self.path) as snapshot:
+			assert len(snapshot) == 4
+			assert list(snapshot.uids()) == [5, 29035751, 31119928, 39619421]
+			assert snapshot.get(29035751) == self.parts[1]
+			assert 39619421 in snapshot and 6 not in snapshot
+			assert snapshot.get(6) is None
+			assert snapshot.get_multi([5, 6, 31119928]) == [self.parts[3], self.parts[2]]
+			assert sorted(snapshot, key=lambda p: p.uid) == sorted(self.parts, key=lambda p: p.uid)
+		print 'test_snapshot OK'
+	
+	def test_snapshot_fork(self):
+		if not hasattr(os, 'fork'):
+			return
+		snapshot = OctopartSnapshot(self.path)
+		pid = os.fork()
+		if pid == 0:
+			os._exit(0 if snapshot.get(5) == self.parts[3] else 1)
+		assert os.waitpid(pid, 0)[1] == 0
+		snapshot.close()
+		print 'test_snapshot_fork OK'
+	
+class FakeTransport(object):
+	
+	"""Transport serving synthetic JSON bodies from a dictionary of canonical URL -> JSON object."""
+	
+	def __init__(self, responses):
+		self.responses = responses
+		self.urls = []
+	
+	def fetch(self, req_url):
+		self.urls.append(req_url)
+		key = canonical_url(req_url)
+		if key not in self.responses:
+			raise urllib2.HTTPError(req_url, 404, 'Not Found', None, None)
+		return json.dumps(self.responses[key])
+
+class RecordReplayTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.responses = {'parts/get?uid=1' : part_json(1), 
+			'parts/get_multi?uids=[1,2]' : [part_json(1), part_json(2)], 
+			'bom/match?lines=[{"mpn":"PART"}]' : {'results' : [{'items' : [part_json(1)], 'reference' : '', 'status' : 'exact_match'}]}}
+		self.recorder = RecordingTransport(FakeTransport(self.responses))
+		client = Octopart(apikey='recordkey', transport=self.recorder)
+		client.parts_get(1)
+		client.parts_get(3)
+		client.parts_get_multi([1, 2])
+		client.bom_match([{'mpn' : 'PART'}])
+		self.recordings = json.loads(json.dumps(self.recorder.recordings))
+	
+	def test_replay(self):
+		assert sorted(self.recordings) == sorted(self.responses.keys() + ['parts/get?uid=3'])
+		client = Octopart(apikey='otherkey', transport=ReplayTransport(self.recordings))
+		json_obj, part = client.parts_get(1)
+		assert json_obj == part_json(1)
+		assert client.parts_get(3) is None
+		assert len(client.parts_get_multi([1, 2])[1]) == 2
+		try:
+			client.parts_get(4)
+		except OctopartException as e:
+			assert e.code == 12
+		else:
+			assert False
+		print 'test_replay OK'
+	
+	def test_stub_server(self):
+		with OctopartStubServer(self.recordings, seed=0) as server:
+			client = Octopart(apikey='otherkey', base_url=server.url)
+			json_obj, results = client.bom_match([{'mpn' : 'PART'}])
+			assert results[0]['items'][0].equals_json(part_json(1))
+			assert client.parts_get(3) is None
+			assert client.parts_get(4) is None
+			server.configure(error_rate=1.0)
+			try:
+				client.parts_get(1)
+			except OctopartException as e:
+				assert e.code == 8
+			else:
+				assert False
+			assert server.requests == 4
+		print 'test_stub_server OK'
+	
+class MetricsTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.metrics = OctopartMetrics()
+		self.client = Octopart(transport=FakeTransport({'parts/get?uid=1' : part_json(1)}), hooks=[self.metrics])
+	
+	def test_metrics(self):
+		self.client.parts_get(1)
+		self.client.parts_get(2)
+		self.assertRaises(OctopartException, self.client.parts_get, 'x')
+		assert self.metrics.count('calls', 'parts/get') == 3
+		assert self.metrics.count('errors', label='OctopartException2') == 1
+		assert self.metrics.count('bytes') == len(json.dumps(part_json(1)))
+		for phase in ('validate', 'url', 'network'):
+			assert self.metrics.histogram('parts/get', phase).count == 2
+		for phase in ('parse', 'build'):
+			assert self.metrics.histogram('parts/get', phase).count == 1
+		assert self.metrics.histogram('parts/get').count == 3
+		assert self.metrics.histogram('parts/get').percentile(0.5) is not None
+		text = self.metrics.to_prometheus()
+		assert 'octopart_phase_seconds_count{method="parts/get",phase="total"} 3' in text
+		assert 'octopart_errors_total{method="parts/get",error="OctopartException2"} 1' in text
+		print 'test_metrics OK'
+	
+	def test_statsd(self):
+		calls = []
+		class Recorder(OctopartHooks):
+			def call_finished(self, call):
+				calls.append(call)
+		self.client.hooks.append(Recorder())
+		self.client.parts_get(1)
+		lines = OctopartStatsdHook().statsd_lines(calls[0])
+		assert 'octopart.parts_get.calls:1|c' in lines
+		assert [l for l in lines if l.startswith('octopart.parts_get.network:') and l.endswith('|ms')]
+		print 'test_statsd OK'
+	
+class TracingTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.transport = FakeTransport({'parts/get?uid=1' : part_json(1), 'parts/get_multi?uids=[1,2]' : [part_json(1), part_json(2)]})
+	
+	def test_tracer(self):
+		import StringIO
+		tracer = OctopartTracer()
+		client = Octopart(apikey='secret', transport=self.transport, hooks=[tracer])
+		client.parts_get(1)
+		client.parts_get_multi([1, 2])
+		first, second = tracer.spans
+		assert first['method'] == 'parts/get' and first['url'] == 'parts/get?uid=1'
+		assert second['batch_size'] == 2 and second['error'] is None
+		assert set(first['phases']) == set(['validate', 'url', 'network', 'parse', 'build'])
+		out = StringIO.StringIO()
+		tracer.write_chrome_trace(out)
+		events = json.loads(out.getvalue())['traceEvents']
+		assert [e['name'] for e in events if e['cat'] == 'call'] == ['parts/get', 'parts/get_multi']
+		assert 'secret' not in out.getvalue()
+		print 'test_tracer OK'
+	
+	def test_profiler(self):
+		import tempfile, shutil, pstats
+		directory = tempfile.mkdtemp()
+		try:
+			profiler = OctopartProfilingHook(directory, slowest=1.0, min_samples=4, max_profiles=5)
+			client = Octopart(transport=self.transport, hooks=[profiler])
+			for i in range(10):
+				client.parts_get(1)
+			# Nothing is kept before min_samples calls, or after max_profiles
+			assert len(profiler.profiles) == 5 and len(os.listdir(directory)) == 5
+			stats = pstats.Stats(profiler.profiles[0][0])
+			assert stats.total_calls > 0
+		finally:
+			shutil.rmtree(directory)
+		print 'test_profiler OK'
+	
+	def test_profiler_threads(self):
+		import tempfile, shutil
+		directory = tempfile.mkdtemp()
+		try:
+			profiler = OctopartProfilingHook(directory, slowest=1.0, min_samples=1, max_profiles=3)
+			client = Octopart(transport=self.transport, hooks=[profiler])
+			threads = [threading.Thread(target=lambda: [client.parts_get(1) for i in range(5)]) for t in range(8)]
+			for thread in threads:
+				thread.start()
+			for thread in threads:
+				thread.join()
+			# Concurrent slow calls do not write more than max_profiles
+			assert len(profiler.profiles) == 3 and len(os.listdir(directory)) == 3
+		finally:
+			shutil.rmtree(directory)
+		print 'test_profiler_threads OK'
+	
+class ProjectionTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.part = part_json(1, offers=[offer_json(459, 'A', 10, [[1, 1.0, 'USD']])])
+		self.part['images'] = [{'url' : 'http://example.com/1.png'}]
+		self.transport = FakeTransport({})
+		self.client = Octopart(transport=self.transport)
+	
+	def test_new_from_dict(self):
+		part = OctopartPart.new_from_dict(self.part, frozenset(['offers', 'avg_price']))
+		assert part.uid == 1 and part.manufacturer.id == 1
+		assert part.offers[0]['supplier'].id == 459 and part.avg_price == [1.0, 'USD', 1]
+		assert part.images == [] and part.specs == [] and part.short_description == ''
+		print 'test_new_from_dict OK'
+	
+	def test_projection_flags(self):
+		self.transport.responses['parts/get?optimize.hide_datasheets=1&optimize.hide_descriptions=1&optimize.hide_specs=1&uid=1'] = self.part
+		json_obj, part = self.client.parts_get(1, fields=['offers', 'images'])
+		assert part.images == self.part['images'] and part.avg_avail is None
+		self.transport.responses['parts/get?optimize.hide_datasheets=0&optimize.hide_descriptions=1&optimize.hide_images=1&optimize.hide_specs=1&uid=1'] = self.part
+		json_obj, part = self.client.parts_get(1, fields=['offers'], optimize_hide_datasheets=False)
+		assert part.images == []
+		self.assertRaises(OctopartException, self.client.parts_get, 1, fields=['offers', 'colour'])
+		print 'test_projection_flags OK'
+	
+class OptimizeTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.part = part_json(1, offers=[offer_json(459, 'A', 10, [[1, 1.0, 'USD']], is_authorized=False)])
+		self.transport = FakeTransport({})
+	
+	def test_translate_hide_offers(self):
+		client = Octopart(transport=self.transport)
+		self.transport.responses['parts/get?optimize.hide_offers=1&optimize.hide_unauthorized_offers=1&uid=1'] = self.part
+		json_obj, part = client.parts_get(1, optimize_hide_offers=True, optimize_hide_unauthorized_offers=True)
+		assert part.uid == 1
+		# The misspelled names of earlier versions still work
+		json_obj, part = client.parts_get(1, optimize_hide_hide_offers=True, optimize_hide_hide_unauthorized_offers=True)
+		assert part.uid == 1
+		print 'test_translate_hide_offers OK'
+	
+	def test_profiles(self):
+		client = Octopart(transport=self.transport, optimize='minimal')
+		flags = 'optimize.hide_datasheets=1&optimize.hide_descriptions=1&optimize.hide_images=1&optimize.hide_offers=1&optimize.hide_specs=1'
+		self.transport.responses['parts/get_multi?' + flags + '&uids=[1]'] = [self.part]
+		assert len(client.parts_get_multi([1])[1]) == 1
+		self.transport.responses['bom/match?lines=[{"mpn":"A"}]&' + flags + '&optimize.return_stubs=1'] = {'results' : []}
+		assert client.bom_match([{'mpn' : 'A'}]) == ({'results' : []}, [])
+		# Arguments passed to the call override the profile
+		client = Octopart(transport=self.transport, optimize={'optimize_hide_specs' : True})
+		self.transport.responses['parts/get?optimize.hide_specs=0&uid=1'] = self.part
+		assert client.parts_get(1, optimize_hide_specs=False)[1].uid == 1
+		self.assertRaises(ValueError, Octopart, optimize='tiny')
+		print 'test_profiles OK'
+	
+	def test_equals_json_hides_unauthorized(self):
+		part = OctopartPart.new_from_dict(self.part)
+		stripped = copy.deepcopy(self.part)
+		stripped['offers'] = []
+		assert part.equals_json(stripped, hide_unauthorized_offers=True)
+		assert not part.equals_json(stripped)
+		print 'test_equals_json_hides_unauthorized OK'
+	
+class HydrationTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.parts = [part_json(uid, offers=[offer_json(459, 'A%d' % uid, 10, [[1, 1.0, 'USD']])]) for uid in range(1, 8)]
+		self.transport = FakeTransport({'parts/get_multi?uids=[1,2,3,4,5,6,7]' : self.parts})
+	
+	def test_pool(self):
+		with OctopartHydrationPool(processes=2, threshold=5) as pool:
+			client = Octopart(transport=self.transport, hydration=pool)
+			json_obj, parts = client.parts_get_multi(range(1, 8))
+			assert pool._pool is not None
+			assert [part.fingerprint() for part in parts] == \
+				[OctopartPart.new_from_dict(part).fingerprint() for part in self.parts]
+			assert parts[0].offers[0]['supplier'].id == 459
+		assert pool._pool is None
+		print 'test_pool OK'
+	
+	def test_body_paths(self):
+		lines = [{'mpn' : 'A'}, {'mpn' : 'B'}, {'mpn' : 'C'}]
+		matches = {'results' : [{'items' : self.parts[:3], 'reference' : '', 'status' : 'exact_match'}, 
+			{'items' : self.parts[3:], 'reference' : '', 'status' : 'exact_match'}]}
+		client = Octopart()
+		responses = {'parts/search?limit=7&q=part' : {'results' : [{'item' : part, 'highlight' : ''} for part in self.parts], 'hits' : 7}, 
+			canonical_url(client._make_url('bom/match', client._bom_match_args(lines[1:], {}))) : matches}
+		expected = [OctopartPart.new_from_dict(part).fingerprint() for part in self.parts]
+		negative_cache = OctopartNegativeCache()
+		negative_cache.add('bom_line', [OctopartNegativeCache.line_key(lines[0])])
+		with OctopartHydrationPool(processes=2, threshold=5) as pool:
+			client = Octopart(transport=FakeTransport(responses), hydration=pool, negative_cache=negative_cache)
+			json_obj, results = client.parts_search(q='part', limit=7)
+			assert [part.fingerprint() for part, highlight in results] == expected
+			# The first line is answered from the negative cache, and has no items in the body
+			json_obj, results = client.bom_match(lines)
+			assert [part.fingerprint() for result in results for part in result['items']] == expected
+			assert [len(result['items']) for result in results] == [0, 3, 4]
+		print 'test_body_paths OK'
+	
+	def test_below_threshold(self):
+		pool = OctopartHydrationPool(processes=2)
+		parts = pool.hydrate(self.parts, frozenset(['offers']))
+		assert pool._pool is None
+		assert len(parts) == 7 and parts[0].specs == []
+		print 'test_below_threshold OK'
+	
+class KeyRefusingTransport(FakeTransport):
+	
+	"""FakeTransport refusing requests made with some API keys."""
+	
+	def __init__(self, responses, refused, code=503):
+		FakeTransport.__init__(self, responses)
+		self.refused = refused
+		self.code = code
+	
+	def fetch(self, req_url):
+		key = urlparse.parse_qs(urlparse.urlparse(req_url).query).get('apikey', [None])[0]
+		if key in self.refused:
+			self.urls.append(req_url)
+			raise urllib2.HTTPError(req_url, self.code, 'Refused', None, None)
+		return FakeTransport.fetch(self, req_url)
+
+class KeyPoolTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.responses = {'parts/get?uid=1' : part_json(1)}
+	
+	def keys_used(self, transport):
+		return [urlparse.parse_qs(urlparse.urlparse(url).query)['apikey'][0] for url in transport.urls]
+	
+	def test_round_robin(self):
+		transport = FakeTransport(self.responses)
+		client = Octopart(apikey=OctopartKeyPool(['a', 'b', 'c']), transport=transport)
+		for i in range(4):
+			client.parts_get(1)
+		assert self.keys_used(transport) == ['a', 'b', 'c', 'a'] and client.apikey.keys == ['a', 'b', 'c']
+		print 'test_round_robin OK'
+	
+	def test_cooldown(self):
+		transport = KeyRefusingTransport(self.responses, ['a'])
+		pool = OctopartKeyPool(['a', 'b'], cooldown=60)
+		metrics = OctopartMetrics()
+		client = Octopart(apikey=pool, transport=transport, hooks=[metrics])
+		assert client.parts_get(1)[1].uid == 1
+		client.parts_get(1)
+		assert self.keys_used(transport) == ['a', 'b', 'b']
+		assert metrics.count('events', 'parts/get', 'retry') == 1
+		stats = pool.stats()
+		assert stats['a']['cooling_down'] and stats['a']['errors'] == 1
+		assert not stats['b']['cooling_down'] and stats['b']['requests'] == 2
+		# Every key refused: the last refusal is raised
+		transport.refused = ['a', 'b']
+		pool = OctopartKeyPool(['a', 'b'])
+		client = Octopart(apikey=pool, transport=transport)
+		try:
+			client.parts_get(1)
+			assert False
+		except OctopartException as e:
+			assert e.code == 8
+		print 'test_cooldown OK'
+	
+	def test_quota(self):
+		client = Octopart(apikey=OctopartKeyPool(['a', 'b'], quota=1), transport=FakeTransport(self.responses))
+		client.parts_get(1)
+		client.parts_get(1)
+		try:
+			client.parts_get(1)
+			assert False
+		except OctopartException as e:
+			assert e.code == 13
+		print 'test_quota OK'
+	
+class SchedulerTest(unittest.TestCase):
+	
+	def queue_requests(self, scheduler, classes, admitted):
+		"""Start a thread per class which records its admission and releases its slot, 
+		and wait until all are queued.
+		"""
+		
+		def request(priority_class):
+			scheduler.acquire(priority_class)
+			admitted.append(priority_class)
+			scheduler.release(priority_class)
+		threads = []
+		for priority_class in classes:
+			thread = threading.Thread(target=request, args=(priority_class,))
+			thread.start()
+			threads.append(thread)
+			while scheduler.queued()[priority_class] < classes[:len(threads)].count(priority_class):
+				time.sleep(0.001)
+		return threads
+	
+	def test_priority(self):
+		scheduler = OctopartRequestScheduler(max_concurrent=1)
+		scheduler.acquire('bulk')
+		admitted = []
+		threads = self.queue_requests(scheduler, ['bulk', 'normal', 'interactive'], admitted)
+		scheduler.release('bulk')
+		for thread in threads:
+			thread.join()
+		assert admitted == ['interactive', 'normal', 'bulk']
+		print 'test_priority OK'
+	
+	def test_aging(self):
+		with FakeClock() as clock:
+			scheduler = OctopartRequestScheduler(max_concurrent=1, aging=1.0)
+			scheduler.acquire('bulk')
+			admitted = []
+			threads = self.queue_requests(scheduler, ['bulk'], admitted)
+			# Queued for ten agings, the bulk request outranks a new interactive one
+			clock.advance(10)
+			threads += self.queue_requests(scheduler, ['interactive'], admitted)
+			scheduler.release('bulk')
+			for thread in threads:
+				thread.join()
+		assert admitted == ['bulk', 'interactive']
+		print 'test_aging OK'
+	
+	def test_class_limit_and_deadline(self):
+		scheduler = OctopartRequestScheduler(max_concurrent=2, \
+			classes={'interactive' : {'priority' : 0}, 'normal' : {'priority' : 1}, \
+					'bulk' : {'priority' : 2, 'max_concurrent' : 1, 'deadline' : 0.01}})
+		scheduler.acquire('bulk')
+		try:
+			scheduler.acquire('bulk')
+			assert False
+		except OctopartException as e:
+			assert e.code == 14
+		# The slot bulk requests may not use is left for interactive ones
+		scheduler.acquire('interactive')
+		assert scheduler.active == {'interactive' : 1, 'normal' : 0, 'bulk' : 1}
+		print 'test_class_limit_and_deadline OK'
+	
+	def test_client(self):
+		tracer = OctopartTracer()
+		scheduler = OctopartRequestScheduler()
+		client = Octopart(transport=FakeTransport({'parts/get?uid=1' : part_json(1)}), scheduler=scheduler, hooks=[tracer])
+		assert client.parts_get(1)[1].uid == 1
+		assert 'queue' in tracer.spans[0]['phases'] and scheduler.active['interactive'] == 0
+		print 'test_client OK'
+	
+class DeadlineTest(unittest.TestCase):
+	
+	def setUp(self):
+		# Responses take far longer than the timeouts, so a call which is not cut 
+		# off succeeds, and the tests need not time the calls
+		self.server = OctopartStubServer({'parts/get?uid=1' : {'status' : 200, 'body' : json.dumps(part_json(1))}}, \
+										latency=10).start()
+	
+	def tearDown(self):
+		self.server.stop()
+	
+	def assert_code(self, code, function, *args, **kwargs):
+		try:
+			function(*args, **kwargs)
+			assert False
+		except OctopartException as e:
+			assert e.code == code, e.code
+	
+	def test_total(self):
+		client = Octopart(base_url=self.server.url)
+		self.assert_code(15, client.parts_get, 1, timeout=0.1)
+		client = Octopart(base_url=self.server.url, timeout=0.1)
+		self.assert_code(15, client.parts_get, 1)
+		self.server.configure(latency=0)
+		assert client.parts_get(1, timeout=30)[1].uid == 1
+		print 'test_total OK'
+	
+	def test_read(self):
+		client = Octopart(base_url=self.server.url, timeout=OctopartTimeout(connect=30, read=0.1))
+		self.assert_code(15, client.parts_get, 1)
+		print 'test_read OK'
+	
+	def test_cancel(self):
+		cancel = OctopartCancelToken()
+		class CancellingTransport(FakeTransport):
+			def fetch(self, req_url):
+				cancel.cancel()
+				return FakeTransport.fetch(self, req_url)
+		client = Octopart(transport=CancellingTransport({'parts/get?uid=1' : part_json(1)}))
+		# Cancelled in flight: the call stops once the response arrives
+		self.assert_code(16, client.parts_get, 1, cancel=cancel)
+		client = Octopart(transport=FakeTransport({}), scheduler=OctopartRequestScheduler())
+		self.assert_code(16, client.parts_get, 1, cancel=cancel)
+		print 'test_cancel OK'
+	
+class FacetTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.drilldown = {'results' : [], 'hits' : 30, 'drilldown' : [{'attribute' : {'__class__' : 'PartAttribute', \
+			'fieldname' : 'manufacturer.displayname', 'displayname' : 'Manufacturer', 'type' : 'text', 'metadata' : {}}, \
+			'facets' : [{'value' : 'Texas Instruments', 'count' : 20}, {'value' : 'Analog Devices', 'count' : 10}], \
+			'missing_count' : 0}]}
+		self.parts = [OctopartPart.new_from_dict(part_json(uid, offers=[offer_json(supplier, 'S%d' % uid, 1, [[1, 1.0, 'USD']]) \
+						for supplier in suppliers])) for uid, suppliers in ((1, [459]), (2, [459, 1885]), (3, []))]
+		self.parts[2].market_status = 'Obsolete'
+	
+	def test_cache(self):
+		transport = FakeTransport({'parts/search?drilldown.include=1&filters=[["category_ids",[1,2]],["market_status",["Active"]]]&limit=0&q=amp' : self.drilldown, 
+			'parts/search?drilldown.include=1&limit=0&q=other' : {'results' : [], 'hits' : 0, 'drilldown' : []}})
+		cache = OctopartFacetCache(Octopart(transport=transport), max_entries=1)
+		facets = cache.facets('amp', filters=[['market_status', ['Active']], ['category_ids', [2, 1]]])
+		assert facets['manufacturer.displayname'].values == [('Texas Instruments', 20), ('Analog Devices', 10)]
+		assert facets['manufacturer.displayname'].attribute.displayname == 'Manufacturer'
+		# Filters in another order hit the cache
+		cache.facets('amp', filters=[['category_ids', [1, 2]], ['market_status', ['Active']]])
+		assert len(transport.urls) == 1 and cache.hits == 1
+		# A second search evicts the first
+		assert cache.facets('other') == {}
+		cache.facets('amp', filters=[['market_status', ['Active']], ['category_ids', [2, 1]]])
+		assert len(transport.urls) == 3 and cache.misses == 3
+		# Facet searches always fetch no results with drilldowns
+		assert cache.facets('other', limit=20, drilldown_include=False) == {}
+		assert len(transport.urls) == 4 and canonical_url(transport.urls[-1]) == 'parts/search?drilldown.include=1&limit=0&q=other'
+		print 'test_cache OK'
+	
+	def test_index(self):
+		index = OctopartFacetIndex(self.parts)
+		facets = index.facets()
+		assert facets['offers.supplier.displayname'].values == [('Supplier 459', 2), ('Supplier 1885', 1)]
+		assert facets['offers.supplier.displayname'].missing_count == 1
+		assert facets['market_status'].counts() == {'Active' : 2, 'Obsolete' : 1}
+		filters = [['offers.supplier.displayname', ['Supplier 1885', 'Supplier 9']]]
+		assert [part.uid for part in index.search(filters)] == [2]
+		assert index.facets(filters, ['market_status'])['market_status'].values == [('Active', 1)]
+		index.add(OctopartPart.new_from_dict(part_json(4, offers=[offer_json(1885, 'S4', 1, [[1, 1.0, 'USD']])])))
+		assert index.count(filters) == 2 and index.count() == 4
+		assert index.count([['market_status', ['Active']], ['category_ids', [4174]]]) == 3
+		assert index.count([['market_status', ['Obsolete']], ['offers.supplier.displayname', ['Supplier 459']]]) == 0
+		print 'test_index OK'
+	
+	def test_index_update(self):
+		index = OctopartFacetIndex(self.parts)
+		assert index.facets()['market_status'].counts() == {'Active' : 2, 'Obsolete' : 1}
+		# A refreshed part replaces the facet values of the stored one
+		refreshed = OctopartPart.new_from_dict(part_json(2, offers=[offer_json(1885, 'S2', 1, [[1, 1.0, 'USD']])]))
+		refreshed.market_status = 'Obsolete'
+		index.update(refreshed)
+		assert len(index) == 3 and index.facets()['market_status'].counts() == {'Active' : 1, 'Obsolete' : 2}
+		assert index.facets()['offers.supplier.displayname'].values == [('Supplier 1885', 1), ('Supplier 459', 1)]
+		assert [part.uid for part in index.search([['market_status', ['Obsolete']]])] == [2, 3]
+		index.remove(3)
+		index.remove(3)
+		assert len(index) == 2 and index.count() == 2 and index.search([['market_status', ['Obsolete']]]) == [refreshed]
+		assert index.facets()['market_status'].counts() == {'Active' : 1, 'Obsolete' : 1}
+		assert index.facets()['offers.supplier.displayname'].missing_count == 0
+		print 'test_index_update OK'
+	
+def category_json(id, nodename):
+	return {'__class__' : 'Category', 'id' : id, 'parent_id' : 4161, 'nodename' : nodename, 'images' : [], \
+		'children_ids' : [], 'ancestor_ids' : [4161], 'ancestors' : [], 'num_parts' : 10}
+
+class MetadataCacheTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.transport = FakeTransport({'categories/get_multi?ids=[1,2]' : [category_json(1, 'One'), category_json(2, 'Two')], 
+			'categories/get_multi?ids=[3]' : [category_json(3, 'Three')], 
+			'partattributes/get_multi?fieldnames=["capacitance"]' : [{'__class__' : 'PartAttribute', \
+				'fieldname' : 'capacitance', 'displayname' : 'Capacitance', 'type' : 'number', 'metadata' : {}}]})
+		self.cache = OctopartMetadataCache(Octopart(transport=self.transport), max_age=60)
+	
+	def tearDown(self):
+		self.cache.close()
+	
+	def wait_idle(self):
+		while self.cache.pending():
+			time.sleep(0.001)
+	
+	def test_stale_while_revalidate(self):
+		assert [c.nodename for c in self.cache.categories([1, 2])] == ['One', 'Two']
+		assert self.cache.attribute('capacitance').displayname == 'Capacitance'
+		assert len(self.transport.urls) == 2
+		self.cache.category(1)
+		assert len(self.transport.urls) == 2
+		# Expired entries are served as they are, then refreshed in the background, 
+		# in one batch or more depending on how fast the thread picks them up
+		new = [category_json(1, 'Uno'), category_json(2, 'Dos')]
+		self.transport.responses.update({'categories/get_multi?ids=[1,2]' : new, 
+			'categories/get_multi?ids=[1]' : new[:1], 'categories/get_multi?ids=[2]' : new[1:]})
+		self.cache.max_age = 0
+		assert [c.nodename for c in self.cache.categories([1, 2])] == ['One', 'Two']
+		self.wait_idle()
+		assert self.cache.category(1).nodename == 'Uno'
+		self.wait_idle()
+		# Refresh failures keep the cached object
+		self.transport.responses.clear()
+		self.cache.categories([1, 2])
+		self.wait_idle()
+		assert self.cache.category(2).nodename == 'Dos' and self.cache.errors >= 1
+		print 'test_stale_while_revalidate OK'
+	
+	def test_preload(self):
+		self.cache.categories([1, 2])
+		self.cache.attribute('capacitance')
+		import tempfile
+		fd, path = tempfile.mkstemp()
+		os.close(fd)
+		self.cache.save(path)
+		cache = OctopartMetadataCache(Octopart(transport=self.transport), block_on_miss=False)
+		assert cache.load(path) == 3
+		os.remove(path)
+		assert cache.category(2).nodename == 'Two' and cache.attribute('capacitance').type == 'number'
+		# After warm-up, misses are fetched in the background rather than waited for
+		assert cache.category(3) is None
+		while cache.pending():
+			time.sleep(0.001)
+		assert cache.category(3).nodename == 'Three' and len(self.transport.urls) == 3
+		cache.close()
+		print 'test_preload OK'
+	
+	def test_retry_backoff(self):
+		class FailingTransport(FakeTransport):
+			def fetch(self, req_url):
+				self.urls.append(req_url)
+				raise urllib2.HTTPError(req_url, 500, 'Internal Server Error', None, None)
+		with FakeClock() as clock:
+			transport = FailingTransport({})
+			cache = OctopartMetadataCache(Octopart(transport=transport), max_age=60)
+			self.assertRaises(Exception, cache.category, 1)
+			# Failed and unknown ids are not requested again until the retry is due
+			for i in range(5):
+				assert cache.category(1) is None
+			assert len(transport.urls) == 1
+			clock.advance(cache.retry_delay)
+			self.assertRaises(Exception, cache.category, 1)
+			assert len(transport.urls) == 2
+			self.transport.responses['categories/get_multi?ids=[4]'] = []
+			for i in range(5):
+				assert self.cache.category(4) is None
+			assert len(self.transport.urls) == 1
+			# A failing refresh of a cached object is not retried on every access either
+			self.cache.categories([1, 2])
+			clock.advance(60)
+			self.transport.responses.clear()
+			for i in range(5):
+				assert self.cache.category(1).nodename == 'One'
+				self.wait_idle()
+			assert len(self.transport.urls) == 3
+			# The second retry waits twice as long as the first
+			clock.advance(self.cache.retry_delay)
+			self.cache.category(1)
+			self.wait_idle()
+			clock.advance(self.cache.retry_delay)
+			self.cache.category(1)
+			self.wait_idle()
+			assert len(self.transport.urls) == 4
+			clock.advance(self.cache.retry_delay)
+			self.cache.category(1)
+			self.wait_idle()
+			assert len(self.transport.urls) == 5
+		cache.close()
+		print 'test_retry_backoff OK'
+	
+class OfferIndexTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.parts = [OctopartPart.new_from_dict(part_json(1, offers=[offer_json(459, 'A1', 100, [[1, 1.0, 'USD'], [10, 0.8, 'USD']]), 
+				offer_json(1885, 'M1', 5, [[1, 0.9, 'USD']])])), 
+			OctopartPart.new_from_dict(part_json(2, offers=[offer_json(459, 'A2', 0, [[1, 2.0, 'USD']]), 
+				offer_json(1885, 'M2', 50, [[1, 2.5, 'USD']])]))]
+		self.index = OctopartOfferIndex(self.parts)
+	
+	def test_queries(self):
+		assert offer_unit_price(self.parts[0].offers[0], 12) == 0.8 and offer_unit_price(self.parts[0].offers[0], 0) is None
+		assert [(uid, offer['sku']) for uid, offer in self.index.supplier_offers(459)] == [(1, 'A1')]
+		assert len(self.index.supplier_offers(459, min_avail=None)) == 2
+		assert self.index.get(1885, 'M2')[0] == 2
+		basket = self.index.basket(459, {1 : 10, 2 : 1})
+		assert basket['lines'][1][1:] == (0.8, 8.0, 10) and basket['missing'] == [2] and basket['total'] == 8.0
+		assert self.index.prices[0] == [(1, 1.0), (10, 0.8)]
+		# Mouser fills both lines, so it ranks above Digi-Key
+		baskets = self.index.best_baskets({1 : 5, 2 : 1})
+		assert [b['supplier_id'] for b in baskets] == [1885, 459] and baskets[0]['total'] == 7.0
+		print 'test_queries OK'
+	
+	def test_basket_moq(self):
+		offer = offer_json(459, 'A3', 100, [[1, 1.0, 'USD'], [50, 0.5, 'USD']])
+		offer['moq'] = 25
+		self.index.update(OctopartPart.new_from_dict(part_json(3, offers=[offer])))
+		# Below the minimum order quantity, 25 units are bought at the first break...
+		basket = self.index.basket(459, {3 : 2})
+		assert basket['lines'][3][1:] == (1.0, 25.0, 25) and basket['total'] == 25.0
+		# ...but 50 units at the second break cost the same
+		basket = self.index.basket(459, {3 : 30})
+		assert basket['lines'][3][1:] == (0.5, 25.0, 50)
+		offer['avail'] = 10
+		self.index.update(OctopartPart.new_from_dict(part_json(3, offers=[offer])))
+		assert self.index.basket(459, {3 : 2})['missing'] == [3]
+		print 'test_basket_moq OK'
+	
+	def test_shared_sku(self):
+		self.index.update(OctopartPart.new_from_dict(part_json(3, offers=[offer_json(459, 'A1', 7, [[1, 1.0, 'USD']])])))
+		assert self.index.get(459, 'A1')[0] == 3
+		# Removing either part leaves the other's offer reachable
+		self.index.remove(3)
+		assert self.index.get(459, 'A1')[0] == 1
+		self.index.update(OctopartPart.new_from_dict(part_json(3, offers=[offer_json(459, 'A1', 7, [[1, 1.0, 'USD']])])))
+		self.index.remove(1)
+		assert self.index.get(459, 'A1')[0] == 3
+		self.index.remove(3)
+		assert self.index.get(459, 'A1') is None
+		print 'test_shared_sku OK'
+	
+	def test_refresh_updates_index(self):
+		api = RefreshSchedulerTest.FakeApi({2 : part_json(2, offers=[offer_json(459, 'A2', 30, [[1, 1.5, 'USD']])])})
+		scheduler = OctopartRefreshScheduler(api, self.parts, offer_index=self.index)
+		scheduler.refresh(now=datetime.datetime(2012, 1, 10))
+		assert [(uid, offer['avail']) for uid, offer in self.index.supplier_offers(459)] == [(1, 100), (2, 30)]
+		assert self.index.get(1885, 'M2') is None and len(self.index) == 3
+		scheduler.remove(1)
+		assert len(self.index) == 1 and self.index.supplier_offers(1885) == []
+		print 'test_refresh_updates_index OK'
+	
+class BomOptimizerTest(unittest.TestCase):
+	
+	def setUp(self):
+		line0 = OctopartPart.new_from_dict(part_json(1, offers=[offer_json(459, 'A', 100, [[1, 1.0, 'USD'], [10, 0.5, 'USD']]), 
+			offer_json(1885, 'M', 100, [[1, 0.9, 'USD']])]))
+		line1 = OctopartPart.new_from_dict(part_json(2, offers=[offer_json(459, 'B', 5, [[1, 2.0, 'USD']]), 
+			offer_json(1885, 'N', 100, [[1, 1.5, 'USD']]), offer_json(2000, 'R', 100, [[1, 1.0, 'USD']], is_authorized=False)]))
+		self.results = [{'items' : [line0]}, {'items' : [line1]}, {'items' : []}]
+		self.quantities = [8, 2, 1]
+	
+	def test_cheapest_per_line(self):
+		plan = optimize_bom(self.results, self.quantities)
+		# Ten units at the second price break cost less than eight at the first
+		assert (plan['lines'][0]['supplier_id'], plan['lines'][0]['quantity'], plan['lines'][0]['cost']) == (459, 10, 5.0)
+		assert plan['lines'][1]['supplier_id'] == 2000 and plan['unfilled'] == [2] and plan['total'] == 7.0
+		plan = optimize_bom(self.results, self.quantities, authorized_only=True)
+		assert plan['lines'][1]['supplier_id'] == 1885 and plan['suppliers'] == {459 : 5.0, 1885 : 3.0}
+		# Digi-Key has too little stock for three builds of line 1
+		plan = optimize_bom(self.results, self.quantities, build_quantity=3, authorized_only=True)
+		assert plan['lines'][1]['supplier_id'] == 1885
+		# Every line needs a quantity
+		self.assertRaises(ValueError, optimize_bom, self.results, self.quantities[:2])
+		print 'test_cheapest_per_line OK'
+	
+	def test_supplier_costs(self):
+		costs = {459 : 10, 1885 : 10}
+		for exact in (True, False):
+			plan = optimize_bom(self.results, self.quantities, authorized_only=True, supplier_costs=costs, exact=exact)
+			assert plan['suppliers'] == {459 : 19.0} and plan['total'] == 19.0
+		# Without the unauthorized offer's fixed cost, it is still worth using
+		plan = optimize_bom(self.results, self.quantities, supplier_costs={459 : 10, 1885 : 10, 2000 : 0})
+		assert plan['suppliers'] == {459 : 15.0, 2000 : 2.0}
+		print 'test_supplier_costs OK'
+	
+	def test_zero_quantity(self):
+		plan = optimize_bom(self.results, [8, 0, 1])
+		# Nothing is bought for a line needing no units, not even one price break
+		assert plan['lines'][1] is None and plan['skipped'] == [1] and plan['unfilled'] == [2]
+		assert plan['suppliers'] == {459 : 5.0} and plan['total'] == 5.0
+		print 'test_zero_quantity OK'
+	
+	def test_exact_budget(self):
+		import random
+		rand = random.Random(1)
+		results = []
+		for i in range(200):
+			offers = [offer_json(supplier_id, 'S%d-%d' % (supplier_id, i), 1000, [[1, rand.uniform(0.5, 2), 'USD']]) \
+					for supplier_id in rand.sample(range(16), 6)]
+			results.append({'items' : [OctopartPart.new_from_dict(part_json(i, offers=offers))]})
+		quantities = [rand.randint(1, 5) * 10 for result in results]
+		costs = dict((supplier_id, rand.uniform(50, 300)) for supplier_id in range(16))
+		greedy = optimize_bom(results, quantities, supplier_costs=costs, exact=False)
+		# The automatic exact mode gives up after its budget, keeping a plan no worse than greedy
+		plan = optimize_bom(results, quantities, supplier_costs=costs, max_exact_work=20000)
+		assert plan['total'] <= greedy['total']
+		print 'test_exact_budget OK'
+	
+class NegativeCacheTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.transport = FakeTransport({'parts/get_multi?uids=[1,2]' : [part_json(1)], 
+			'parts/get_multi?uids=[1]' : [part_json(1)], 
+			'categories/get_multi?ids=[1,2]' : [category_json(1, 'Root')], 
+			'bom/match?lines=[{"mpn":"A"},{"mpn":"B"}]' : {'results' : [
+				{'items' : [part_json(1)], 'reference' : '', 'status' : 'exact_match'}, 
+				{'items' : [], 'reference' : '', 'status' : 'no_match'}]}, 
+			'bom/match?lines=[{"mpn":"A"}]' : {'results' : [{'items' : [part_json(1)], 'reference' : '', 'status' : 'exact_match'}]}})
+		self.cache = OctopartNegativeCache(ttl=60)
+		self.metrics = OctopartMetrics()
+		self.client = Octopart(transport=self.transport, negative_cache=self.cache, hooks=[self.metrics])
+	
+	def test_get(self):
+		assert self.client.parts_get(3) is None
+		assert self.client.parts_get(3) is None
+		assert self.client.categories_get(3) is None
+		assert self.client.partattributes_get('colour') is None
+		assert self.client.partattributes_get('colour') is None
+		assert len(self.transport.urls) == 3
+		assert self.metrics.count('events', label='cache_hit') == 2
+		assert self.cache.invalidate('part') == 1
+		assert self.client.parts_get(3) is None
+		assert len(self.transport.urls) == 4
+		print 'test_get OK'
+	
+	def test_get_multi(self):
+		json_obj, parts = self.client.parts_get_multi([1, 2])
+		assert [part.uid for part in parts] == [1]
+		json_obj, parts = self.client.parts_get_multi([1, 2])
+		assert [part.uid for part in parts] == [1]
+		assert canonical_url(self.transport.urls[-1]) == 'parts/get_multi?uids=[1]'
+		# Nothing is requested when every uid is known to be missing
+		assert self.client.parts_get_multi([2]) == ([], [])
+		assert len(self.transport.urls) == 2
+		json_obj, categories = self.client.categories_get_multi([1, 2])
+		assert self.cache.contains('category', 2) and not self.cache.contains('category', 1)
+		print 'test_get_multi OK'
+	
+	def test_bom_match(self):
+		lines = [{'mpn' : 'A'}, {'mpn' : 'B'}]
+		self.client.bom_match(lines)
+		lines[1]['reference'] = 'R1'
+		json_obj, results = self.client.bom_match(lines)
+		assert canonical_url(self.transport.urls[-1]) == 'bom/match?lines=[{"mpn":"A"}]'
+		assert [result['status'] for result in results] == ['exact_match', 'no_match']
+		assert results[1] == {'items' : [], 'reference' : 'R1', 'status' : 'no_match'}
+		assert json_obj['results'][1]['status'] == 'no_match'
+		json_obj, results = self.client.bom_match(lines[1:])
+		assert len(self.transport.urls) == 2 and results[0]['status'] == 'no_match'
+		print 'test_bom_match OK'
+	
+	def test_expiry(self):
+		with FakeClock() as clock:
+			cache = OctopartNegativeCache(ttl=60, max_entries=2)
+			cache.add('part', [1, 2, 3])
+			assert len(cache) == 2 and not cache.contains('part', 1) and cache.contains('part', 3)
+			clock.advance(59)
+			assert cache.contains('part', 3)
+			clock.advance(1)
+			assert not cache.contains('part', 3)
+		cache.add('part', [1])
+		cache.add('category', [1])
+		assert cache.invalidate(keys=[1]) == 2 and len(cache) == 0
+		print 'test_expiry OK'
+	
+class BatchPlannerTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.client = Octopart(apikey='plannerkey', optimize='pricing', max_url_length=400)
+		self.lines = [{'mpn' : 'PART %d' % i, 'manufacturer' : 'Maker "%d"' % i, 'reference' : u'R\xe9f'.encode('utf-8')} \
+					for i in range(30)]
+	
+	def url_length(self, method, batch, **kwargs):
+		args = {'parts/get_multi' : self.client._parts_get_multi_args, 
+			'bom/match' : self.client._bom_match_args}[method](batch, dict(kwargs))
+		return len(self.client._make_url(method, args))
+	
+	def test_fits(self):
+		for method, items in (('bom/match', self.lines), ('parts/get_multi', range(10 ** 11, 10 ** 11 + 100))):
+			batches = self.client.plan_batches(method, items, optimize_hide_images=False)
+			assert sum(batches, []) == list(items) and len(batches) > 1
+			for batch, next_batch in zip(batches, batches[1:] + [None]):
+				assert self.url_length(method, batch, optimize_hide_images=False) <= 400
+				# Every batch is as large as it can be
+				if next_batch is not None:
+					assert self.url_length(method, batch + next_batch[:1], optimize_hide_images=False) > 400
+		print 'test_fits OK'
+	
+	def test_limits(self):
+		self.client.max_url_length = 100000
+		assert [len(batch) for batch in self.client.plan_batches('parts/get_multi', range(250))] == [100, 100, 50]
+		assert [len(batch) for batch in self.client.plan_batches('parts/get_multi', range(250), max_items=120)] == [100, 100, 50]
+		assert [len(batch) for batch in self.client.plan_batches('categories/get_multi', range(250), max_items=120)] == [120, 120, 10]
+		try:
+			self.client.plan_batches('bom/match', [{'mpn' : 'X' * 500}], max_url_length=200)
+		except OctopartException as e:
+			assert e.code == 17
+		else:
+			assert False
+		self.assertRaises(OctopartException, self.client.plan_batches, 'parts/get_multi', [1, 'x'])
+		self.assertRaises(ValueError, self.client.plan_batches, 'parts/search', [])
+		print 'test_limits OK'
+	
+	def test_iter_batches(self):
+		class MatchTransport(object):
+			def fetch(self, req_url):
+				lines = json.loads(urlparse.parse_qs(urlparse.urlparse(req_url).query)['lines'][0])
+				return json.dumps({'results' : [{'items' : [], 'reference' : '', 'status' : 'no_match'} for line in lines]})
+		client = Octopart(transport=MatchTransport(), max_url_length=300)
+		results = list(client.iter_batches('bom/match', self.lines))
+		assert len(results) > 1 and sum((batch for batch, result in results), []) == self.lines
+		assert all(len(batch) == len(result[1]) for batch, result in results)
+		print 'test_iter_batches OK'
+	
+class ThreadSafetyTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.lines = [{'mpn' : 'PART %d' % i, 'reference' : 'R%d' % i} for i in range(3)]
+		bom_url = canonical_url(Octopart()._make_url('bom/match', {'lines' : self.lines, 'optimize.hide_specs' : True}))
+		responses = {bom_url : {'results' : [{'items' : [part_json(i)], 'reference' : 'R%d' % i, 'status' : 'exact_match'} \
+												for i in range(3)]}}
+		for uid in range(1, 11):
+			responses['parts/get?uid=%d' % uid] = part_json(uid)
+			responses['parts/get_multi?uids=[%d,%d]' % (uid, uid + 1)] = [part_json(uid), part_json(uid + 1)]
+		self.recordings = dict((key, {'status' : 200, 'body' : json.dumps(body)}) for key, body in responses.items())
+	
+	def test_arguments_unchanged(self):
+		client = Octopart(apikey='key', callback='cb', pretty_print=True)
+		args = {'lines' : [{'mpn' : 'A', 'optimize_hide_specs' : True}], 'drilldown_include' : True}
+		before = copy.deepcopy(args)
+		assert client._translate_periods(args) == {'lines' : [{'mpn' : 'A', 'optimize.hide_specs' : True}], 'drilldown.include' : True}
+		url = client._make_url('bom/match', args)
+		assert args == before
+		assert canonical_url(url) == 'bom/match?drilldown_include=1&lines=[{"mpn":"A","optimize_hide_specs":true}]&pretty_print=1'
+		request = client._request('bom/match', args)
+		self.assertRaises(AttributeError, setattr, request, 'method', 'parts/get')
+		assert request.url('http://example.com/', 'k').endswith('&apikey=k')
+		print 'test_arguments_unchanged OK'
+	
+	def test_stress(self):
+		metrics = OctopartMetrics()
+		misses = OctopartNegativeCache()
+		client = Octopart(apikey=OctopartKeyPool(['key1', 'key2', 'key3']), hooks=[metrics, OctopartTracer()], \
+						scheduler=OctopartRequestScheduler(max_concurrent=6), negative_cache=misses)
+		options = {'optimize_hide_specs' : True}
+		lines = self.lines
+		failures = []
+		def worker(n):
+			try:
+				for i in range(30):
+					uid = (n + i) % 10 + 1
+					kind = i % 4
+					if kind == 0:
+						assert client.parts_get(uid)[1].uid == uid
+					elif kind == 1:
+						assert [part.uid for part in client.parts_get_multi([uid, uid + 1])[1]] == [uid, uid + 1]
+					elif kind == 2:
+						results = client.bom_match(lines, **options)[1]
+						assert [result['items'][0].uid for result in results] == [0, 1, 2]
+					else:
+						assert client.parts_get(1000 + n % 3) is None
+			except Exception as e:
+				failures.append(str(e))
+		with OctopartStubServer(self.recordings, latency=(0, 0.002), seed=0) as server:
+			client.base_url = server.url
+			threads = [threading.Thread(target=worker, args=(n,)) for n in range(16)]
+			for thread in threads:
+				thread.start()
+			for thread in threads:
+				thread.join()
+			assert not failures, failures
+			assert metrics.count('calls') == 16 * 30 and metrics.count('errors') == 0
+			# Every call made one request, apart from the misses answered from the cache
+			assert server.requests + metrics.count('events', label='cache_hit') == 16 * 30
+			assert len(misses) == 3
+		assert lines == [{'mpn' : 'PART %d' % i, 'reference' : 'R%d' % i} for i in range(3)]
+		assert options == {'optimize_hide_specs' : True}
+		print 'test_stress OK'
+	
+class CrawlerTest(unittest.TestCase):
+	
+	def setUp(self):
+		import tempfile
+		self.directory = tempfile.mkdtemp()
+		tree = {1 : [2, 3], 2 : [4], 3 : [], 4 : []}
+		# Part 149 is filed in both leaf categories
+		members = {3 : range(0, 150), 4 : range(149, 160)}
+		client = Octopart()
+		responses = {}
+		for id, children in tree.items():
+			category = category_json(id, 'Category %d' % id)
+			category['children_ids'] = children
+			responses['categories/get?id=%d' % id] = category
+		for id, uids in members.items():
+			for start in range(0, len(uids), 100):
+				args = client._parts_search_args({'start' : start, 'limit' : 100, 'filters' : [['category_ids', [id]]]})
+				results = [{'item' : part_json(uid), 'highlight' : ''} for uid in uids[start:start + 100]]
+				responses[canonical_url(client._make_url('parts/search', args))] = {'results' : results, 'hits' : len(uids)}
+		self.recordings = dict((key, {'status' : 200, 'body' : json.dumps(body)}) for key, body in responses.items())
+	
+	def tearDown(self):
+		import shutil
+		shutil.rmtree(self.directory)
+	
+	def test_crawl(self):
+		with OctopartStubServer(self.recordings) as server:
+			crawler = OctopartCrawler(self.directory, [1], processes=2, rate=100, client_kwargs={'base_url' : server.url})
+			stats = crawler.run()
+			assert server.requests == 7
+		assert stats['categories'] == 4 and stats['parts'] == 160 and stats['duplicates'] == 1
+		assert stats['pages'] == 3 and not stats['errors'] and not stats['truncated']
+		assert sorted(part.uid for part in crawler.parts()) == range(160)
+		# A finished crawl has nothing left to do
+		assert crawler.run()['categories'] == 0
+		print 'test_crawl OK'
+	
+	def test_rate_limit(self):
+		class FakeTime(object):
+			def __init__(self):
+				self.now = 1000.0
+			def time(self):
+				return self.now
+			def sleep(self, seconds):
+				self.now += seconds
+		import octopart.parallel
+		fake = FakeTime()
+		limiter = octopart.parallel._SharedRateLimiter(100)
+		real_time = octopart.parallel.time
+		octopart.parallel.time = fake
+		try:
+			# The first request goes at once, and each later one a hundredth of a second after the last
+			for i in range(7):
+				limiter.wait()
+		finally:
+			octopart.parallel.time = real_time
+		assert abs(fake.now - 1000.06) < 1e-9
+		print 'test_rate_limit OK'
+	
+	def test_resume(self):
+		key = [key for key in self.recordings if 'start=100' in key][0]
+		second_page = self.recordings.pop(key)
+		with OctopartStubServer(self.recordings) as server:
+			crawler = OctopartCrawler(self.directory, [1], processes=2, client_kwargs={'base_url' : server.url})
+			stats = crawler.run()
+			assert [id for id, message in stats['errors']] == [3]
+			assert stats['parts'] == 111
+			# Writes after the checkpoint are discarded on resume
+			with open(os.path.join(self.directory, OctopartCrawler.segment_pattern % 0), 'ab') as f:
+				f.write('\x05torn')
+			self.recordings[key] = second_page
+			requests = server.requests
+			stats = crawler.run()
+			assert server.requests - requests == 1
+		assert stats['categories'] == 1 and stats['parts'] == 49 and not stats['errors']
+		assert sorted(part.uid for part in crawler.parts()) == range(160)
+		print 'test_resume OK'
+	
+class LazyImportTest(unittest.TestCase):
+	
+	def imported_modules(self, script):
+		import subprocess, sys
+		directory = os.path.dirname(os.path.dirname(os.path.abspath(octopart.__file__)))
+		output = subprocess.check_output([sys.executable, '-c', script + '\nimport sys\nprint " ".join(sys.modules)'], cwd=directory)
+		return set(output.split())
+	
+	def test_core_import(self):
+		modules = self.imported_modules('from octopart import Octopart')
+		for name in ('octopart.stub', 'octopart.parallel', 'octopart.analytics', 'octopart.storage', 'octopart.export', \
+				'multiprocessing', 'BaseHTTPServer', 'SocketServer', 'mmap'):
+			assert name not in modules, name
+		modules = self.imported_modules('import octopart\noctopart.OctopartSnapshot')
+		assert 'octopart.storage' in modules and 'mmap' in modules and 'octopart.stub' not in modules
+		print 'test_core_import OK'
+	
+	def test_lazy_names(self):
+		assert octopart.OctopartStubServer is octopart.stub.OctopartStubServer
+		assert set(octopart._LAZY_NAMES) <= set(octopart.__all__)
+		self.assertRaises(AttributeError, getattr, octopart, 'OctopartNoSuchThing')
+		# Parts still pickle by reference to the package
+		import pickle
+		part = OctopartPart.new_from_dict(part_json(1))
+		assert pickle.loads(pickle.dumps(part, 2)).fingerprint() == part.fingerprint()
+		print 'test_lazy_names OK'
+	
+	def test_patch_global(self):
+		timer = octopart._timer
+		octopart._timer = lambda: 42.0
+		try:
+			# Functions of the package see globals patched through it
+			assert OctopartCall('parts/get').start == 42.0
+		finally:
+			octopart._timer = timer
+		assert OctopartCall('parts/get').start != 42.0
+		octopart.OctopartTestGlobal = 1
+		del octopart.OctopartTestGlobal
+		assert not hasattr(octopart, 'OctopartTestGlobal') and 'OctopartTestGlobal' not in octopart._original.__dict__
+		print 'test_patch_global OK'
+	
+class SearchTransport(object):
+	
+	"""Transport paging through a list of JSON Part resources for parts/search requests."""
+	
+	def __init__(self, parts):
+		self.parts = parts
+		self.urls = []
+	
+	def fetch(self, req_url):
+		self.urls.append(req_url)
+		query = urlparse.parse_qs(urlparse.urlparse(req_url).query)
+		start, limit = int(query['start'][0]), int(query['limit'][0])
+		results = [{'item' : part, 'highlight' : '<b>%d</b>' % part['uid']} for part in self.parts[start:start + limit]]
+		return json.dumps({'results' : results, 'hits' : len(self.parts)})
+
+class ExportTest(unittest.TestCase):
+	
+	def setUp(self):
+		attribute = {'__class__' : 'PartAttribute', 'fieldname' : 'capacitance', 'displayname' : 'Capacitance', \
+			'type' : 'number', 'metadata' : {'datatype' : 'decimal', 'unit' : {'name' : 'farads', 'symbol' : 'F'}}}
+		self.parts = [part_json(uid, mpn=u'MPN-\u00b5%d' % uid, 
+				offers=[offer_json(459, 'A%d' % uid, uid * 10, [[1, 0.25, 'USD']]), offer_json(1885, 'B%d' % uid, 0, [])][:uid % 3], 
+				specs=[{'attribute' : attribute, 'values' : [uid * 1e-06]}]) for uid in range(5)]
+		self.transport = SearchTransport(self.parts)
+		self.client = Octopart(transport=self.transport)
+	
+	def test_search_jsonl(self):
+		import StringIO
+		output = StringIO.StringIO()
+		assert export_search(self.client, output, page_size=2, q='capacitor') == 5
+		assert len(self.transport.urls) == 3
+		# Only the fields written are requested
+		assert all('optimize.hide_images=1' in url and 'optimize.hide_offers' not in url for url in self.transport.urls)
+		rows = [json.loads(line) for line in output.getvalue().splitlines()]
+		assert [row['uid'] for row in rows] == range(5) and rows[3]['highlight'] == '<b>3</b>'
+		assert rows[1]['mpn'] == u'MPN-\u00b51' and rows[1]['manufacturer.displayname'] == 'Maker'
+		assert rows[2]['offers'][1]['supplier']['id'] == 1885 and rows[2]['offers'][1]['update_ts'] == '2012-01-01T00:00:00Z'
+		assert rows[4]['specs'][0]['attribute']['fieldname'] == 'capacitance'
+		print 'test_search_jsonl OK'
+	
+	def test_search_csv(self):
+		import csv, StringIO
+		output = StringIO.StringIO()
+		self.assertRaises(ValueError, export_search, self.client, output, format='csv', specs='columns')
+		self.assertRaises(ValueError, export_search, self.client, output, offers='flat')
+		count = export_search(self.client, output, format='csv', offers='rows', specs='columns', spec_fields=['capacitance'], q='capacitor')
+		rows = list(csv.reader(StringIO.StringIO(output.getvalue())))
+		assert rows[0] == export_columns('rows', 'columns', ['capacitance'], SEARCH_COLUMNS)
+		rows = [dict(zip(rows[0], row)) for row in rows[1:]]
+		# A row per offer, and one for each part without offers
+		assert count == len(rows) == 6
+		assert [(row['uid'], row['offer.sku']) for row in rows] == [('0', ''), ('1', 'A1'), ('2', 'A2'), ('2', 'B2'), ('3', ''), ('4', 'A4')]
+		assert rows[1]['mpn'] == u'MPN-\u00b51'.encode('utf-8') and rows[1]['offer.prices'] == '[[1,0.25,"USD"]]'
+		assert rows[3]['offer.is_authorized'] == 'True' and float(rows[4]['spec.capacitance']) == 3e-06
+		print 'test_search_csv OK'
+	
+	def test_streaming(self):
+		class Output(object):
+			def __init__(self, transport):
+				self.transport = transport
+				self.requests = []
+			def write(self, data):
+				self.requests.append(len(self.transport.urls))
+		output = Output(self.transport)
+		export_search(self.client, output, page_size=2, q='capacitor')
+		# Each page is written before the next is requested
+		assert sorted(set(output.requests)) == [1, 2, 3]
+		pages = list(self.client.iter_search(page_size=2, max_results=3, q='capacitor'))
+		assert [len(page[1]) for page in pages] == [2, 1]
+		assert 'limit=1' in self.transport.urls[-1] and 'start=2' in self.transport.urls[-1]
+		print 'test_streaming OK'
+	
+	def test_bom(self):
+		import csv, StringIO
+		class MatchTransport(object):
+			def __init__(self, parts):
+				self.parts = parts
+				self.requests = 0
+			def fetch(self, req_url):
+				self.requests += 1
+				lines = json.loads(urlparse.parse_qs(urlparse.urlparse(req_url).query)['lines'][0])
+				results = []
+				for line in lines:
+					uid = int(line['mpn'].split()[1])
+					items = [part for part in self.parts if part['uid'] == uid]
+					results.append({'items' : items, 'reference' : line['reference'], \
+								'status' : 'exact_match' if items else 'no_match', 'hits' : len(items)})
+				return json.dumps({'results' : results})
+		transport = MatchTransport(self.parts)
+		client = Octopart(transport=transport, max_url_length=400)
+		lines = [{'mpn' : 'PART %d' % i, 'reference' : 'R%d' % i} for i in range(8)]
+		output = StringIO.StringIO()
+		assert export_bom(client, lines, output, format='csv', offers='none', specs='none') == 8
+		assert transport.requests > 1
+		rows = list(csv.DictReader(StringIO.StringIO(output.getvalue())))
+		assert [row['line'] for row in rows] == [str(i) for i in range(8)]
+		assert [row['reference'] for row in rows] == ['R%d' % i for i in range(8)]
+		assert rows[4]['uid'] == '4' and rows[4]['status'] == 'exact_match' and rows[4]['hits'] == '1'
+		assert rows[6]['uid'] == '' and rows[6]['status'] == 'no_match'
+		output = StringIO.StringIO()
+		export_bom(client, lines, output, offers='rows', specs='columns')
+		rows = [json.loads(line) for line in output.getvalue().splitlines()]
+		assert [(row['line'], row.get('offer.sku')) for row in rows][:4] == [(0, None), (1, 'A1'), (2, 'A2'), (2, 'B2')]
+		assert rows[3]['spec.capacitance'] == 2e-06 and 'uid' not in rows[-1]
+		print 'test_bom OK'
+	
+	def test_bom_empty_response(self):
+		import StringIO
+		class EmptyTransport(object):
+			def __init__(self):
+				self.requests = 0
+			def fetch(self, req_url):
+				self.requests += 1
+				lines = json.loads(urlparse.parse_qs(urlparse.urlparse(req_url).query)['lines'][0])
+				# The second batch gets an empty JSON object, so bom_match returns None
+				if self.requests == 2:
+					return '{}'
+				return json.dumps({'results' : [{'items' : [], 'reference' : line['reference'], 'status' : 'no_match', \
+												'hits' : 0} for line in lines]})
+		transport = EmptyTransport()
+		client = Octopart(transport=transport)
+		lines = [{'mpn' : 'PART %d' % i, 'reference' : 'R%d' % i} for i in range(6)]
+		output = StringIO.StringIO()
+		assert export_bom(client, lines, output, max_items=2) == 6 and transport.requests == 3
+		rows = [json.loads(line) for line in output.getvalue().splitlines()]
+		assert [(row['line'], row['reference'], row['status']) for row in rows] == [(0, 'R0', 'no_match'), \
+				(1, 'R1', 'no_match'), (2, 'R2', None), (3, 'R3', None), (4, 'R4', 'no_match'), (5, 'R5', 'no_match')]
+		print 'test_bom_empty_response OK'
+	
 if __name__ == '__main__':
 	unittest.main()
 